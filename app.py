@@ -1,10 +1,26 @@
 # app.py - Radar B3 (versão com Yahoo Finance integrado)
 import streamlit as st
-import yfinance as yf
 import pandas as pd
 import numpy as np
 from datetime import datetime, time as time_obj
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from motor_intraday import DIRECOES, ranking_liquidez
+from execucao_paralela import processos_disponiveis
+from armazem_candles import acrescentar_historico, caminho_historico, salvar_referencias
+import cache_resultados
+from calendario_b3 import fechamento_maximo
+from carteira import MARGEM_PADRAO, simular_carteira
+from exportacao import FORMATOS, abrir_exportacao
+from ingestao import ler_candles
+from medicao import ADMINS, DESLIGADA, MEDICAO_PADRAO, apelido_usuario, nova_medicao
+from reamostragem import COLUNAS_INTERVALO, intervalos_bootstrap
+from scanner_ao_vivo import ScannerAoVivo
+from rastreamento import (
+    FakeFile, ajustar_ticker, arquivos_de_tickers, avaliar_liquidez, carregar_arquivo, extrair_nome_completo,
+    formatar_operacoes, identificar_tipo, rastrear_com_cache, resumir_operacoes, tipo_do_arquivo
+)
+from universo import PRESETS_UNIVERSO, montar_universo, separar_watchlist
+from varredura import REFERENCIAS, executar_varredura, gerar_faixa
+from walk_forward import executar_walk_forward
 
 # ========================
 # SIMULAÇÃO DE LOGIN
@@ -14,47 +30,6 @@ if "email" not in st.session_state:
     st.session_state.plano = "Diamante"
     st.session_state.expira = datetime.now().date() + pd.Timedelta(days=30)
 
-# ========================
-# FUNÇÃO: extrair nome do arquivo
-# ========================
-def extrair_nome_completo(file_name):
-    return file_name.split(".")[0]
-
-# ========================
-# FUNÇÃO: identificar tipo do ativo
-# ========================
-def identificar_tipo(ticker):
-    ticker = ticker.upper().strip()
-    if '.' in ticker:
-        ticker = ticker.split('.')[0]
-    prefixos = ['5-MIN_', '5_MIN_', 'MINI_', 'MIN_', 'INTRADAY_', 'INTRADAY']
-    for p in prefixos:
-        if ticker.startswith(p):
-            ticker = ticker[len(p):]
-    if 'WIN' in ticker or 'INDICE' in ticker:
-        return 'mini_indice'
-    if 'WDO' in ticker or 'DOLAR' in ticker or 'DOL' in ticker:
-        return 'mini_dolar'
-    acoes = ['PETR', 'VALE', 'ITUB', 'BBDC', 'BEEF', 'ABEV', 'ITSA', 'JBSS', 'RADL', 'CIEL',
-             'GOLL', 'AZUL', 'BBAS', 'SANB', 'ASAI', 'B3SA', 'MGLU', 'CVCB', 'IRBR', 'XP', 'LCAM']
-    for acao in acoes:
-        if acao in ticker:
-            return 'acoes'
-    return 'acoes'
-
-# ========================
-# FUNÇÃO: ajustar ticker (PETR4 → PETR4.SA | WINM24 → WINM24)
-# ========================
-def ajustar_ticker(ticker_input):
-    ticker = ticker_input.strip().upper()
-    if ticker.endswith(".SA"):
-        return ticker
-    if ticker.startswith("WIN") or ticker.startswith("WDO"):
-        return ticker  # Futuros não usam .SA
-    if len(ticker) >= 4 and ticker[-1].isdigit():
-        return ticker + ".SA"
-    return ticker
-
 # ========================
 # FUNÇÃO DE RASTREAMENTO INTRADAY (otimizada)
 # ========================
@@ -73,298 +48,46 @@ def processar_rastreamento_intraday(
     data_fim,
     modo_estrategia,
     usar_filtro_liquidez,
-    limite_liquidez
+    limite_liquidez,
+    processos=0,
+    medicao=DESLIGADA
 ):
-    todas_operacoes = []
-    dias_com_entrada = set()
-    dias_ignorados = []
-    todos_dias_com_dados = set()
-    arquivos_ignorados = []
-    mensagens_liquidez = []
-
-    # ========================
-    # OTIMIZAÇÃO: ler cada arquivo APENAS UMA VEZ
-    # ========================
-    arquivos_processados = {}
-
-    def carregar_arquivo(file):
-        try:
-            # ✅ Se for FakeFile (vindo do Yahoo Finance)
-            if hasattr(file, "df"):
-                df = file.df.copy()
-            else:
-                df = pd.read_excel(file)
-
-            # Normalizar nomes das colunas
-            df.columns = [str(col).strip().capitalize() for col in df.columns]
-            df.rename(columns={
-                'Data': 'data',
-                'Abertura': 'open',
-                'Máxima': 'high',
-                'Mínima': 'low',
-                'Fechamento': 'close',
-                'Volume': 'volume'
-            }, inplace=True)
-
-            # Converter coluna de data
-            df['data'] = pd.to_datetime(df['data'], dayfirst=True, errors='coerce')
-            df = df.dropna(subset=['data'])
-            df['data_limpa'] = df['data'].dt.floor('min')
-            df = df.set_index('data_limpa').sort_index()
-            df = df[~df.index.duplicated(keep='first')]
-            if df.index.tz:
-                df = df.tz_localize(None)
-            df['data_sozinha'] = df.index.date
-            df = df[(df['data_sozinha'] >= data_inicio) & (df['data_sozinha'] <= data_fim)]
-            return df
-        except Exception as e:
-            st.error(f"❌ Erro ao processar {getattr(file, 'name', 'arquivo desconhecido')}: {e}")
-            return None
-
-    with ThreadPoolExecutor() as executor:
-        future_to_file = {executor.submit(carregar_arquivo, file): file for file in uploaded_files}
-        for future in as_completed(future_to_file):
-            file = future_to_file[future]
-            df = future.result()
-            if df is not None:
-                arquivos_processados[file] = df
-
-    def calcular_max_drawdown(df, idx_entrada, idx_saida, direcao):
-        try:
-            periodo = df.loc[idx_entrada:idx_saida]
-            if periodo.empty or len(periodo) < 2:
-                return 0.0
-            preco_entrada = periodo.iloc[0]["open"]
-            if direcao == "Compra":
-                min_preco = periodo["low"].min()
-                drawdown = ((min_preco - preco_entrada) / preco_entrada) * 100
-            else:
-                max_preco = periodo["high"].max()
-                drawdown = ((max_preco - preco_entrada) / preco_entrada) * 100
-            return round(drawdown, 2)
-        except:
-            return 0.0
-
-    for horario_str in horarios_selecionados:
-        hora, minuto = map(int, horario_str.split(":"))
-        hora_inicio = time_obj(hora, minuto)
-        for file, df in arquivos_processados.items():
-            try:
-                ticker_nome = extrair_nome_completo(file.name)
-                tipo_arquivo = identificar_tipo(ticker_nome)
-                if tipo_ativo != "todos" and tipo_arquivo != tipo_ativo:
-                    if file.name not in arquivos_ignorados:
-                        arquivos_ignorados.append(file.name)
-                    continue
-                if df.empty:
-                    continue
-
-                if usar_filtro_liquidez:
-                    col_volume_acoes = None
-                    col_volume_financeiro = None
-                    for col in df.columns:
-                        col_lower = col.lower().strip()
-                        if col_lower in ['volume', 'vol', 'quantidade', 'negocios', 'negócios']:
-                            col_volume_acoes = col
-                        elif col_lower in ['volume financeiro', 'vol financeiro', 'valor negociado', 'valor', 'vlr negociado', 'volume_r$', 'volume_financ', 'volume financeiro (r$)']:
-                            col_volume_financeiro = col
-
-                    if col_volume_financeiro is not None:
-                        df['Volume_Financeiro'] = pd.to_numeric(df[col_volume_financeiro], errors='coerce')
-                        volume_clean = df['Volume_Financeiro'].dropna()
-                        if volume_clean.empty:
-                            mensagens_liquidez.append(f"ℹ️ {ticker_nome}: dados de 'Volume Financeiro' estão vazios")
-                        else:
-                            df['data_sozinha'] = df.index.date
-                            volume_diario = df.groupby('data_sozinha')['Volume_Financeiro'].sum()
-                            valor_medio_diario = volume_diario.mean()
-                            if valor_medio_diario < limite_liquidez:
-                                mensagens_liquidez.append(f"⚠️ {ticker_nome}: baixa liquidez (R$ {valor_medio_diario:,.0f}/dia) → ignorado")
-                                continue
-                            else:
-                                mensagens_liquidez.append(f"✅ {ticker_nome}: liquidez OK (R$ {valor_medio_diario:,.0f}/dia)")
-                    elif col_volume_acoes is not None:
-                        df['Volume_Acoes'] = pd.to_numeric(df[col_volume_acoes], errors='coerce')
-                        volume_clean = df['Volume_Acoes'].dropna()
-                        if volume_clean.empty:
-                            mensagens_liquidez.append(f"ℹ️ {ticker_nome}: dados de volume estão vazios")
-                        else:
-                            df['data_sozinha'] = df.index.date
-                            volume_diario = df.groupby('data_sozinha')['Volume_Acoes'].sum()
-                            volume_medio = volume_diario.mean()
-                            preco_medio = df['close'].mean()
-                            valor_medio_diario = volume_medio * preco_medio
-                            if valor_medio_diario < limite_liquidez:
-                                mensagens_liquidez.append(f"⚠️ {ticker_nome}: baixa liquidez (R$ {valor_medio_diario:,.0f}/dia) → ignorado")
-                                continue
-                            else:
-                                mensagens_liquidez.append(f"✅ {ticker_nome}: liquidez OK (R$ {valor_medio_diario:,.0f}/dia)")
-                    else:
-                        mensagens_liquidez.append(f"ℹ️ {ticker_nome}: coluna de volume não encontrada")
-
-                dias_no_arquivo = df['data_sozinha'].unique()
-                todos_dias_com_dados.update(dias_no_arquivo)
-                dias_unicos = pd.unique(df['data_sozinha'])
-                for i in range(1, len(dias_unicos)):
-                    dia_atual = dias_unicos[i]
-                    dia_anterior = dias_unicos[i - 1]
-                    df_dia_atual = df[df['data_sozinha'] == dia_atual].copy()
-
-                    if tipo_ativo in ['mini_indice', 'mini_dolar']:
-                        mascara_pregao = (df_dia_atual.index.time >= time_obj(9, 0)) & (df_dia_atual.index.time <= time_obj(18, 20))
-                    else:
-                        mascara_pregao = (df_dia_atual.index.time >= time_obj(10, 0)) & (df_dia_atual.index.time <= time_obj(17, 0))
-
-                    df_pregao = df_dia_atual[mascara_pregao]
-                    if df_pregao.empty:
-                        dias_ignorados.append((dia_atual, "Sem pregão válido"))
-                        continue
-
-                    def time_to_minutes(t):
-                        return t.hour * 60 + t.minute
-
-                    minutos_desejado = time_to_minutes(hora_inicio)
-                    minutos_candles = [time_to_minutes(t) for t in df_pregao.index.time]
-                    diferencas = [abs(m - minutos_desejado) for m in minutos_candles]
-                    melhor_idx = np.argmin(diferencas)
-                    idx_entrada = df_pregao.index[melhor_idx]
-                    preco_entrada = df_pregao.loc[idx_entrada]["open"]
-                    idx_saida = idx_entrada + pd.Timedelta(minutes=5 * int(candles_pos_entrada))
-
-                    if idx_saida not in df.index or idx_saida.date() != idx_entrada.date():
-                        dias_ignorados.append((dia_atual, "Sem candle de saída"))
-                        continue
-
-                    if tipo_ativo in ['mini_indice', 'mini_dolar'] and idx_saida.time() > time_obj(18, 20):
-                        dias_ignorados.append((dia_atual, "Candle de saída após 18:20"))
-                        continue
-                    elif tipo_ativo == 'acoes' and idx_saida.time() > time_obj(17, 0):
-                        dias_ignorados.append((dia_atual, "Candle de saída após 17:00"))
-                        continue
-
-                    preco_saida = df.loc[idx_saida]["open"]
-                    referencia_valor = None
-                    referencia_label = ""
-                    if referencia == "Fechamento do dia anterior":
-                        ref_series = df[df.index.date == dia_anterior]["close"]
-                        if not ref_series.empty:
-                            referencia_valor = ref_series.iloc[-1]
-                            referencia_label = f"Fechamento {dia_anterior.strftime('%d/%m')}: {referencia_valor:.2f}"
-                        else:
-                            dias_ignorados.append((dia_atual, "Sem fechamento do dia anterior"))
-                            continue
-                    elif referencia == "Mínima do dia anterior":
-                        ref_series = df[df.index.date == dia_anterior]["low"]
-                        if not ref_series.empty:
-                            referencia_valor = ref_series.min()
-                            referencia_label = f"Mínima {dia_anterior.strftime('%d/%m')}: {referencia_valor:.2f}"
-                        else:
-                            dias_ignorados.append((dia_atual, "Sem mínima do dia anterior"))
-                            continue
-                    elif referencia == "Abertura do dia atual":
-                        if not df_dia_atual["open"].empty:
-                            referencia_valor = df_dia_atual["open"].iloc[0]
-                            referencia_label = f"Abertura {dia_atual.strftime('%d/%m')}: {referencia_valor:.2f}"
-                        else:
-                            dias_ignorados.append((dia_atual, "Sem abertura do dia atual"))
-                            continue
-
-                    if referencia_valor is None or referencia_valor <= 0:
-                        dias_ignorados.append((dia_atual, "Referência inválida"))
-                        continue
-
-                    distorcao_percentual = ((preco_entrada - referencia_valor) / referencia_valor) * 100
-                    horario_entrada_str = idx_entrada.strftime("%H:%M")
-
-                    if horario_entrada_str not in horarios_selecionados:
-                        continue
-
-                    if tipo_ativo == "acoes":
-                        valor_ponto = 1.0
-                    else:
-                        valor_ponto = 0.20 if tipo_ativo == "mini_indice" else 10.00
-
-                    if modo_estrategia in ["A Favor da Tendência", "Ambos"]:
-                        if distorcao_percentual > dist_favor_compra:
-                            lucro_reais = (preco_saida - preco_entrada) * valor_ponto * qtd
-                            max_dd = calcular_max_drawdown(df, idx_entrada, idx_saida, "Compra")
-                            todas_operacoes.append({
-                                "Ação": ticker_nome,
-                                "Direção": "Compra (Favor)",
-                                "Horário": horario_entrada_str,
-                                "Data Entrada": idx_entrada.strftime("%d/%m/%Y %H:%M"),
-                                "Data Saída": idx_saida.strftime("%d/%m/%Y %H:%M"),
-                                "Preço Entrada": round(preco_entrada, 2),
-                                "Preço Saída": round(preco_saida, 2),
-                                "Lucro (R$)": round(lucro_reais, 2),
-                                "Distorção (%)": f"{distorcao_percentual:.2f}%",
-                                "Quantidade": qtd,
-                                "Referência": referencia_label,
-                                "Max Drawdown %": max_dd
-                            })
-                            dias_com_entrada.add(dia_atual)
-                        elif distorcao_percentual < -dist_favor_venda:
-                            lucro_reais = (preco_entrada - preco_saida) * valor_ponto * qtd
-                            max_dd = calcular_max_drawdown(df, idx_entrada, idx_saida, "Venda")
-                            todas_operacoes.append({
-                                "Ação": ticker_nome,
-                                "Direção": "Venda (Favor)",
-                                "Horário": horario_entrada_str,
-                                "Data Entrada": idx_entrada.strftime("%d/%m/%Y %H:%M"),
-                                "Data Saída": idx_saida.strftime("%d/%m/%Y %H:%M"),
-                                "Preço Entrada": round(preco_entrada, 2),
-                                "Preço Saída": round(preco_saida, 2),
-                                "Lucro (R$)": round(lucro_reais, 2),
-                                "Distorção (%)": f"{distorcao_percentual:.2f}%",
-                                "Quantidade": qtd,
-                                "Referência": referencia_label,
-                                "Max Drawdown %": max_dd
-                            })
-                            dias_com_entrada.add(dia_atual)
-
-                    if modo_estrategia in ["Contra Tendência", "Ambos"]:
-                        if distorcao_percentual < -dist_compra_contra:
-                            lucro_reais = (preco_saida - preco_entrada) * valor_ponto * qtd
-                            max_dd = calcular_max_drawdown(df, idx_entrada, idx_saida, "Compra")
-                            todas_operacoes.append({
-                                "Ação": ticker_nome,
-                                "Direção": "Compra (Contra)",
-                                "Horário": horario_entrada_str,
-                                "Data Entrada": idx_entrada.strftime("%d/%m/%Y %H:%M"),
-                                "Data Saída": idx_saida.strftime("%d/%m/%Y %H:%M"),
-                                "Preço Entrada": round(preco_entrada, 2),
-                                "Preço Saída": round(preco_saida, 2),
-                                "Lucro (R$)": round(lucro_reais, 2),
-                                "Distorção (%)": f"{distorcao_percentual:.2f}%",
-                                "Quantidade": qtd,
-                                "Referência": referencia_label,
-                                "Max Drawdown %": max_dd
-                            })
-                            dias_com_entrada.add(dia_atual)
-                        elif distorcao_percentual > dist_venda_contra:
-                            lucro_reais = (preco_entrada - preco_saida) * valor_ponto * qtd
-                            max_dd = calcular_max_drawdown(df, idx_entrada, idx_saida, "Venda")
-                            todas_operacoes.append({
-                                "Ação": ticker_nome,
-                                "Direção": "Venda (Contra)",
-                                "Horário": horario_entrada_str,
-                                "Data Entrada": idx_entrada.strftime("%d/%m/%Y %H:%M"),
-                                "Data Saída": idx_saida.strftime("%d/%m/%Y %H:%M"),
-                                "Preço Entrada": round(preco_entrada, 2),
-                                "Preço Saída": round(preco_saida, 2),
-                                "Lucro (R$)": round(lucro_reais, 2),
-                                "Distorção (%)": f"{distorcao_percentual:.2f}%",
-                                "Quantidade": qtd,
-                                "Referência": referencia_label,
-                                "Max Drawdown %": max_dd
-                            })
-                            dias_com_entrada.add(dia_atual)
-            except Exception as e:
-                st.write(f"❌ Erro ao processar {file.name}: {e}")
-                continue
+    resultado = rastrear_com_cache(
+        uploaded_files,
+        {
+            "tipo_ativo": tipo_ativo,
+            "qtd": qtd,
+            "candles_pos_entrada": candles_pos_entrada,
+            "dist_compra_contra": dist_compra_contra,
+            "dist_venda_contra": dist_venda_contra,
+            "dist_favor_compra": dist_favor_compra,
+            "dist_favor_venda": dist_favor_venda,
+            "referencia": referencia,
+            "horarios_selecionados": horarios_selecionados,
+            "modo_estrategia": modo_estrategia,
+            "usar_filtro_liquidez": usar_filtro_liquidez,
+            "limite_liquidez": limite_liquidez,
+            "processos": processos
+        },
+        data_inicio,
+        data_fim,
+        medicao=medicao
+    )
+    mensagens_liquidez = resultado['mensagens_liquidez']
+
+    for nome, erro in resultado['erros_carga']:
+        st.error(f"❌ Erro ao processar {nome}: {erro}")
+    for nome, erro in resultado['erros']:
+        st.write(f"❌ Erro ao processar {nome}: {erro}")
 
     if usar_filtro_liquidez and mensagens_liquidez:
         with st.expander("📊 Detalhes do Filtro de Liquidez", expanded=False):
+            if len(resultado['liquidez']) > 1:
+                ranking = ranking_liquidez(resultado['liquidez'])
+                ranking["Volume Médio Diário (R$)"] = ranking["Volume Médio Diário (R$)"].map(
+                    lambda x: f"R$ {x:,.0f}" if pd.notna(x) else "-"
+                )
+                st.dataframe(ranking, use_container_width=True, hide_index=True)
             for msg in mensagens_liquidez:
                 if "✅" in msg:
                     st.markdown(f"<span style='color: green;'>{msg}</span>", unsafe_allow_html=True)
@@ -373,13 +96,145 @@ def processar_rastreamento_intraday(
                 else:
                     st.markdown(f"<span style='color: gray;'>{msg}</span>", unsafe_allow_html=True)
 
-    for file_name in arquivos_ignorados:
+    for file_name in resultado['arquivos_ignorados']:
         ticker_nome = extrair_nome_completo(file_name)
         tipo_arquivo = identificar_tipo(ticker_nome)
         st.warning(f"⚠️ Arquivo ignorado ({file_name}): é um **{tipo_arquivo.replace('_', ' ').title()}**, mas você selecionou **{tipo_ativo.replace('_', ' ').title()}**.")
 
-    df_ops = pd.DataFrame(todas_operacoes)
-    return df_ops, list(dias_com_entrada), dias_ignorados, sorted(todos_dias_com_dados)
+    return (resultado['operacoes'], resultado['dias_com_entrada'], resultado['dias_ignorados'],
+            resultado['dias_com_dados'], resultado['chave'])
+
+# ========================
+# FUNÇÃO: varredura de parâmetros (grade de distorções, candles e referências)
+# ========================
+# Arquivos carregados e filtrados (tipo e liquidez) como na tela principal
+def indices_para_varredura(uploaded_files, cfg, data_inicio, data_fim):
+    indices = []
+    for file in uploaded_files:
+        tipo_arquivo = tipo_do_arquivo(file)
+        if cfg["tipo_ativo"] != "todos" and tipo_arquivo != cfg["tipo_ativo"]:
+            continue
+        try:
+            resultado = carregar_arquivo(file, data_inicio, data_fim)
+        except Exception as e:
+            st.error(f"❌ Erro ao processar {getattr(file, 'name', 'arquivo desconhecido')}: {e}")
+            continue
+        if cfg["usar_filtro_liquidez"]:
+            _, aprovado = avaliar_liquidez(extrair_nome_completo(file.name), resultado[1]['liquidez'], cfg["limite_liquidez"])
+            if not aprovado:
+                continue
+        indices.append(resultado[1])
+    return indices
+
+def processar_varredura(uploaded_files, cfg, faixas, data_inicio, data_fim):
+    return executar_varredura(
+        indices_para_varredura(uploaded_files, cfg, data_inicio, data_fim),
+        tipo_ativo=cfg["tipo_ativo"],
+        qtd=cfg["qtd"],
+        horarios_selecionados=cfg["horarios_selecionados"],
+        modo_estrategia=cfg["modo_estrategia"],
+        faixas=faixas
+    )
+
+# ========================
+# FUNÇÃO: walk-forward (escolhe no treino, mede fora da amostra no teste)
+# ========================
+def processar_walk_forward(uploaded_files, cfg, faixas, dias_treino, dias_teste, data_inicio, data_fim):
+    return executar_walk_forward(
+        indices_para_varredura(uploaded_files, cfg, data_inicio, data_fim),
+        tipo_ativo=cfg["tipo_ativo"],
+        qtd=cfg["qtd"],
+        horarios_selecionados=cfg["horarios_selecionados"],
+        modo_estrategia=cfg["modo_estrategia"],
+        faixas=faixas,
+        dias_treino=dias_treino,
+        dias_teste=dias_teste
+    )
+
+# ========================
+# EXIBIÇÃO: ícones e cores a partir de códigos (sem laço por linha)
+# ========================
+LINHAS_POR_PAGINA = 500
+# Mesma ordem de DIRECOES: Compra/Venda (Favor), Compra/Venda (Contra)
+ICONES_DIRECAO = np.array(['🔼🟢', '🔽🔴', '🔽🟢', '🔼🔴', '⚪'], dtype=object)
+CORES_RESULTADO = np.array([
+    'background-color: #f8d7da', 'background-color: #fff3cd', 'background-color: #d4edda'
+], dtype=object)
+
+def icones_direcao(direcao):
+    codigos = direcao.cat.codes.to_numpy()
+    return ICONES_DIRECAO[np.where(codigos < 0, len(ICONES_DIRECAO) - 1, codigos)]
+
+# Styler.apply(axis=None): a tabela de estilos inteira sai de uma operação vetorizada
+def estilo_por_resultado(valores):
+    sinal = np.sign(np.nan_to_num(np.asarray(valores, dtype=np.float64))).astype(np.int64)
+    cores = CORES_RESULTADO[sinal + 1]
+
+    def estilo(tabela):
+        return pd.DataFrame(
+            np.repeat(cores[:, None], tabela.shape[1], axis=1), index=tabela.index, columns=tabela.columns
+        )
+    return estilo
+
+# ========================
+# EXIBIÇÃO: tempos por etapa e por ativo (só para administradores)
+# ========================
+def exibir_performance(resumo):
+    with st.expander("⏱️ Performance", expanded=False):
+        total = resumo['total_segundos']
+        memoria = resumo['pico_memoria_mb']
+        st.caption(
+            f"Total: {total:.2f}s · Pico de memória da execução: {f'{memoria:,.0f} MB' if memoria is not None else '-'}"
+            f" · Memória de resultados: {resumo.get('memoria_resultados', '-')}"
+        )
+        etapas = pd.DataFrame(resumo['etapas'], columns=['etapa', 'segundos', 'linhas', 'chamadas'])
+        etapas['% do total'] = etapas['segundos'] / total if total else np.nan
+        st.dataframe(
+            etapas.style.format({'segundos': '{:.3f}s', '% do total': '{:.1%}', 'linhas': '{:,.0f}'}, na_rep="-"),
+            use_container_width=True,
+            hide_index=True
+        )
+        if resumo['por_ticker']:
+            st.markdown("**Por ativo**")
+            por_ticker = pd.DataFrame(resumo['por_ticker']).sort_values('segundos', ascending=False)
+            st.dataframe(
+                por_ticker[['ticker', 'etapa', 'segundos', 'linhas', 'pico_memoria_mb']].style.format(
+                    {'segundos': '{:.3f}s', 'linhas': '{:,.0f}', 'pico_memoria_mb': '{:,.0f} MB'}, na_rep="-"
+                ),
+                use_container_width=True,
+                hide_index=True
+            )
+
+# ========================
+# EXIBIÇÃO: estado e sinais do scanner ao vivo
+# ========================
+def exibir_scanner(scanner, automatico=False):
+    ultima = scanner.ultima_consulta.strftime('%H:%M:%S') if scanner.ultima_consulta else "-"
+    st.write(f"{'🟢 Em execução' if scanner.em_execucao else '⚪ Parado'} · Última consulta: **{ultima}** · Candles avaliados: **{scanner.candles_avaliados}**")
+    sinais = scanner.sinais_recentes()
+    if sinais.empty:
+        st.info("Nenhum sinal até agora.")
+    else:
+        sinais.insert(0, ' ', sinais['Direção'].map(dict(zip(DIRECOES, ICONES_DIRECAO))))
+        st.dataframe(
+            sinais.style.format({
+                'Data': lambda d: d.strftime('%d/%m %H:%M'),
+                'Data Referência': lambda d: d.strftime('%d/%m') if d is not None else '-',
+                'Preço': '{:.2f}',
+                'Distorção (%)': '{:+.2f}%',
+                'Valor Referência': '{:.2f}'
+            }),
+            use_container_width=True,
+            hide_index=True
+        )
+    if scanner.parado_por_inatividade:
+        st.caption("⏸️ Parado por inatividade: a tela ficou sem atualizar por mais de "
+                   f"{int(scanner.sem_leitura_maxima.total_seconds() // 60)} min. Inicie de novo para retomar.")
+    for erro in list(scanner.erros)[-5:]:
+        st.caption(f"❌ {erro}")
+    # Parou entre duas atualizações: a página inteira é refeita e a atualização automática para
+    if automatico and not scanner.em_execucao:
+        st.rerun()
 
 # ========================
 # SISTEMA PRINCIPAL
@@ -409,109 +264,106 @@ def sistema_principal():
             st.error("❌ Acesso ao modo Intraday é exclusivo para o Plano Diamante.")
             st.stop()
 
-        # === DADOS DO YAHOO FINANCE (sem upload) ===
-        st.info("📡 Dados carregados automaticamente do Yahoo Finance (candles de 5min - últimos 60 dias)")
-
-        ticker_input = st.text_input("Digite o ativo (ex: PETR4, WINM24, WDOF24):", value="PETR4").strip()
-        if not ticker_input:
-            st.info("Por favor, digite um ativo para continuar.")
-            st.stop()
+        # Tempos por etapa: ligados para administradores (ou RADAR_MEDICAO=1); senão não custam nada
+        eh_admin = st.session_state.email.lower() in ADMINS
+        medicao = nova_medicao(eh_admin or MEDICAO_PADRAO, usuario=apelido_usuario(st.session_state.email))
 
-        # Ajusta o ticker: PETR4 → PETR4.SA | WINM24 → WINM24
-        ticker = ajustar_ticker(ticker_input)
-        nome_exibicao = ticker_input.upper()
+        # === DADOS DO YAHOO FINANCE (sem upload) ===
+        st.info("📡 Dados carregados automaticamente do Yahoo Finance (candles de 5min). O Yahoo entrega só os últimos 60 dias; "
+                "o histórico local acumula tudo o que já foi baixado ou enviado.")
+
+        escopo = st.radio("Escopo do rastreamento", ["Ativo único", "Universo de ativos", "Arquivos próprios"], horizontal=True)
+        if escopo == "Arquivos próprios":
+            arquivos_enviados = st.file_uploader(
+                "Envie arquivos de candles de 5min (Excel, CSV ou Parquet). O nome do arquivo identifica o ativo.",
+                type=["xlsx", "xls", "csv", "parquet"],
+                accept_multiple_files=True
+            )
+            if not arquivos_enviados:
+                st.info("Por favor, envie pelo menos um arquivo para continuar.")
+                st.stop()
+            tickers_entrada = []
+        elif escopo == "Ativo único":
+            ticker_input = st.text_input("Digite o ativo (ex: PETR4, WINM24, WDOF24):", value="PETR4").strip()
+            if not ticker_input:
+                st.info("Por favor, digite um ativo para continuar.")
+                st.stop()
+            tickers_entrada = [ticker_input.upper()]
+        else:
+            preset = st.selectbox("Universo", PRESETS_UNIVERSO + ["Lista personalizada"])
+            if preset == "Lista personalizada":
+                tickers_entrada = separar_watchlist(st.text_area(
+                    "Tickers (separados por vírgula, espaço ou linha):", value="PETR4, VALE3, ITUB4"
+                ))
+            else:
+                tickers_entrada = montar_universo(preset)
+                st.caption(f"Ativos: {', '.join(tickers_entrada)}")
+            if not tickers_entrada:
+                st.info("Por favor, informe pelo menos um ativo para continuar.")
+                st.stop()
 
-        with st.spinner(f"Baixando dados de `{ticker}`..."):
+        with st.spinner(f"Carregando dados de {len(tickers_entrada) or len(arquivos_enviados)} ativo(s)..."):
             try:
-                data = yf.download(ticker, period="60d", interval="5m", auto_adjust=True, progress=False)
-                if data.empty:
-                    st.error(f"⚠️ Nenhum dado encontrado para `{ticker}`. Verifique o nome do ativo.")
-                    st.stop()
-
-                data_reset = data.reset_index()
-
-                # 🔥 CORREÇÃO: Remover MultiIndex das colunas
-                if isinstance(data_reset.columns, pd.MultiIndex):
-                    new_columns = []
-                    for col in data_reset.columns:
-                        if isinstance(col, tuple):
-                            name = col[0] if col[0] else col[1]
-                        else:
-                            name = col
-                        new_columns.append(name)
-                    data_reset.columns = new_columns
-
-                # Garantir que temos uma coluna de data
-                datetime_col = None
-                for col in data_reset.columns:
-                    if 'datetime' in str(col).lower() or 'date' in str(col).lower():
-                        datetime_col = col
-                        break
-
-                if datetime_col is None:
-                    st.error("❌ Erro: nenhuma coluna de data encontrada.")
-                    st.stop()
+                if escopo == "Arquivos próprios":
+                    # Lidos uma vez aqui; Excel/CSV ficam em cache como Parquet
+                    uploaded_files = []
+                    sem_dados = []
+                    erros_download = {}
+                    for enviado in arquivos_enviados:
+                        nome = extrair_nome_completo(enviado.name)
+                        try:
+                            with medicao.etapa("leitura", ticker=nome) as etapa:
+                                data_reset = ler_candles(enviado)
+                                etapa["linhas"] = len(data_reset)
+                        except Exception as e:
+                            erros_download[nome] = str(e)
+                            data_reset = None
+                        if data_reset is None or data_reset.empty:
+                            sem_dados.append(nome)
+                            continue
+                        # Candles enviados entram num histórico longo próprio (separado do Yahoo),
+                        # lido por período no rastreamento como o dos tickers do Yahoo
+                        historico = caminho_historico(ajustar_ticker(nome), intervalo="5m", fonte="upload")
+                        try:
+                            acrescentar_historico(historico, data_reset)
+                        except Exception as e:
+                            st.warning(f"⚠️ {nome}: histórico local não atualizado ({e})")
+                            historico = None
+                        fake_file = FakeFile(f"{nome}.xlsx", data_reset, historico)
+                        fake_file.ticker = None
+                        fake_file.referencias_em_cache = False
+                        uploaded_files.append(fake_file)
+                else:
+                    # Ajusta o ticker (PETR4 → PETR4.SA | WINM24 → WINM24) e lê do cache local / Yahoo
+                    with medicao.etapa("download (cache + Yahoo)") as etapa:
+                        uploaded_files, sem_dados, erros_download = arquivos_de_tickers(tickers_entrada, intervalo="5m")
+                        etapa["linhas"] = sum(f.manifesto["linhas"] for f in uploaded_files)
 
-                if datetime_col != 'Data':
-                    data_reset.rename(columns={datetime_col: 'Data'}, inplace=True)
-
-                # Renomear colunas
-                rename_map = {}
-                for c in data_reset.columns:
-                    lc = str(c).lower()
-                    if 'open' in lc or 'abert' in lc: rename_map[c] = 'Abertura'
-                    if 'high' in lc or 'max' in lc: rename_map[c] = 'Máxima'
-                    if 'low' in lc or 'min' in lc: rename_map[c] = 'Mínima'
-                    if 'close' in lc or 'fech' in lc: rename_map[c] = 'Fechamento'
-                    if 'volume' in lc or lc == 'vol': rename_map[c] = 'Volume'
-                data_reset.rename(columns=rename_map, inplace=True)
-
-                # Verificar colunas essenciais
-                colunas_necessarias = ['Data', 'Abertura', 'Máxima', 'Mínima', 'Fechamento', 'Volume']
-                for col in colunas_necessarias:
-                    if col not in data_reset.columns:
-                        st.error(f"❌ Coluna obrigatória ausente: `{col}`")
-                        st.stop()
-
-                # Converter para datetime
-                data_reset['Data'] = pd.to_datetime(data_reset['Data'], errors='coerce', dayfirst=True)
-                data_reset = data_reset.dropna(subset=['Data']).copy()
-                if data_reset.empty:
-                    st.error("⚠️ Nenhum dado válido após conversão da data.")
+                if not uploaded_files:
+                    st.error(f"⚠️ Nenhum dado encontrado para `{', '.join(sem_dados)}`. Verifique o nome do ativo.")
                     st.stop()
-
-                # Simular "arquivo" para compatibilidade
-                class FakeFile:
-                    def __init__(self, name, df):
-                        self.name = name
-                        self.df = df
-
-                fake_file = FakeFile(f"{nome_exibicao}.xlsx", data_reset)
-                uploaded_files = [fake_file]
-
-                st.success(f"✅ Dados de `{nome_exibicao}` carregados com sucesso! 📊 Total: {len(data_reset)} candles de 5min")
+                if sem_dados:
+                    st.warning(f"⚠️ Sem dados para: {', '.join(sem_dados)}")
+                    for ticker in sem_dados:
+                        if ticker in erros_download:
+                            st.caption(f"{ticker}: {erros_download[ticker]}")
+
+                total_candles = sum(f.manifesto["linhas"] for f in uploaded_files)
+                if len(uploaded_files) == 1:
+                    st.success(f"✅ Dados de `{uploaded_files[0].name.split('.')[0]}` carregados com sucesso! 📊 Total: {total_candles} candles de 5min")
+                else:
+                    st.success(f"✅ Dados de {len(uploaded_files)} ativos carregados com sucesso! 📊 Total: {total_candles} candles de 5min")
 
             except Exception as e:
                 st.error(f"❌ Erro ao baixar ou processar dados: {e}")
                 st.stop()
 
-        # Lê o período real dos dados baixados
-        data_min_global = None
-        data_max_global = None
-        for file in uploaded_files:
-            try:
-                df_temp = file.df.copy()
-                df_temp['data'] = pd.to_datetime(df_temp['Data'], dayfirst=True, errors='coerce')
-                df_temp = df_temp.dropna(subset=['data'])
-                df_temp['data_sozinha'] = df_temp['data'].dt.date
-                min_data = df_temp['data_sozinha'].min()
-                max_data = df_temp['data_sozinha'].max()
-                if data_min_global is None or min_data < data_min_global:
-                    data_min_global = min_data
-                if data_max_global is None or max_data > data_max_global:
-                    data_max_global = max_data
-            except Exception as e:
-                st.warning(f"⚠️ Erro ao processar {file.name}: {e}")
+        # Período real dos dados: lido do manifesto de cada arquivo (calculado na ingestão)
+        with medicao.etapa("período disponível"):
+            inicios = [file.manifesto['inicio'] for file in uploaded_files if file.manifesto['inicio'] is not None]
+            fins = [file.manifesto['fim'] for file in uploaded_files if file.manifesto['fim'] is not None]
+            data_min_global = min(inicios) if inicios else None
+            data_max_global = max(fins) if fins else None
 
         if data_min_global and data_max_global:
             st.subheader("📅 Período disponível")
@@ -532,12 +384,7 @@ def sistema_principal():
 
             st.header("⚙️ Configure o Rastreamento")
 
-            # Calcular horários válidos
-            fim_pregao = {
-                'acoes': time_obj(17, 0),
-                'mini_indice': time_obj(18, 20),
-                'mini_dolar': time_obj(18, 20)
-            }
+            # Calcular horários válidos (fim do pregão regular, do calendário da B3)
             horarios_validos = [f"{h:02d}:{m:02d}" for h in range(9, 19) for m in range(0, 60, 5)]
 
             with st.form("configuracoes"):
@@ -545,8 +392,9 @@ def sistema_principal():
                 qtd = st.number_input("Quantidade", min_value=1, value=1)
                 candles_pos_entrada = st.number_input("Candles após entrada", min_value=1, value=3)
 
-                # Atualizar último horário com base no tipo
-                ultimo_horario_entrada = (datetime.combine(datetime.today(), fim_pregao[tipo_ativo]) - pd.Timedelta(minutes=5 * int(candles_pos_entrada))).time()
+                # Atualizar último horário com base no tipo e no fechamento dos pregões do período
+                fim_pregao = fechamento_maximo(tipo_ativo, data_inicio, data_fim)
+                ultimo_horario_entrada = (datetime.combine(datetime.today(), time_obj(0, 0)) + pd.Timedelta(minutes=fim_pregao - 5 * int(candles_pos_entrada))).time()
                 horarios_filtrados = [h for h in horarios_validos if datetime.strptime(h, '%H:%M').time() <= ultimo_horario_entrada]
 
                 if len(horarios_filtrados) == 0:
@@ -586,6 +434,13 @@ def sistema_principal():
                     help="Ignora ativos com volume diário médio inferior a este valor.",
                     disabled=not usar_filtro_liquidez
                 )
+                processos = st.number_input(
+                    "Processos paralelos",
+                    min_value=0,
+                    max_value=processos_disponiveis(),
+                    value=0,
+                    help="0 = tudo no processo atual. Com vários ativos, cada um é carregado e testado em um processo."
+                )
                 submitted = st.form_submit_button("✅ Aplicar Configurações")
 
             if submitted:
@@ -604,15 +459,22 @@ def sistema_principal():
                         "horarios_selecionados": horarios_selecionados,
                         "modo_estrategia": modo_estrategia,
                         "usar_filtro_liquidez": usar_filtro_liquidez,
-                        "limite_liquidez": limite_liquidez
+                        "limite_liquidez": limite_liquidez,
+                        "processos": processos
                     }
                     st.success("✅ Configurações aplicadas!")
 
             if "configuracoes_salvas" in st.session_state:
+                # O último rastreamento pedido continua na tela nas próximas interações
+                # (expanders, download): com a mesma configuração e período, o
+                # resultado vem da memória de resultados, sem recalcular.
+                pedido = (st.session_state.configuracoes_salvas, data_inicio, data_fim)
                 if st.button("🔍 Iniciar Rastreamento"):
+                    st.session_state.rastreamento_pedido = pedido
+                if st.session_state.get("rastreamento_pedido") == pedido:
                     cfg = st.session_state.configuracoes_salvas
                     with st.spinner("📡 Rastreando padrões de mercado..."):
-                        df_ops, dias_com_entrada, dias_ignorados, todos_dias_com_dados = processar_rastreamento_intraday(
+                        df_ops, dias_com_entrada, dias_ignorados, todos_dias_com_dados, chave_resultado = processar_rastreamento_intraday(
                             uploaded_files=uploaded_files,
                             tipo_ativo=cfg["tipo_ativo"],
                             qtd=cfg["qtd"],
@@ -627,49 +489,67 @@ def sistema_principal():
                             data_fim=data_fim,
                             modo_estrategia=cfg["modo_estrategia"],
                             usar_filtro_liquidez=cfg["usar_filtro_liquidez"],
-                            limite_liquidez=cfg["limite_liquidez"]
+                            limite_liquidez=cfg["limite_liquidez"],
+                            processos=cfg.get("processos", 0),
+                            medicao=medicao
                         )
+                    # Guarda a tabela de referências junto do cache de candles para as próximas execuções
+                    with medicao.etapa("referências (gravar)"):
+                        for file in uploaded_files:
+                            if file.ticker and not file.referencias_em_cache and getattr(file, "referencias_diarias", None) is not None:
+                                salvar_referencias(file.ticker, file.referencias_diarias, intervalo="5m")
                     if not df_ops.empty:
                         df_ops = df_ops[df_ops['Horário'].isin(cfg["horarios_selecionados"])].copy()
                         st.session_state.todas_operacoes = df_ops
                         st.success(f"✅ Rastreamento concluído: {len(df_ops)} oportunidades detectadas.")
-                        for col in ['Preço Entrada', 'Preço Saída', 'Lucro (R$)', 'Max Drawdown %']:
-                            if col in df_ops.columns and df_ops[col].dtype == 'object':
-                                df_ops[col] = pd.to_numeric(df_ops[col].astype(str).str.replace(',', '.'), errors='coerce')
                         st.markdown("### 📊 Resumo Consolidado por Horário de Entrada")
-                        resumo = df_ops.groupby(['Horário', 'Ação', 'Direção'], as_index=False).agg(
-                            Total_Eventos=('Lucro (R$)', 'count'),
-                            Acertos=('Lucro (R$)', lambda x: (x > 0).sum()),
-                            Lucro_Total=('Lucro (R$)', 'sum'),
-                            Max_DD_Medio=('Max Drawdown %', 'mean')
-                        )
-                        def icone_resumo(row):
-                            if 'Contra' in row['Direção']:
-                                return '🔽🟢' if 'Compra' in row['Direção'] else '🔼🔴'
-                            elif 'Favor' in row['Direção']:
-                                return '🔼🟢' if 'Compra' in row['Direção'] else '🔽🔴'
-                            return '⚪'
-                        resumo[' '] = resumo.apply(icone_resumo, axis=1)
-                        resumo['Taxa de Acerto'] = (resumo['Acertos'] / resumo['Total_Eventos']).map('{:.2%}'.format)
-                        resumo['Lucro Total (R$)'] = resumo['Lucro_Total'].map(lambda x: f"R$ {x:.2f}")
-                        resumo['Ganho Médio por Trade (R$)'] = (resumo['Lucro_Total'] / resumo['Total_Eventos']).map(lambda x: f"R$ {x:+.2f}")
-                        resumo['Máx. Drawdown Médio (%)'] = resumo['Max_DD_Medio'].map(lambda x: f"{x:+.2f}%")
-                        resumo = resumo[[
-                            ' ', 'Horário', 'Ação', 'Direção', 'Total_Eventos', 'Acertos', 'Taxa de Acerto',
-                            'Lucro Total (R$)', 'Ganho Médio por Trade (R$)', 'Máx. Drawdown Médio (%)'
-                        ]]
-                        def cor_resumo(row):
-                            try:
-                                valor = float(row['Lucro Total (R$)'].replace('R$', '').strip())
-                            except:
-                                valor = 0.0
-                            cor = '#d4edda' if valor > 0 else '#f8d7da' if valor < 0 else '#fff3cd'
-                            return [f'background-color: {cor}'] * len(row)
-                        st.dataframe(
-                            resumo.style.apply(cor_resumo, axis=1),
-                            use_container_width=True,
-                            hide_index=True
+                        mostrar_intervalos = st.checkbox(
+                            "📐 Intervalos de confiança de 95% (bootstrap)",
+                            help="Reamostra as operações de cada grupo para mostrar a faixa plausível de acerto, ganho médio e drawdown."
                         )
+                        intervalos = None
+                        if mostrar_intervalos:
+                            with medicao.etapa("bootstrap", linhas=len(df_ops)):
+                                # Calculados uma vez por resultado (mesma memória do rastreamento)
+                                chave_intervalos = f"{chave_resultado}:bootstrap"
+                                intervalos = cache_resultados.obter(chave_intervalos)
+                                if intervalos is None:
+                                    intervalos = intervalos_bootstrap(df_ops, ['Horário', 'Ação', 'Direção'])
+                                    cache_resultados.guardar(chave_intervalos, intervalos)
+                        with medicao.etapa("resumo por horário", linhas=len(df_ops)):
+                            resumo = resumir_operacoes(df_ops, ['Horário', 'Ação', 'Direção'])
+                            resumo[' '] = icones_direcao(resumo['Direção'])
+                            resumo['Taxa de Acerto'] = resumo['Acertos'] / resumo['Total_Eventos']
+                            resumo['Lucro Total (R$)'] = resumo['Lucro_Total']
+                            resumo['Ganho Médio por Trade (R$)'] = resumo['Lucro_Total'] / resumo['Total_Eventos']
+                            resumo['Máx. Drawdown Médio (%)'] = resumo['Max_DD_Medio']
+                            colunas_resumo = [
+                                ' ', 'Horário', 'Ação', 'Direção', 'Total_Eventos', 'Acertos', 'Taxa de Acerto',
+                                'Lucro Total (R$)', 'Ganho Médio por Trade (R$)', 'Máx. Drawdown Médio (%)'
+                            ]
+                            formatos_resumo = {
+                                'Taxa de Acerto': '{:.2%}',
+                                'Lucro Total (R$)': 'R$ {:.2f}',
+                                'Ganho Médio por Trade (R$)': 'R$ {:+.2f}',
+                                'Máx. Drawdown Médio (%)': '{:+.2f}%'
+                            }
+                            if intervalos is not None:
+                                resumo = resumo.merge(intervalos, on=['Horário', 'Ação', 'Direção'], how='left')
+                                colunas_resumo += COLUNAS_INTERVALO
+                                formatos_resumo.update({
+                                    coluna: '{:.2%}' if coluna.startswith('Taxa') else
+                                    'R$ {:+.2f}' if coluna.startswith('Ganho') else '{:+.2f}%'
+                                    for coluna in COLUNAS_INTERVALO
+                                })
+                            resumo = resumo[colunas_resumo]
+                            # Números continuam números: o texto vem do format() do Styler, só nas células exibidas
+                            st.dataframe(
+                                resumo.style.apply(estilo_por_resultado(resumo['Lucro Total (R$)']), axis=None).format(
+                                    formatos_resumo, na_rep="-"
+                                ),
+                                use_container_width=True,
+                                hide_index=True
+                            )
                         with st.expander("ℹ️ O que significam os ícones?"):
                             st.markdown("""
                             - **🔽🟢** = Compra (Contra) → Reversão (espera recuperação)  
@@ -677,52 +557,254 @@ def sistema_principal():
                             - **🔼🟢** = Compra (Favor) → A Favor da Tendência (acompanha alta)  
                             - **🔽🔴** = Venda (Favor) → A Favor da Tendência (acompanha queda)  
                             """)
-                        csv_data = df_ops.to_csv(index=False, sep=";", decimal=",", encoding='utf-8-sig')
-                        st.download_button(
-                            label="📥 Exportar Resultados para CSV",
-                            data=csv_data,
-                            file_name="resultados_intraday.csv",
-                            mime="text/csv"
-                        )
+                        if df_ops['Ação'].nunique() > 1:
+                            st.markdown("### 🗂️ Resumo por Ativo (universo)")
+                            resumo_ativos = resumir_operacoes(df_ops, ['Ação']).sort_values('Lucro_Total', ascending=False)
+                            resumo_ativos['Taxa de Acerto'] = resumo_ativos['Acertos'] / resumo_ativos['Total_Eventos']
+                            resumo_ativos['Lucro Total (R$)'] = resumo_ativos['Lucro_Total']
+                            st.dataframe(
+                                resumo_ativos[['Ação', 'Total_Eventos', 'Acertos', 'Taxa de Acerto', 'Lucro Total (R$)']].style.format({
+                                    'Taxa de Acerto': '{:.2%}',
+                                    'Lucro Total (R$)': 'R$ {:.2f}'
+                                }),
+                                use_container_width=True,
+                                hide_index=True
+                            )
+                        formato_exportacao = st.radio("Formato da exportação", list(FORMATOS), horizontal=True)
+                        extensao, mime = FORMATOS[formato_exportacao]
+                        # O arquivo só é gerado (ou reaproveitado do disco) quando pedido, e o botão de
+                        # download só aparece nessa execução: o st.download_button carrega o arquivo
+                        # inteiro na memória, e assim isso não se repete a cada interação com a tela.
+                        # No CSV o texto (datas, distorção, referência) é montado bloco a bloco.
+                        if st.button(f"📦 Preparar exportação ({formato_exportacao})"):
+                            with medicao.etapa("exportação", linhas=len(df_ops)):
+                                arquivo_exportado = abrir_exportacao(
+                                    df_ops, chave_resultado, "resultados_intraday", formato_exportacao,
+                                    formatar_operacoes if formato_exportacao == "CSV" else None
+                                )
+                            with arquivo_exportado:
+                                st.download_button(
+                                    label=f"📥 Exportar Resultados ({formato_exportacao})",
+                                    data=arquivo_exportado,
+                                    file_name=f"resultados_intraday.{extensao}",
+                                    mime=mime
+                                )
                         with st.expander("📊 Análise de Dias"):
                             st.write("Dias com entrada e saída válida:", len(dias_com_entrada))
                             if dias_ignorados:
                                 st.write("Dias ignorados:")
                                 for dia, motivo in dias_ignorados[:10]:
                                     st.write(f"- {dia.strftime('%d/%m')} → {motivo}")
+                        with st.expander("💼 Simulação de Carteira"):
+                            st.caption("Todas as oportunidades acima disputam o mesmo capital: margem por contrato (WIN/WDO) ou valor integral (ações), limite de posições simultâneas e perda máxima por dia (0 = sem limite). No mesmo minuto, as operações entram na ordem da tabela; a que não cabe no capital livre é pulada e as seguintes ainda podem entrar.")
+                            with st.form("carteira"):
+                                c1, c2, c3 = st.columns(3)
+                                capital_inicial = c1.number_input("Capital inicial (R$)", min_value=0.0, value=100000.0, step=1000.0)
+                                max_posicoes = c2.number_input("Máx. de posições simultâneas", min_value=0, value=5)
+                                perda_maxima_dia = c3.number_input("Perda máxima por dia (R$)", min_value=0.0, value=0.0, step=100.0)
+                                c1, c2 = st.columns(2)
+                                margem_win = c1.number_input("Margem WIN (% do nocional)", min_value=0.0, value=MARGEM_PADRAO['mini_indice'] * 100)
+                                margem_wdo = c2.number_input("Margem WDO (% do nocional)", min_value=0.0, value=MARGEM_PADRAO['mini_dolar'] * 100)
+                                simular_btn = st.form_submit_button("💼 Simular Carteira")
+                            if simular_btn:
+                                with medicao.etapa("carteira", linhas=len(df_ops)):
+                                    carteira = simular_carteira(
+                                        df_ops, capital_inicial, int(max_posicoes), perda_maxima_dia,
+                                        {'mini_indice': margem_win / 100, 'mini_dolar': margem_wdo / 100}
+                                    )
+                                resumo_carteira = carteira["resumo"]
+                                c1, c2, c3, c4 = st.columns(4)
+                                c1.metric("Patrimônio final", f"R$ {resumo_carteira['capital_final']:,.2f}",
+                                          f"R$ {resumo_carteira['capital_final'] - resumo_carteira['capital_inicial']:+,.2f}")
+                                c2.metric("Drawdown máximo", f"R$ {resumo_carteira['max_drawdown']:,.2f}",
+                                          f"{resumo_carteira['max_drawdown_pct']:+.2f}%", delta_color="off")
+                                c3.metric("Operações executadas", resumo_carteira['operacoes_executadas'],
+                                          f"{resumo_carteira['operacoes_recusadas']} recusadas", delta_color="off")
+                                c4.metric("Pico de posições abertas", resumo_carteira['max_posicoes_simultaneas'])
+                                if not carteira["curva"].empty:
+                                    st.line_chart(carteira["curva"].set_index("Data")[["Patrimônio (R$)", "Drawdown (R$)"]])
+                                    st.markdown("**Resultado diário da carteira**")
+                                    diario = carteira["diario"]
+                                    st.dataframe(
+                                        diario.style.apply(estilo_por_resultado(diario['Lucro do Dia (R$)']), axis=None).format({
+                                            'Dia': lambda d: d.strftime('%d/%m/%Y'),
+                                            'Lucro do Dia (R$)': 'R$ {:+.2f}',
+                                            'Patrimônio (R$)': 'R$ {:.2f}'
+                                        }),
+                                        use_container_width=True,
+                                        hide_index=True
+                                    )
+                                recusadas = carteira["operacoes"].loc[~carteira["operacoes"]["Executada"], "Motivo"]
+                                if len(recusadas):
+                                    st.markdown("**Operações recusadas por motivo**")
+                                    st.dataframe(
+                                        recusadas.value_counts().loc[lambda c: c > 0].rename("Operações").rename_axis("Motivo").reset_index(),
+                                        hide_index=True
+                                    )
                         if not df_ops.empty:
                             with st.expander("🔍 Ver oportunidades detalhadas (Intraday)"):
-                                df_detalhe = df_ops.copy()
-                                df_detalhe['Lucro (R$)'] = pd.to_numeric(df_detalhe['Lucro (R$)'], errors='coerce')
-                                df_detalhe['Acerto?'] = df_detalhe['Lucro (R$)'].apply(
-                                    lambda x: '✅ Sim' if x > 0 else '❌ Não' if x < 0 else '➖ Neutro'
+                                # Só a página visível é formatada e estilizada
+                                total = len(df_ops)
+                                paginas = -(-total // LINHAS_POR_PAGINA)
+                                pagina = 1
+                                if paginas > 1:
+                                    pagina = st.number_input(f"Página (de {paginas})", min_value=1, max_value=paginas, value=1, key="pagina_detalhe")
+                                inicio = (pagina - 1) * LINHAS_POR_PAGINA
+                                fatia = df_ops.iloc[inicio:inicio + LINHAS_POR_PAGINA]
+                                st.caption(f"Operações {inicio + 1} a {inicio + len(fatia)} de {total}")
+
+                                with medicao.etapa("detalhe (página)", linhas=len(fatia)):
+                                    df_detalhe = formatar_operacoes(fatia)
+                                    lucro = df_detalhe['Lucro (R$)'].to_numpy()
+                                    df_detalhe.insert(
+                                        df_detalhe.columns.get_loc('Lucro (R$)') + 1, 'Acerto?',
+                                        np.select([lucro > 0, lucro < 0], ['✅ Sim', '❌ Não'], '➖ Neutro')
+                                    )
+                                    df_detalhe.insert(0, ' ', icones_direcao(fatia['Direção']))
+                                    st.dataframe(
+                                        df_detalhe.style.apply(estilo_por_resultado(df_detalhe['Lucro (R$)']), axis=None),
+                                        use_container_width=True,
+                                        hide_index=True
+                                    )
+
+                    # Uma linha JSON por execução no log; o painel só aparece para administradores
+                    if medicao.ativa:
+                        resumo_medicao = medicao.registrar_log()
+                        if eh_admin:
+                            exibir_performance(resumo_medicao)
+
+                # ========================
+                # VARREDURA DE PARÂMETROS
+                # ========================
+                cfg = st.session_state.configuracoes_salvas
+                with st.expander("🧪 Varredura de Parâmetros"):
+                    st.caption("Testa várias combinações de distorção, candles e referência de uma só vez, usando o mesmo modo e horários configurados.")
+                    with st.form("varredura"):
+                        faixas = {}
+                        limiares = []
+                        if cfg["modo_estrategia"] in ["A Favor da Tendência", "Ambos"]:
+                            limiares += [("dist_favor_compra", "COMPRA - A Favor"), ("dist_favor_venda", "VENDA - A Favor")]
+                        if cfg["modo_estrategia"] in ["Contra Tendência", "Ambos"]:
+                            limiares += [("dist_compra_contra", "COMPRA - Contra"), ("dist_venda_contra", "VENDA - Contra")]
+                        for chave, rotulo in limiares:
+                            c1, c2, c3 = st.columns(3)
+                            de = c1.number_input(f"{rotulo}: de (%)", value=0.1, key=f"var_{chave}_de")
+                            ate = c2.number_input(f"{rotulo}: até (%)", value=1.0, key=f"var_{chave}_ate")
+                            passo = c3.number_input(f"{rotulo}: passo (%)", min_value=0.0, value=0.1, key=f"var_{chave}_passo")
+                            faixas[chave] = gerar_faixa(de, ate, passo)
+                        for chave in ["dist_favor_compra", "dist_favor_venda", "dist_compra_contra", "dist_venda_contra"]:
+                            faixas.setdefault(chave, [0.0])
+                        faixas["candles_pos_entrada"] = st.multiselect(
+                            "Candles após entrada",
+                            options=list(range(1, 37)),
+                            default=[int(cfg["candles_pos_entrada"])]
+                        )
+                        faixas["referencia"] = st.multiselect("Referências", REFERENCIAS, default=[cfg["referencia"]])
+                        st.caption("Walk-forward: em cada janela, escolhe a melhor combinação de cada horário nos dias de treino e mede o resultado nos dias seguintes (teste), fora da amostra.")
+                        c1, c2 = st.columns(2)
+                        dias_treino = c1.number_input("Dias de treino", min_value=5, value=20)
+                        dias_teste = c2.number_input("Dias de teste", min_value=1, value=5)
+                        b1, b2 = st.columns(2)
+                        executar_varredura_btn = b1.form_submit_button("🧪 Executar Varredura")
+                        executar_walk_forward_btn = b2.form_submit_button("🚶 Executar Walk-forward")
+
+                    if executar_varredura_btn:
+                        if not faixas["candles_pos_entrada"] or not faixas["referencia"]:
+                            st.warning("⚠️ Selecione pelo menos um valor de candles e uma referência.")
+                        else:
+                            with st.spinner("🧪 Avaliando combinações..."):
+                                df_varredura = processar_varredura(uploaded_files, cfg, faixas, data_inicio, data_fim)
+                            if df_varredura.empty:
+                                st.warning("⚠️ Nenhuma combinação pôde ser avaliada.")
+                            else:
+                                st.success(f"✅ {len(df_varredura)} combinações avaliadas.")
+                                df_top = df_varredura.head(100)
+                                st.dataframe(
+                                    df_top.style.format({
+                                        "Taxa de Acerto": "{:.2%}",
+                                        "Lucro Total (R$)": "R$ {:.2f}",
+                                        "Máx. Drawdown Médio (%)": "{:+.2f}%"
+                                    }, na_rep="-"),
+                                    use_container_width=True,
+                                    hide_index=True
+                                )
+                                with abrir_exportacao(
+                                    df_varredura, cache_resultados.impressao_candles(df_varredura), "varredura_intraday"
+                                ) as arquivo_exportado:
+                                    st.download_button(
+                                        label="📥 Exportar Varredura para CSV",
+                                        data=arquivo_exportado,
+                                        file_name="varredura_intraday.csv",
+                                        mime="text/csv"
+                                    )
+
+                    if executar_walk_forward_btn:
+                        if not faixas["candles_pos_entrada"] or not faixas["referencia"]:
+                            st.warning("⚠️ Selecione pelo menos um valor de candles e uma referência.")
+                        else:
+                            with st.spinner("🚶 Avaliando janelas de treino e teste..."):
+                                df_janelas, df_resumo_janelas = processar_walk_forward(
+                                    uploaded_files, cfg, faixas, int(dias_treino), int(dias_teste), data_inicio, data_fim
+                                )
+                            if df_janelas.empty:
+                                st.warning("⚠️ Nenhuma janela com horário lucrativo no treino (ou período curto demais para treino + teste).")
+                            else:
+                                lucro_fora = df_resumo_janelas['Lucro_Teste'].sum()
+                                eventos_fora = df_resumo_janelas['Total_Eventos'].sum()
+                                taxa_fora = df_resumo_janelas['Acertos'].sum() / eventos_fora if eventos_fora else float('nan')
+                                st.success(f"✅ {len(df_resumo_janelas)} janelas · Fora da amostra: {eventos_fora} operações, acerto {taxa_fora:.2%}, lucro R$ {lucro_fora:.2f}")
+                                st.dataframe(
+                                    df_resumo_janelas.style.apply(estilo_por_resultado(df_resumo_janelas['Lucro_Teste']), axis=None).format({
+                                        'Lucro_Treino': 'R$ {:.2f}',
+                                        'Lucro_Teste': 'R$ {:.2f}'
+                                    }),
+                                    use_container_width=True,
+                                    hide_index=True
                                 )
-                                cols = list(df_detalhe.columns)
-                                lucro_idx = cols.index('Lucro (R$)')
-                                cols.insert(lucro_idx + 1, cols.pop(cols.index('Acerto?')))
-                                df_detalhe = df_detalhe[cols]
-                                def icone_detalhe(row):
-                                    if 'Contra' in row['Direção']:
-                                        return '🔽🟢' if 'Compra' in row['Direção'] else '🔼🔴'
-                                    elif 'Favor' in row['Direção']:
-                                        return '🔼🟢' if 'Compra' in row['Direção'] else '🔽🔴'
-                                    return '⚪'
-                                df_detalhe[' '] = df_detalhe.apply(icone_detalhe, axis=1)
-                                cols = [' '] + [col for col in df_detalhe.columns if col != ' ']
-                                df_exibir = df_detalhe[cols]
-                                def cor_linha(row):
-                                    valor = row['Lucro (R$)']
-                                    if valor > 0:
-                                        return ['background-color: #d4edda'] * len(row)
-                                    elif valor < 0:
-                                        return ['background-color: #f8d7da'] * len(row)
-                                    else:
-                                        return ['background-color: #fff3cd'] * len(row)
+                                st.markdown("**Escolhas por janela e horário** (lucro e acerto do teste)")
                                 st.dataframe(
-                                    df_exibir.style.apply(cor_linha, axis=1),
+                                    df_janelas.style.format({
+                                        "Taxa de Acerto Treino": "{:.2%}",
+                                        "Taxa de Acerto": "{:.2%}",
+                                        "Lucro Treino (R$)": "R$ {:.2f}",
+                                        "Lucro Total (R$)": "R$ {:.2f}",
+                                        "Máx. Drawdown Médio (%)": "{:+.2f}%"
+                                    }, na_rep="-"),
                                     use_container_width=True,
                                     hide_index=True
                                 )
+                                with abrir_exportacao(
+                                    df_janelas, cache_resultados.impressao_candles(df_janelas), "walk_forward_intraday"
+                                ) as arquivo_exportado:
+                                    st.download_button(
+                                        label="📥 Exportar Walk-forward para CSV",
+                                        data=arquivo_exportado,
+                                        file_name="walk_forward_intraday.csv",
+                                        mime="text/csv"
+                                    )
+
+                # ========================
+                # SCANNER AO VIVO
+                # ========================
+                tickers_ao_vivo = {file.ticker: extrair_nome_completo(file.name) for file in uploaded_files if file.ticker}
+                if tickers_ao_vivo:
+                    with st.expander("📡 Scanner ao Vivo", expanded=st.session_state.get("scanner_ao_vivo") is not None):
+                        st.caption("A cada candle de 5min, mostra os ativos cujo candle do horário configurado abre com distorção além dos limites, em relação à referência escolhida.")
+                        scanner = st.session_state.get("scanner_ao_vivo")
+                        if scanner is None or not scanner.em_execucao:
+                            if st.button("▶️ Iniciar Scanner ao Vivo"):
+                                scanner = ScannerAoVivo(list(tickers_ao_vivo), cfg, nomes=tickers_ao_vivo)
+                                scanner.iniciar_em_thread()
+                                st.session_state.scanner_ao_vivo = scanner
+                        elif st.button("⏹️ Parar Scanner"):
+                            scanner.parar()
+                        if scanner is not None:
+                            if scanner.cfg != cfg:
+                                st.info("ℹ️ O scanner usa a configuração do momento em que foi iniciado. Reinicie para aplicar a atual.")
+                            # Só o painel do scanner é refeito a cada 30s (fragmento); o resto da
+                            # página continua respondendo, e parado não há atualização
+                            automatico = scanner.em_execucao and st.checkbox("Atualizar a tela automaticamente (30s)", value=True)
+                            st.fragment(exibir_scanner, run_every=30 if automatico else None)(scanner, automatico)
 
 # ========================
 # EXECUÇÃO
@@ -0,0 +1,455 @@
+# armazem_candles.py - cache local e incremental dos candles baixados
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+# ========================
+# CONFIGURAÇÃO
+# ========================
+CACHE_DIR = "cache_candles"
+INTERVALO_PADRAO = "5m"
+# Abaixo deste tempo desde a última atualização, nem consulta o provedor
+ATUALIZAR_APOS = timedelta(minutes=5)
+# Limite do Yahoo para candles intraday
+JANELA_MAXIMA_DIAS = 60
+
+COLUNAS = ['Data', 'Abertura', 'Máxima', 'Mínima', 'Fechamento', 'Volume']
+PRECOS = ['Abertura', 'Máxima', 'Mínima', 'Fechamento']
+# Diferença relativa de preço, nos candles repetidos, a partir da qual o
+# provedor reajustou a série (proventos/desdobramentos com auto_adjust)
+TOLERANCIA_REAJUSTE = 1e-4
+
+# ========================
+# PROVEDOR PADRÃO: Yahoo Finance
+# ========================
+# Um provedor é qualquer função (ticker, intervalo, inicio) -> DataFrame no
+# formato do yf.download. "inicio" é None para pedir a janela completa.
+def baixar_yahoo(ticker, intervalo, inicio=None):
+    import yfinance as yf
+    if inicio is None:
+        return yf.download(ticker, period=f"{JANELA_MAXIMA_DIAS}d", interval=intervalo, auto_adjust=True, progress=False)
+    return yf.download(ticker, start=inicio, interval=intervalo, auto_adjust=True, progress=False)
+
+# ========================
+# FUNÇÃO: normalizar o retorno do provedor para Data/Abertura/.../Volume
+# ========================
+def normalizar_download(data):
+    data_reset = data.reset_index()
+
+    # 🔥 CORREÇÃO: Remover MultiIndex das colunas
+    if isinstance(data_reset.columns, pd.MultiIndex):
+        new_columns = []
+        for col in data_reset.columns:
+            if isinstance(col, tuple):
+                name = col[0] if col[0] else col[1]
+            else:
+                name = col
+            new_columns.append(name)
+        data_reset.columns = new_columns
+
+    # Garantir que temos uma coluna de data
+    datetime_col = None
+    for col in data_reset.columns:
+        if 'datetime' in str(col).lower() or 'date' in str(col).lower():
+            datetime_col = col
+            break
+
+    if datetime_col is None:
+        raise ValueError("nenhuma coluna de data encontrada.")
+
+    if datetime_col != 'Data':
+        data_reset.rename(columns={datetime_col: 'Data'}, inplace=True)
+
+    # Renomear colunas
+    rename_map = {}
+    for c in data_reset.columns:
+        lc = str(c).lower()
+        if 'open' in lc or 'abert' in lc: rename_map[c] = 'Abertura'
+        if 'high' in lc or 'max' in lc: rename_map[c] = 'Máxima'
+        if 'low' in lc or 'min' in lc: rename_map[c] = 'Mínima'
+        if 'close' in lc or 'fech' in lc: rename_map[c] = 'Fechamento'
+        if 'volume' in lc or lc == 'vol': rename_map[c] = 'Volume'
+    data_reset.rename(columns=rename_map, inplace=True)
+
+    # Verificar colunas essenciais
+    for col in COLUNAS:
+        if col not in data_reset.columns:
+            raise ValueError(f"Coluna obrigatória ausente: `{col}`")
+
+    # Converter para datetime
+    data_reset['Data'] = pd.to_datetime(data_reset['Data'], errors='coerce', dayfirst=True)
+    return data_reset.dropna(subset=['Data']).copy()
+
+# ========================
+# CAMINHOS
+# ========================
+def _nome_base(ticker, intervalo):
+    return f"{ticker.upper().replace('/', '_')}_{intervalo}"
+
+def caminho_candles(ticker, intervalo, diretorio=CACHE_DIR):
+    return os.path.join(diretorio, f"{_nome_base(ticker, intervalo)}.parquet")
+
+def caminho_meta(ticker, intervalo, diretorio=CACHE_DIR):
+    return os.path.join(diretorio, f"{_nome_base(ticker, intervalo)}.json")
+
+def caminho_referencias(ticker, intervalo, diretorio=CACHE_DIR):
+    return os.path.join(diretorio, f"{_nome_base(ticker, intervalo)}_referencias.npz")
+
+# Cada fonte tem o seu histórico: candles ajustados do Yahoo e arquivos enviados
+# (exportações de corretora, em geral sem ajuste) nunca se sobrescrevem
+def caminho_historico(ticker, intervalo, diretorio=CACHE_DIR, fonte="yahoo"):
+    pasta = "historico" if fonte == "yahoo" else f"historico_{fonte}"
+    return os.path.join(diretorio, pasta, _nome_base(ticker, intervalo))
+
+def _ler_meta(ticker, intervalo, diretorio):
+    caminho = caminho_meta(ticker, intervalo, diretorio)
+    if not os.path.exists(caminho):
+        return None
+    try:
+        with open(caminho, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+# Temporário exclusivo na mesma pasta: escritores simultâneos do mesmo caminho
+# (threads, processos ou sessões) nunca compartilham o arquivo parcial
+def _gravar_atomico(caminho, escrever):
+    descritor, temporario = tempfile.mkstemp(dir=os.path.dirname(caminho) or ".", suffix=".tmp")
+    os.close(descritor)
+    try:
+        escrever(temporario)
+        os.replace(temporario, caminho)
+    except BaseException:
+        try:
+            os.remove(temporario)
+        except OSError:
+            pass
+        raise
+
+# ========================
+# FUNÇÃO: juntar candles antigos e novos sem duplicar timestamps
+# ========================
+def mesclar_candles(antigos, novos):
+    if antigos is None or antigos.empty:
+        df = novos
+    elif novos is None or novos.empty:
+        df = antigos
+    else:
+        df = pd.concat([antigos, novos], ignore_index=True)
+    # O último candle baixado pode ter sido parcial: a versão mais nova prevalece
+    df = df.drop_duplicates(subset=['Data'], keep='last')
+    return df.sort_values('Data', kind='stable').reset_index(drop=True)
+
+# ========================
+# REAJUSTE: o Yahoo (auto_adjust) reescala toda a série a cada provento
+# ========================
+# Fator novo/antigo medido nos candles presentes nos dois lados (mediana dos
+# fechamentos; o último candle antigo pode ter sido parcial e fica de fora).
+# 1.0 quando não há sobreposição ou a série não mudou.
+def fator_reajuste(antigos, novos):
+    if antigos is None or antigos.empty or novos is None or novos.empty:
+        return 1.0
+    comuns = antigos[['Data', 'Fechamento']].merge(novos[['Data', 'Fechamento']], on='Data', suffixes=('_antigo', '_novo'))
+    comuns = comuns[comuns['Data'] < antigos['Data'].max()]
+    razao = (comuns['Fechamento_novo'] / comuns['Fechamento_antigo']).replace([np.inf, -np.inf], np.nan).dropna()
+    if razao.empty:
+        return 1.0
+    fator = float(razao.median())
+    return 1.0 if abs(fator - 1) <= TOLERANCIA_REAJUSTE else fator
+
+# Preços anteriores a "antes_de" na mesma escala dos candles novos
+def reajustar(df, fator, antes_de):
+    if fator == 1.0 or df is None or df.empty:
+        return df
+    df = df.copy()
+    linhas = df['Data'] < antes_de
+    df.loc[linhas, PRECOS] = df.loc[linhas, PRECOS] * fator
+    return df
+
+# ========================
+# FUNÇÕES INTERNAS: ler cache, decidir o que buscar, gravar
+# ========================
+def _ler_cache(ticker, intervalo, diretorio):
+    caminho = caminho_candles(ticker, intervalo, diretorio)
+    meta = _ler_meta(ticker, intervalo, diretorio)
+    if meta is None or not os.path.exists(caminho):
+        return None, None
+    try:
+        return pd.read_parquet(caminho), meta
+    except Exception:
+        return None, None
+
+# Retorna (precisa_buscar, inicio): inicio None = janela completa
+def _planejar_busca(antigos, meta, agora):
+    if antigos is None or antigos.empty:
+        return True, None
+    if agora - datetime.fromisoformat(meta["atualizado_em"]) < ATUALIZAR_APOS:
+        return False, None
+    ultimo = pd.Timestamp(meta["ultimo"])
+    # Só a cauda: a partir do dia do último candle (ou janela cheia se o cache envelheceu demais)
+    if (agora.date() - ultimo.date()).days < JANELA_MAXIMA_DIAS - 1:
+        return True, ultimo.date()
+    return True, None
+
+def _atualizar_cache(ticker, intervalo, diretorio, antigos, bruto, agora):
+    novos = normalizar_download(bruto) if bruto is not None and not bruto.empty else None
+    if novos is not None and not novos.empty:
+        antigos = reajustar(antigos, fator_reajuste(antigos, novos), novos['Data'].min())
+    df = mesclar_candles(antigos, novos)
+    if df is None or df.empty:
+        return pd.DataFrame(columns=COLUNAS)
+    # Tudo o que chega do provedor também fica no histórico longo
+    pasta = caminho_historico(ticker, intervalo, diretorio)
+    acrescentar_historico(pasta, df if not os.path.isdir(pasta) else novos)
+
+    _gravar_atomico(caminho_candles(ticker, intervalo, diretorio), lambda destino: df.to_parquet(destino, index=False))
+    meta = {"ultimo": df['Data'].iloc[-1].isoformat(), "atualizado_em": agora.isoformat(), "candles": len(df)}
+
+    def escrever_meta(destino):
+        with open(destino, "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2, ensure_ascii=False)
+    _gravar_atomico(caminho_meta(ticker, intervalo, diretorio), escrever_meta)
+    return df
+
+# ========================
+# FUNÇÃO PRINCIPAL: candles do ticker, buscando só o que falta
+# ========================
+def carregar_candles(ticker, intervalo=INTERVALO_PADRAO, provedor=None, diretorio=CACHE_DIR, agora=None):
+    provedor = provedor or baixar_yahoo
+    agora = agora or datetime.now()
+    os.makedirs(diretorio, exist_ok=True)
+
+    antigos, meta = _ler_cache(ticker, intervalo, diretorio)
+    buscar, inicio = _planejar_busca(antigos, meta, agora)
+    if not buscar:
+        _semear_historico(ticker, intervalo, diretorio, antigos)
+        return antigos
+    return _atualizar_cache(ticker, intervalo, diretorio, antigos, provedor(ticker, intervalo, inicio), agora)
+
+# ========================
+# FUNÇÃO: vários tickers de uma vez (lotes em paralelo)
+# ========================
+# Tickers com cache recente são lidos do disco; os demais são agrupados pelo
+# mesmo ponto de início e baixados em lotes, com vários lotes simultâneos.
+# Um provedor de lote é uma função (tickers, intervalo, inicio) -> {ticker: DataFrame}.
+def baixar_yahoo_lote(tickers, intervalo, inicio=None):
+    import yfinance as yf
+    if inicio is None:
+        data = yf.download(tickers, period=f"{JANELA_MAXIMA_DIAS}d", interval=intervalo, auto_adjust=True,
+                           progress=False, group_by="ticker", threads=False)
+    else:
+        data = yf.download(tickers, start=inicio, interval=intervalo, auto_adjust=True,
+                           progress=False, group_by="ticker", threads=False)
+    return separar_lote(data, tickers)
+
+def separar_lote(data, tickers):
+    resultado = {}
+    for ticker in tickers:
+        if isinstance(data.columns, pd.MultiIndex) and ticker in data.columns.get_level_values(0):
+            parte = data[ticker]
+        elif not isinstance(data.columns, pd.MultiIndex) and len(tickers) == 1:
+            parte = data
+        else:
+            continue
+        resultado[ticker] = parte.dropna(how="all")
+    return resultado
+
+def carregar_universo(tickers, intervalo=INTERVALO_PADRAO, provedor_lote=None, diretorio=CACHE_DIR,
+                      agora=None, tamanho_lote=20, max_workers=4):
+    provedor_lote = provedor_lote or baixar_yahoo_lote
+    agora = agora or datetime.now()
+    os.makedirs(diretorio, exist_ok=True)
+    tickers = list(dict.fromkeys(tickers))
+
+    resultado = {}
+    erros = {}
+    caches = {}
+    grupos = {}
+    for ticker in tickers:
+        antigos, meta = _ler_cache(ticker, intervalo, diretorio)
+        buscar, inicio = _planejar_busca(antigos, meta, agora)
+        if buscar:
+            caches[ticker] = antigos
+            grupos.setdefault(inicio, []).append(ticker)
+        else:
+            _semear_historico(ticker, intervalo, diretorio, antigos)
+            resultado[ticker] = antigos
+
+    lotes = [(inicio, membros[i:i + tamanho_lote])
+             for inicio, membros in grupos.items() for i in range(0, len(membros), tamanho_lote)]
+
+    def baixar(lote):
+        inicio, membros = lote
+        return provedor_lote(membros, intervalo, inicio)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futuros = {executor.submit(baixar, lote): lote for lote in lotes}
+        for futuro in as_completed(futuros):
+            _, membros = futuros[futuro]
+            try:
+                baixados = futuro.result()
+            except Exception as e:
+                # Lote falhou: fica o que já havia em cache, sem marcar como atualizado
+                for ticker in membros:
+                    erros[ticker] = str(e)
+                    resultado[ticker] = caches[ticker] if caches[ticker] is not None else pd.DataFrame(columns=COLUNAS)
+                continue
+            for ticker in membros:
+                try:
+                    resultado[ticker] = _atualizar_cache(ticker, intervalo, diretorio, caches[ticker],
+                                                         baixados.get(ticker), agora)
+                except Exception as e:
+                    erros[ticker] = str(e)
+                    resultado[ticker] = caches[ticker] if caches[ticker] is not None else pd.DataFrame(columns=COLUNAS)
+
+    return {ticker: resultado.get(ticker, pd.DataFrame(columns=COLUNAS)) for ticker in tickers}, erros
+
+# ========================
+# TABELA DE REFERÊNCIAS DIÁRIAS (guardada junto dos candles)
+# ========================
+# Válida enquanto o cache de candles não for atualizado depois de salva.
+def carregar_referencias(ticker, intervalo=INTERVALO_PADRAO, diretorio=CACHE_DIR):
+    meta = _ler_meta(ticker, intervalo, diretorio)
+    caminho = caminho_referencias(ticker, intervalo, diretorio)
+    if meta is None or not os.path.exists(caminho):
+        return None
+    try:
+        with np.load(caminho, allow_pickle=False) as arquivo:
+            if str(arquivo['versao']) != meta["atualizado_em"]:
+                return None
+            return {chave: arquivo[chave] for chave in ['dias', 'abertura', 'fechamento', 'minima', 'candles']}
+    except Exception:
+        return None
+
+def salvar_referencias(ticker, referencias, intervalo=INTERVALO_PADRAO, diretorio=CACHE_DIR):
+    meta = _ler_meta(ticker, intervalo, diretorio)
+    if meta is None:
+        return
+    caminho = caminho_referencias(ticker, intervalo, diretorio)
+
+    def escrever(destino):
+        with open(destino, "wb") as f:
+            np.savez(f, versao=np.array(meta["atualizado_em"]), **referencias)
+    _gravar_atomico(caminho, escrever)
+
+# ========================
+# HISTÓRICO LONGO: um arquivo Arrow por ticker e mês (sem o limite de 60 dias)
+# ========================
+# Só cresce: cada download/upload é mesclado nas partições dos meses que toca
+# (os demais meses nem são abertos). Arrow IPC sem compressão pode ser mapeado
+# em memória: a leitura abre só as partições do período pedido e copia só as
+# linhas dentro dele.
+def _normalizar_historico(df):
+    df = pd.DataFrame({col: df[col] if col in df.columns else np.nan for col in COLUNAS})
+    datas = pd.to_datetime(df['Data'], dayfirst=True, errors='coerce')
+    if datas.dt.tz is not None:
+        datas = datas.dt.tz_localize(None)
+    df['Data'] = datas.astype('datetime64[ns]')
+    for col in COLUNAS[1:]:
+        df[col] = pd.to_numeric(df[col], errors='coerce').astype(np.float64)
+    return df.dropna(subset=['Data'])
+
+def caminho_particao(pasta, mes):
+    return os.path.join(pasta, f"{mes}.arrow")
+
+def meses_historico(pasta):
+    if not os.path.isdir(pasta):
+        return []
+    return sorted(nome[:-len(".arrow")] for nome in os.listdir(pasta) if nome.endswith(".arrow"))
+
+def _ler_particao(caminho):
+    return pa.ipc.open_file(pa.memory_map(caminho, "r")).read_all()
+
+def _gravar_particao(caminho, df):
+    tabela = pa.Table.from_pandas(df, preserve_index=False)
+
+    def escrever(destino):
+        with pa.OSFile(destino, "wb") as saida, pa.ipc.new_file(saida, tabela.schema) as escritor:
+            escritor.write_table(tabela)
+    _gravar_atomico(caminho, escrever)
+
+# Uma trava por pasta de histórico: sessões e threads de download que escrevem o
+# mesmo ticker leem e regravam as partições uma de cada vez
+_trava_travas = threading.Lock()
+_travas_historico = {}
+
+def _trava_historico(pasta):
+    with _trava_travas:
+        return _travas_historico.setdefault(os.path.abspath(pasta), threading.Lock())
+
+# Série reajustada pelo provedor: todas as partições anteriores aos candles
+# novos passam para a nova escala
+def _reajustar_historico(pasta, fator, antes_de):
+    for mes in meses_historico(pasta):
+        caminho = caminho_particao(pasta, mes)
+        antigos = _ler_particao(caminho).to_pandas()
+        if not antigos.empty and antigos['Data'].iloc[0] < antes_de:
+            _gravar_particao(caminho, reajustar(antigos, fator, antes_de))
+
+# Retorna o nº de candles novos (timestamps que ainda não estavam no histórico)
+def acrescentar_historico(pasta, df):
+    if df is None or df.empty:
+        return 0
+    df = _normalizar_historico(df)
+    os.makedirs(pasta, exist_ok=True)
+    meses = df['Data'].dt.strftime('%Y-%m')
+    with _trava_historico(pasta):
+        tocados = [caminho_particao(pasta, mes) for mes in meses.unique()]
+        existentes = [_ler_particao(caminho).to_pandas() for caminho in tocados if os.path.exists(caminho)]
+        if existentes:
+            fator = fator_reajuste(pd.concat(existentes, ignore_index=True).sort_values('Data', kind='stable'), df)
+            if fator != 1.0:
+                _reajustar_historico(pasta, fator, df['Data'].min())
+
+        novos = 0
+        for mes, grupo in df.groupby(meses, sort=True):
+            caminho = caminho_particao(pasta, mes)
+            antigos = _ler_particao(caminho).to_pandas() if os.path.exists(caminho) else None
+            mesclado = mesclar_candles(antigos, grupo)
+            novos += len(mesclado) - (0 if antigos is None else len(antigos))
+            if antigos is None or not mesclado.equals(antigos):
+                _gravar_particao(caminho, mesclado)
+    return novos
+
+def ler_historico(pasta, data_inicio, data_fim):
+    meses = set(pd.period_range(data_inicio, data_fim, freq='M').strftime('%Y-%m'))
+    tabelas = [_ler_particao(caminho_particao(pasta, mes)) for mes in meses_historico(pasta) if mes in meses]
+    if not tabelas:
+        return pd.DataFrame(columns=COLUNAS)
+    tabela = pa.concat_tables(tabelas)
+    datas = tabela.column('Data').to_numpy().astype('datetime64[D]')
+    mascara = (datas >= np.datetime64(data_inicio, 'D')) & (datas <= np.datetime64(data_fim, 'D'))
+    return tabela.filter(pa.array(mascara)).to_pandas()
+
+# (primeiro dia, último dia) do histórico, lendo só a primeira e a última partição
+def periodo_historico(pasta):
+    meses = meses_historico(pasta)
+    if not meses:
+        return None
+    primeira = _ler_particao(caminho_particao(pasta, meses[0])).column('Data')
+    ultima = _ler_particao(caminho_particao(pasta, meses[-1])).column('Data')
+    if len(primeira) == 0 or len(ultima) == 0:
+        return None
+    return pd.Timestamp(primeira[0].as_py()).date(), pd.Timestamp(ultima[-1].as_py()).date()
+
+# Muda sempre que alguma partição é regravada
+def impressao_historico(pasta):
+    partes = []
+    for mes in meses_historico(pasta):
+        info = os.stat(caminho_particao(pasta, mes))
+        partes.append(f"{mes}:{info.st_size}:{info.st_mtime_ns}")
+    return hashlib.sha1("|".join(partes).encode("utf-8")).hexdigest()
+
+# Instalações anteriores ao histórico: o cache existente vira o ponto de partida
+def _semear_historico(ticker, intervalo, diretorio, df):
+    pasta = caminho_historico(ticker, intervalo, diretorio)
+    if df is not None and not df.empty and not os.path.isdir(pasta):
+        acrescentar_historico(pasta, df)
@@ -0,0 +1,197 @@
+# banco_clientes.py - clientes e solicitações de teste do gestor em SQLite
+# Cada ação do painel altera só a linha do cliente, numa transação; o banco fica
+# em modo WAL (leituras não bloqueiam a escrita) e a expiração é um único UPDATE
+# sobre o índice de expira_em. Na primeira abertura, acessos.json e
+# pendentes.json são importados uma vez; depois disso pendentes.json continua
+# sendo a entrada das solicitações de teste e só as entradas novas são importadas.
+import json
+import os
+import sqlite3
+import threading
+from datetime import date
+
+# ========================
+# CONFIGURAÇÃO
+# ========================
+BANCO = "clientes.db"
+ACESSOS_JSON = "acessos.json"
+PENDENTES_JSON = "pendentes.json"
+
+# Versão do esquema (PRAGMA user_version): 0 = banco novo, ainda sem a migração dos JSON
+VERSAO_ESQUEMA = 1
+
+CAMPOS_CLIENTE = ["senha", "plano", "liberado_em", "expira_em", "status"]
+CAMPOS_PENDENTE = ["email", "senha", "plano_interesse", "data"]
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS clientes (
+    email TEXT PRIMARY KEY,
+    senha TEXT NOT NULL DEFAULT '',
+    plano TEXT NOT NULL DEFAULT '',
+    liberado_em TEXT NOT NULL DEFAULT '',
+    expira_em TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_clientes_status ON clientes(status);
+CREATE INDEX IF NOT EXISTS idx_clientes_plano ON clientes(plano);
+CREATE INDEX IF NOT EXISTS idx_clientes_expira_em ON clientes(expira_em);
+CREATE TABLE IF NOT EXISTS pendentes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    email TEXT NOT NULL DEFAULT '',
+    senha TEXT NOT NULL DEFAULT '',
+    plano_interesse TEXT NOT NULL DEFAULT '',
+    data TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS importacoes (
+    arquivo TEXT PRIMARY KEY,
+    entradas INTEGER NOT NULL,
+    modificado INTEGER NOT NULL
+);
+"""
+
+# Cadastro novo ou renovação (mesmo email): grava só a linha do cliente
+SALVAR_CLIENTE = (
+    "INSERT INTO clientes (email, senha, plano, liberado_em, expira_em, status) VALUES (?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT(email) DO UPDATE SET senha = excluded.senha, plano = excluded.plano, "
+    "liberado_em = excluded.liberado_em, expira_em = excluded.expira_em, status = excluded.status"
+)
+
+# Datas no formato AAAA-MM-DD (as demais ficam de fora da expiração, como antes)
+DATA_ISO = "[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]"
+
+# Uma conexão pode ser compartilhada entre as sessões (threads) do servidor:
+# cada transação de escrita acontece sob esta trava
+_trava = threading.Lock()
+
+def _texto(valor):
+    return "" if valor is None else str(valor)
+
+def _ler_json(caminho, padrao):
+    if not os.path.exists(caminho):
+        return padrao
+    with open(caminho, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _inserir_pendentes(conexao, pendentes):
+    conexao.executemany(
+        "INSERT INTO pendentes (email, senha, plano_interesse, data) VALUES (?, ?, ?, ?)",
+        [[_texto(p.get(campo)) for campo in CAMPOS_PENDENTE] for p in pendentes if isinstance(p, dict)]
+    )
+
+# Quantas entradas de pendentes.json já estão no banco e a versão do arquivo lida
+def _registrar_importacao(conexao, caminho, entradas, modificado):
+    conexao.execute(
+        "INSERT INTO importacoes (arquivo, entradas, modificado) VALUES (?, ?, ?) "
+        "ON CONFLICT(arquivo) DO UPDATE SET entradas = excluded.entradas, modificado = excluded.modificado",
+        [caminho, entradas, modificado]
+    )
+
+# ========================
+# CONEXÃO E MIGRAÇÃO
+# ========================
+# check_same_thread=False: a conexão pode ser guardada uma vez por servidor
+# (st.cache_resource) e usada pelas sessões do Streamlit
+def conectar(caminho=BANCO, acessos_json=ACESSOS_JSON, pendentes_json=PENDENTES_JSON):
+    conexao = sqlite3.connect(caminho, timeout=10, check_same_thread=False)
+    conexao.row_factory = sqlite3.Row
+    conexao.execute("PRAGMA journal_mode=WAL")
+    conexao.execute("PRAGMA synchronous=NORMAL")
+    with _trava, conexao:
+        conexao.executescript(ESQUEMA)
+    if conexao.execute("PRAGMA user_version").fetchone()[0] < VERSAO_ESQUEMA:
+        migrar_json(conexao, acessos_json, pendentes_json)
+    return conexao
+
+# Importa os JSON antigos numa única transação; os arquivos ficam intactos
+# (servem de cópia) e a versão do esquema impede uma segunda importação, mesmo
+# com dois processos abrindo o banco ao mesmo tempo (a versão é conferida de
+# novo depois do BEGIN IMMEDIATE)
+def migrar_json(conexao, acessos_json=ACESSOS_JSON, pendentes_json=PENDENTES_JSON):
+    modificado = os.stat(pendentes_json).st_mtime_ns if os.path.exists(pendentes_json) else 0
+    acessos = _ler_json(acessos_json, {})
+    pendentes = _ler_json(pendentes_json, [])
+    acessos = acessos if isinstance(acessos, dict) else {}
+    pendentes = pendentes if isinstance(pendentes, list) else []
+
+    with _trava, conexao:
+        conexao.execute("BEGIN IMMEDIATE")
+        if conexao.execute("PRAGMA user_version").fetchone()[0] >= VERSAO_ESQUEMA:
+            return 0, 0
+        conexao.executemany(
+            "INSERT OR IGNORE INTO clientes (email, senha, plano, liberado_em, expira_em, status) VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                [email] + [_texto(info.get(campo)) for campo in CAMPOS_CLIENTE]
+                for email, info in acessos.items() if isinstance(info, dict)
+            ]
+        )
+        _inserir_pendentes(conexao, pendentes)
+        _registrar_importacao(conexao, pendentes_json, len(pendentes), modificado)
+        conexao.execute(f"PRAGMA user_version = {VERSAO_ESQUEMA}")
+    return len(acessos), len(pendentes)
+
+# ========================
+# CLIENTES
+# ========================
+# {email: {senha, plano, liberado_em, expira_em, status}}, mesmo formato do acessos.json
+def carregar_clientes(conexao):
+    linhas = conexao.execute("SELECT * FROM clientes ORDER BY rowid").fetchall()
+    return {linha["email"]: {campo: linha[campo] for campo in CAMPOS_CLIENTE} for linha in linhas}
+
+def salvar_cliente(conexao, email, info):
+    with _trava, conexao:
+        conexao.execute(SALVAR_CLIENTE, [email] + [_texto(info.get(campo)) for campo in CAMPOS_CLIENTE])
+
+def excluir_cliente(conexao, email):
+    with _trava, conexao:
+        conexao.execute("DELETE FROM clientes WHERE email = ?", [email])
+
+# Ativos com expira_em anterior a hoje passam a expirados; retorna quantos mudaram
+def expirar_clientes(conexao, hoje=None):
+    hoje = (hoje or date.today()).strftime("%Y-%m-%d")
+    with _trava, conexao:
+        cursor = conexao.execute(
+            "UPDATE clientes SET status = 'expirado' WHERE status = 'ativo' AND expira_em < ? AND expira_em GLOB ?",
+            [hoje, DATA_ISO]
+        )
+    return cursor.rowcount
+
+def contar_por_status(conexao):
+    return dict(conexao.execute("SELECT status, COUNT(*) FROM clientes GROUP BY status").fetchall())
+
+# ========================
+# SOLICITAÇÕES DE TESTE
+# ========================
+# Lista de dicts (email, senha, plano_interesse, data) com o id da solicitação
+def carregar_pendentes(conexao):
+    return [dict(linha) for linha in conexao.execute("SELECT * FROM pendentes ORDER BY id").fetchall()]
+
+# pendentes.json segue sendo escrito pelo cadastro de teste (só acrescenta
+# entradas): importa as que ainda não estão no banco. O arquivo só é lido quando
+# muda; um arquivo no meio de uma gravação fica para a próxima vez.
+def importar_pendentes_json(conexao, pendentes_json=PENDENTES_JSON):
+    try:
+        modificado = os.stat(pendentes_json).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+    linha = conexao.execute("SELECT entradas, modificado FROM importacoes WHERE arquivo = ?", [pendentes_json]).fetchone()
+    if linha is not None and linha["modificado"] == modificado:
+        return 0
+    try:
+        pendentes = _ler_json(pendentes_json, [])
+    except (OSError, ValueError):
+        return 0
+    pendentes = pendentes if isinstance(pendentes, list) else []
+
+    with _trava, conexao:
+        conexao.execute("BEGIN IMMEDIATE")
+        linha = conexao.execute("SELECT entradas FROM importacoes WHERE arquivo = ?", [pendentes_json]).fetchone()
+        novos = pendentes[linha["entradas"] if linha is not None else 0:]
+        _inserir_pendentes(conexao, novos)
+        _registrar_importacao(conexao, pendentes_json, len(pendentes), modificado)
+    return len(novos)
+
+# Cadastra o cliente e remove a solicitação na mesma transação
+def liberar_pendente(conexao, id_pendente, email, info):
+    with _trava, conexao:
+        conexao.execute(SALVAR_CLIENTE, [email] + [_texto(info.get(campo)) for campo in CAMPOS_CLIENTE])
+        conexao.execute("DELETE FROM pendentes WHERE id = ?", [id_pendente])
@@ -0,0 +1,400 @@
+# benchmark_intraday.py - medição reprodutível do rastreamento intraday (offline, sem Yahoo)
+#
+# Exemplos:
+#   python benchmark_intraday.py --cenario minimo
+#   python benchmark_intraday.py --cenario universo --salvar        (grava a linha de base)
+#   python benchmark_intraday.py --cenario universo --comparar      (compara com a linha de base)
+#   python benchmark_intraday.py --tickers 30 --dias 500 --tipo acoes
+#   python benchmark_intraday.py --conferir                         (só a conferência de equivalência)
+#
+# Candles sintéticos com semente fixa: pregão de cada dia pelo calendário da B3
+# (ações 10:00-17:00/18:00, WIN/WDO 09:00-18:20), com candles fora do pregão,
+# buracos, timestamps duplicados e dias sem dados. Cada etapa (carga, liquidez, avaliação por dia, drawdown, agregação)
+# é medida separadamente; vale o melhor tempo entre as repetições. Antes de medir,
+# o motor vetorizado é conferido contra uma avaliação linha a linha (dia a dia,
+# candle a candle) num conjunto sintético fixo: divergência sai com código 2.
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import time
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+from calendario_b3 import SEM_PREGAO, sessao_do_dia, sessoes
+from motor_intraday import (
+    DIRECOES, MOTIVOS_IGNORADO, ROTULOS_REFERENCIA, avaliar_ticker, calcular_drawdowns, calcular_liquidez,
+    calcular_valor_ponto, localizar_entradas, localizar_saidas, montar_operacoes, preparar_candles,
+    pregao_por_dia, preparar_drawdown
+)
+from rastreamento import CONFIG_PADRAO, formatar_operacoes, resumir_operacoes
+from universo import ACOES_PADRAO
+
+# ========================
+# CONFIGURAÇÃO
+# ========================
+PASTA_BASELINES = os.path.join("benchmarks", "baselines")
+# Etapa mais lenta que a linha de base além desta proporção = regressão
+TOLERANCIA = 1.25
+
+PROB_DIA_SEM_DADOS = 0.04
+PROB_BURACO = 0.03
+PROB_DUPLICADO = 0.01
+PROB_MINIMA_VAZIA = 0.002
+
+CENARIOS = {
+    "minimo": {"tickers": 1, "dias": 60, "tipo": "acoes"},
+    "futuros": {"tickers": 1, "dias": 250, "tipo": "mini_indice"},
+    "universo": {"tickers": 50, "dias": 250, "tipo": "acoes"},
+    "grande": {"tickers": 200, "dias": 500, "tipo": "acoes"},
+}
+
+HORARIOS_BENCHMARK = ["09:00", "10:00", "10:55", "11:00", "13:30", "15:00", "16:00"]
+
+# Conferência: fevereiro e março de 2024 (Carnaval, Cinzas e a troca de horário
+# das ações em 11/03), limites baixos para gerar muitas operações e saídas que
+# passam do fechamento (16:00 + 65 min nas ações no horário de verão dos EUA,
+# 16:00 + 145 min nos futuros). Candles num dia de Carnaval e mínimas zeradas
+# num dia cobrem "sem pregão" e "referência inválida".
+MODOS_CONFERENCIA = ["Ambos", "A Favor da Tendência", "Contra Tendência"]
+CONFERENCIA = {"dias": 30, "inicio": "2024-02-01", "semente": 7, "candles_pos_entrada": [3, 13, 29],
+               "distorcao": 0.3, "feriado": "2024-02-13", "minima_zerada": "2024-02-20"}
+
+# ========================
+# GERADOR SINTÉTICO (semente fixa)
+# ========================
+def nomes_tickers(quantidade, tipo_ativo):
+    if tipo_ativo == "mini_indice":
+        return [f"WIN{i:02d}" if i else "WINJ25" for i in range(quantidade)]
+    if tipo_ativo == "mini_dolar":
+        return [f"WDO{i:02d}" if i else "WDOJ25" for i in range(quantidade)]
+    return [ACOES_PADRAO[i] if i < len(ACOES_PADRAO) else f"TST{i:03d}3" for i in range(quantidade)]
+
+def gerar_candles(tipo_ativo="acoes", dias=60, semente=0, inicio="2024-01-02", preco_inicial=None):
+    rng = np.random.default_rng(semente)
+    if preco_inicial is None:
+        preco_inicial = {"mini_indice": 120000.0, "mini_dolar": 5000.0}.get(tipo_ativo, 30.0)
+
+    dias_uteis = pd.bdate_range(inicio, periods=dias).values.astype("datetime64[m]")
+    dias_uteis = dias_uteis[rng.random(len(dias_uteis)) >= PROB_DIA_SEM_DADOS]
+    # Horário de cada dia pelas datas geradas (nunca pela data da execução)
+    abertura, fechamento = sessoes(dias_uteis.astype("datetime64[D]"), tipo_ativo)
+    com_pregao = abertura != SEM_PREGAO
+    dias_uteis, abertura, fechamento = dias_uteis[com_pregao], abertura[com_pregao], fechamento[com_pregao]
+    # Alguns candles de leilão/after fora do pregão, como nos arquivos reais
+    slots = np.arange(abertura.min() - 10, fechamento.max() + 20, 5) if len(dias_uteis) else np.empty(0, dtype=np.int64)
+
+    grade = dias_uteis[:, None] + slots[None, :].astype("timedelta64[m]")
+    no_dia = (slots[None, :] >= abertura[:, None] - 10) & (slots[None, :] < fechamento[:, None] + 20)
+    grade = grade[no_dia & (rng.random(grade.shape) >= PROB_BURACO)]
+    n = len(grade)
+    # Segundos "sujos" (0, 10 ou 20s): o carregamento arredonda para o minuto
+    datas = grade.astype("datetime64[s]") + rng.integers(0, 3, n).astype("timedelta64[s]") * 10
+
+    retornos = rng.normal(0.0, 0.003, n)
+    fechamentos = preco_inicial * np.exp(np.cumsum(retornos))
+    aberturas = np.concatenate([[preco_inicial], fechamentos[:-1]])
+    maximas = np.maximum(aberturas, fechamentos) * (1 + np.abs(rng.normal(0, 0.001, n)))
+    minimas = np.minimum(aberturas, fechamentos) * (1 - np.abs(rng.normal(0, 0.001, n)))
+    minimas[rng.random(n) < PROB_MINIMA_VAZIA] = np.nan
+    volumes = rng.integers(1_000, 100_000, n)
+
+    df = pd.DataFrame({
+        "Data": datas, "Abertura": aberturas, "Máxima": maximas,
+        "Mínima": minimas, "Fechamento": fechamentos, "Volume": volumes,
+    })
+    # Timestamps duplicados no mesmo minuto (o carregamento mantém o primeiro)
+    duplicados = df[rng.random(n) < PROB_DUPLICADO].copy()
+    duplicados["Data"] = duplicados["Data"] + pd.Timedelta(seconds=5)
+    duplicados["Volume"] = 5
+    return pd.concat([df, duplicados], ignore_index=True)
+
+def gerar_universo(quantidade, dias, tipo_ativo, semente=0):
+    return {
+        ticker: gerar_candles(tipo_ativo, dias, semente=semente + i)
+        for i, ticker in enumerate(nomes_tickers(quantidade, tipo_ativo))
+    }
+
+# ========================
+# MEDIÇÃO POR ETAPA
+# ========================
+def _cronometrar(tempos, etapa, funcao, *args, **kwargs):
+    inicio = time.perf_counter()
+    resultado = funcao(*args, **kwargs)
+    tempos[etapa] = tempos.get(etapa, 0.0) + time.perf_counter() - inicio
+    return resultado
+
+def _drawdowns_de_todos_os_eventos(indice, cfg):
+    # Todas as entradas/saídas possíveis (dia x horário), compradas e vendidas
+    abertura_min, fechamento_min = pregao_por_dia(indice, cfg["tipo_ativo"])
+    deslocamento = 5 * int(cfg["candles_pos_entrada"])
+    preparar_drawdown(indice)
+    total = 0
+    for horario in cfg["horarios_selecionados"]:
+        hora, minuto = map(int, horario.split(":"))
+        pos_entrada = localizar_entradas(indice, abertura_min, fechamento_min, hora * 60 + minuto)
+        pos_saida = localizar_saidas(indice, pos_entrada, deslocamento)
+        valido = pos_saida >= 0
+        for compra in (True, False):
+            total += len(calcular_drawdowns(indice, pos_entrada[valido], pos_saida[valido], compra))
+    return total
+
+def medir_uma_vez(candles, cfg, data_inicio, data_fim):
+    tempos = {}
+    contagens = {"tickers": len(candles), "candles": 0, "dias": 0, "consultas_drawdown": 0}
+    partes_por_horario = {h: [] for h in cfg["horarios_selecionados"]}
+
+    for ticker, bruto in candles.items():
+        df, indice = _cronometrar(tempos, "carga", preparar_candles, bruto.copy(), data_inicio, data_fim,
+                                  com_liquidez=False)
+        indice["liquidez"] = _cronometrar(tempos, "liquidez", calcular_liquidez, df, indice)
+        contagens["candles"] += len(df)
+        contagens["dias"] += len(indice["inicio"])
+        # Tabelas de drawdown montadas aqui: a avaliação só faz as consultas das operações
+        contagens["consultas_drawdown"] += _cronometrar(tempos, "drawdown", _drawdowns_de_todos_os_eventos, indice, cfg)
+        resultado = _cronometrar(tempos, "avaliacao_por_dia", avaliar_ticker, indice, ticker, cfg)
+        for horario in cfg["horarios_selecionados"]:
+            partes_por_horario[horario].append((ticker, resultado["operacoes"][horario]))
+
+    partes = [parte for horario in cfg["horarios_selecionados"] for parte in partes_por_horario[horario]]
+    operacoes = _cronometrar(tempos, "agregacao", montar_operacoes, partes, cfg["qtd"], cfg["referencia"])
+    _cronometrar(tempos, "agregacao", resumir_operacoes, operacoes, ["Horário", "Ação", "Direção"])
+    _cronometrar(tempos, "formatacao", formatar_operacoes, operacoes)
+    contagens["operacoes"] = len(operacoes)
+    tempos["total"] = sum(tempos.values())
+    return tempos, contagens
+
+def executar(candles, cfg, data_inicio, data_fim, repeticoes=3):
+    melhores = {}
+    for _ in range(repeticoes):
+        tempos, contagens = medir_uma_vez(candles, cfg, data_inicio, data_fim)
+        for etapa, segundos in tempos.items():
+            melhores[etapa] = min(segundos, melhores.get(etapa, float("inf")))
+    melhores["candles_por_segundo"] = contagens["candles"] / melhores["total"] if melhores["total"] else 0.0
+    return melhores, contagens
+
+# ========================
+# CONFERÊNCIA: motor vetorizado x avaliação linha a linha
+# ========================
+# Referência propositalmente ingênua: para cada horário e dia, percorre os
+# candles do dia, com as mesmas regras do rastreamento (candle mais próximo
+# dentro do pregão, empate para o mais cedo; saída exata N candles depois;
+# descarte na ordem sem pregão -> sem saída -> saída após o fechamento ->
+# referência inválida; compra antes de venda dentro de cada modo).
+def avaliar_linha_a_linha(indice, cfg):
+    tipo_ativo = cfg["tipo_ativo"]
+    deslocamento = 5 * int(cfg["candles_pos_entrada"])
+    valor_ponto = calcular_valor_ponto(tipo_ativo)
+    tabela, linhas = indice["referencias"], indice["linha_referencia"]
+    minutos = indice["minutos"].tolist()
+    minutos_selecionados = {int(h[:2]) * 60 + int(h[3:5]) for h in cfg["horarios_selecionados"]}
+    motivo_apos = {"mini_indice": 3, "mini_dolar": 3, "acoes": 4}.get(tipo_ativo)
+    operacoes = {h: [] for h in cfg["horarios_selecionados"]}
+    ignorados = {h: [] for h in cfg["horarios_selecionados"]}
+    pregoes = [sessao_do_dia(data, tipo_ativo) for data in indice["datas"]]
+
+    for horario in cfg["horarios_selecionados"]:
+        alvo = int(horario[:2]) * 60 + int(horario[3:5])
+        for i in range(1, len(indice["dias"])):
+            data = indice["datas"][i]
+            abertura, fechamento = pregoes[i]
+            candles = range(indice["inicio"][i], indice["fim"][i])
+            no_pregao = [k for k in candles if abertura != SEM_PREGAO and abertura <= minutos[k] <= fechamento]
+            if not no_pregao:
+                ignorados[horario].append((data, MOTIVOS_IGNORADO[1]))
+                continue
+            entrada = min(no_pregao, key=lambda k: abs(minutos[k] - alvo))
+            minuto_saida = minutos[entrada] + deslocamento
+            saida = next((k for k in candles if minutos[k] == minuto_saida), None)
+            if saida is None:
+                ignorados[horario].append((data, MOTIVOS_IGNORADO[2]))
+                continue
+            if motivo_apos and minuto_saida > fechamento:
+                ignorados[horario].append((data, MOTIVOS_IGNORADO[motivo_apos]))
+                continue
+            if cfg["referencia"] == "Fechamento do dia anterior":
+                valor, dia_referencia = tabela["fechamento"][linhas[i - 1]], indice["dias"][i - 1]
+            elif cfg["referencia"] == "Mínima do dia anterior":
+                valor, dia_referencia = tabela["minima"][linhas[i - 1]], indice["dias"][i - 1]
+            else:
+                valor, dia_referencia = tabela["abertura"][linhas[i]], indice["dias"][i]
+            if valor <= 0:
+                ignorados[horario].append((data, MOTIVOS_IGNORADO[5]))
+                continue
+            if minutos[entrada] not in minutos_selecionados:
+                continue
+
+            preco_entrada, preco_saida = indice["open"][entrada], indice["open"][saida]
+            distorcao = ((preco_entrada - valor) / valor) * 100
+            direcoes = []
+            if cfg["modo_estrategia"] in ["A Favor da Tendência", "Ambos"]:
+                if distorcao > cfg["dist_favor_compra"]:
+                    direcoes.append("Compra (Favor)")
+                elif distorcao < -cfg["dist_favor_venda"]:
+                    direcoes.append("Venda (Favor)")
+            if cfg["modo_estrategia"] in ["Contra Tendência", "Ambos"]:
+                if distorcao < -cfg["dist_compra_contra"]:
+                    direcoes.append("Compra (Contra)")
+                elif distorcao > cfg["dist_venda_contra"]:
+                    direcoes.append("Venda (Contra)")
+            for direcao in direcoes:
+                compra = direcao.startswith("Compra")
+                lucro = (preco_saida - preco_entrada) if compra else (preco_entrada - preco_saida)
+                trecho = indice["low" if compra else "high"][entrada:saida + 1]
+                extremo = np.nan if np.isnan(trecho).all() else (np.nanmin(trecho) if compra else np.nanmax(trecho))
+                operacoes[horario].append((
+                    direcao, indice["ts"][entrada], round(preco_entrada, 2), round(preco_saida, 2),
+                    round(lucro * valor_ponto * cfg["qtd"], 2), distorcao, valor, dia_referencia,
+                    round((extremo - preco_entrada) / preco_entrada * 100, 2),
+                ))
+    return operacoes, ignorados
+
+def _proximos(x, y):
+    return (math.isnan(x) and math.isnan(y)) or math.isclose(x, y, rel_tol=1e-12, abs_tol=1e-9)
+
+def _mesma_operacao(a, b):
+    return a[:2] == b[:2] and a[7] == b[7] and all(_proximos(x, y) for x, y in zip(a[2:7] + a[8:], b[2:7] + b[8:]))
+
+def dados_conferencia(tipo_ativo):
+    bruto = gerar_candles(tipo_ativo, CONFERENCIA["dias"], semente=CONFERENCIA["semente"], inicio=CONFERENCIA["inicio"])
+    dias = bruto["Data"].dt.normalize()
+    feriado = bruto[dias == dias.iloc[0]].copy()
+    feriado["Data"] = pd.Timestamp(CONFERENCIA["feriado"]) + (feriado["Data"] - dias.iloc[0])
+    bruto.loc[dias == pd.Timestamp(CONFERENCIA["minima_zerada"]), "Mínima"] = 0.0
+    return pd.concat([bruto, feriado], ignore_index=True)
+
+# Retorna (casos, divergências): um caso = tipo x modo x referência x candles de saída
+def conferir_equivalencia():
+    casos, divergencias = 0, []
+    for tipo_ativo in ["acoes", "mini_indice"]:
+        _, indice = preparar_candles(dados_conferencia(tipo_ativo), date.min, date.max, com_liquidez=False)
+        for modo in MODOS_CONFERENCIA:
+            for referencia in ROTULOS_REFERENCIA:
+                for candles_pos_entrada in CONFERENCIA["candles_pos_entrada"]:
+                    limite = CONFERENCIA["distorcao"]
+                    cfg = dict(CONFIG_PADRAO, tipo_ativo=tipo_ativo, modo_estrategia=modo, referencia=referencia,
+                               candles_pos_entrada=candles_pos_entrada, horarios_selecionados=HORARIOS_BENCHMARK,
+                               dist_compra_contra=limite, dist_venda_contra=limite,
+                               dist_favor_compra=limite, dist_favor_venda=limite)
+                    resultado = avaliar_ticker(indice, "TESTE", cfg)
+                    esperado_ops, esperado_ignorados = avaliar_linha_a_linha(indice, cfg)
+                    casos += 1
+                    for horario in HORARIOS_BENCHMARK:
+                        ops = resultado["operacoes"][horario]
+                        obtido = list(zip(
+                            [DIRECOES[d] for d in ops["direcao"]], ops["entrada"], ops["preco_entrada"],
+                            ops["preco_saida"], ops["lucro"], ops["distorcao"], ops["valor_referencia"],
+                            ops["data_referencia"], ops["drawdown"],
+                        ))
+                        iguais = len(obtido) == len(esperado_ops[horario]) and all(
+                            _mesma_operacao(a, b) for a, b in zip(obtido, esperado_ops[horario])
+                        )
+                        if not iguais or resultado["dias_ignorados"][horario] != esperado_ignorados[horario] \
+                                or resultado["erros"]:
+                            divergencias.append(f"{tipo_ativo} · {modo} · {referencia} · "
+                                                f"{candles_pos_entrada} candles · {horario}")
+    return casos, divergencias
+
+# ========================
+# LINHAS DE BASE
+# ========================
+def caminho_baseline(nome):
+    return os.path.join(PASTA_BASELINES, f"{nome}.json")
+
+def salvar_baseline(nome, registro):
+    os.makedirs(PASTA_BASELINES, exist_ok=True)
+    with open(caminho_baseline(nome), "w", encoding="utf-8") as f:
+        json.dump(registro, f, indent=2, ensure_ascii=False)
+
+def comparar_baseline(nome, tempos):
+    caminho = caminho_baseline(nome)
+    if not os.path.exists(caminho):
+        return None
+    with open(caminho, "r", encoding="utf-8") as f:
+        base = json.load(f)["tempos"]
+    comparacao = {}
+    for etapa, segundos in tempos.items():
+        if etapa == "candles_por_segundo" or not base.get(etapa):
+            continue
+        comparacao[etapa] = {"base": base[etapa], "atual": segundos, "razao": segundos / base[etapa]}
+    return comparacao
+
+# ========================
+# PROGRAMA PRINCIPAL
+# ========================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark do rastreamento intraday (candles sintéticos, offline).")
+    parser.add_argument("--cenario", choices=sorted(CENARIOS), default="minimo")
+    parser.add_argument("--tickers", type=int, help="Sobrepõe o nº de tickers do cenário")
+    parser.add_argument("--dias", type=int, help="Sobrepõe o nº de dias úteis do cenário")
+    parser.add_argument("--tipo", choices=["acoes", "mini_indice", "mini_dolar"], help="Sobrepõe o tipo de ativo")
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--salvar", action="store_true", help="Grava o resultado como linha de base")
+    parser.add_argument("--comparar", action="store_true", help="Compara com a linha de base (sai com 1 se regrediu)")
+    parser.add_argument("--conferir", action="store_true", help="Só confere o motor contra a versão linha a linha")
+    args = parser.parse_args(argv)
+
+    casos, divergencias = conferir_equivalencia()
+    print(f"Conferência linha a linha: {casos} casos, {len(divergencias)} divergência(s)")
+    for divergencia in divergencias[:20]:
+        print(f"  ❌ {divergencia}")
+    if divergencias:
+        return 2
+    if args.conferir:
+        return 0
+
+    cenario = dict(CENARIOS[args.cenario])
+    for chave in ["tickers", "dias", "tipo"]:
+        if getattr(args, chave) is not None:
+            cenario[chave] = getattr(args, chave)
+    nome = args.cenario if cenario == CENARIOS[args.cenario] else f"{cenario['tipo']}_{cenario['tickers']}x{cenario['dias']}"
+
+    cfg = dict(CONFIG_PADRAO, tipo_ativo=cenario["tipo"], modo_estrategia="Ambos",
+               horarios_selecionados=HORARIOS_BENCHMARK)
+    candles = gerar_universo(cenario["tickers"], cenario["dias"], cenario["tipo"], semente=args.semente)
+    datas = pd.concat([df["Data"] for df in candles.values()])
+    data_inicio, data_fim = datas.min().date(), datas.max().date()
+
+    tempos, contagens = executar(candles, cfg, data_inicio, data_fim, repeticoes=args.repeticoes)
+    registro = {
+        "cenario": nome,
+        "parametros": dict(cenario, semente=args.semente, repeticoes=args.repeticoes),
+        "tempos": tempos,
+        "contagens": contagens,
+        "ambiente": {
+            "python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__,
+            "maquina": platform.machine(), "processador": platform.processor(),
+        },
+        "executado_em": datetime.now().isoformat(timespec="seconds"),
+    }
+
+    print(f"Cenário {nome}: {contagens['tickers']} ticker(s), {contagens['candles']} candles, "
+          f"{contagens['dias']} dias, {contagens['operacoes']} operações")
+    for etapa, segundos in tempos.items():
+        if etapa != "candles_por_segundo":
+            print(f"  {etapa:<20} {segundos * 1000:10.1f} ms")
+    print(f"  {'candles/s':<20} {tempos['candles_por_segundo']:10.0f}")
+
+    codigo_saida = 0
+    if args.comparar:
+        comparacao = comparar_baseline(nome, tempos)
+        if comparacao is None:
+            print(f"⚠️ Sem linha de base em {caminho_baseline(nome)} (use --salvar)")
+        else:
+            for etapa, c in comparacao.items():
+                alerta = "  ⚠️ REGRESSÃO" if c["razao"] > TOLERANCIA else ""
+                print(f"  {etapa:<20} {c['razao']:6.2f}x da linha de base{alerta}")
+                if c["razao"] > TOLERANCIA:
+                    codigo_saida = 1
+    if args.salvar:
+        salvar_baseline(nome, registro)
+        print(f"💾 Linha de base salva em {caminho_baseline(nome)}")
+    return codigo_saida
+
+if __name__ == "__main__":
+    sys.exit(main())
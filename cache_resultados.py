@@ -0,0 +1,86 @@
+# cache_resultados.py - memória dos rastreamentos já calculados (LRU + validade)
+# Fica no nível do módulo: é compartilhada por todas as sessões do mesmo servidor.
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+# ========================
+# CONFIGURAÇÃO
+# ========================
+MAX_ENTRADAS = 32
+VALIDADE_SEGUNDOS = 30 * 60
+
+# Chaves da configuração que mudam o resultado ("processos" só muda a forma de calcular)
+CHAVES_CONFIG = [
+    "tipo_ativo", "qtd", "candles_pos_entrada", "dist_compra_contra", "dist_venda_contra",
+    "dist_favor_compra", "dist_favor_venda", "referencia", "horarios_selecionados", "modo_estrategia",
+    "usar_filtro_liquidez", "limite_liquidez"
+]
+
+_entradas = OrderedDict()
+_trava = threading.Lock()
+
+# ========================
+# CHAVE: impressão digital dos candles + configuração normalizada + período
+# ========================
+def impressao_candles(df):
+    valores = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    colunas = "|".join(f"{col}:{df[col].dtype}" for col in df.columns)
+    return hashlib.sha1(colunas.encode("utf-8") + valores.tobytes()).hexdigest()
+
+def normalizar_config(cfg):
+    normalizada = {}
+    for chave in CHAVES_CONFIG:
+        valor = cfg.get(chave)
+        if isinstance(valor, bool) or valor is None:
+            normalizada[chave] = valor
+        elif isinstance(valor, (int, float)):
+            normalizada[chave] = float(valor)
+        elif isinstance(valor, (list, tuple)):
+            normalizada[chave] = [str(v) for v in valor]
+        else:
+            normalizada[chave] = str(valor)
+    return normalizada
+
+def chave_rastreamento(impressoes, cfg, data_inicio, data_fim):
+    conteudo = json.dumps({
+        "arquivos": impressoes,
+        "config": normalizar_config(cfg),
+        "periodo": [str(data_inicio), str(data_fim)],
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(conteudo.encode("utf-8")).hexdigest()
+
+# ========================
+# LEITURA E GRAVAÇÃO
+# ========================
+def obter(chave, agora=None):
+    agora = time.monotonic() if agora is None else agora
+    with _trava:
+        entrada = _entradas.get(chave)
+        if entrada is None:
+            return None
+        instante, valor = entrada
+        if agora - instante > VALIDADE_SEGUNDOS:
+            del _entradas[chave]
+            return None
+        _entradas.move_to_end(chave)
+        return valor
+
+def guardar(chave, valor, agora=None):
+    agora = time.monotonic() if agora is None else agora
+    with _trava:
+        _entradas[chave] = (agora, valor)
+        _entradas.move_to_end(chave)
+        while len(_entradas) > MAX_ENTRADAS:
+            _entradas.popitem(last=False)
+        # Entradas vencidas saem mesmo sem serem consultadas
+        for antiga in [c for c, (instante, _) in _entradas.items() if agora - instante > VALIDADE_SEGUNDOS]:
+            del _entradas[antiga]
+
+def limpar():
+    with _trava:
+        _entradas.clear()
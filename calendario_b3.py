@@ -0,0 +1,167 @@
+# calendario_b3.py - calendário de pregões da B3 (feriados, pregões reduzidos e horários)
+# Abertura/fechamento de cada dia saem de uma consulta vetorizada sobre tabelas
+# pré-calculadas por ano: o motor mascara o pregão de todo o histórico de uma
+# vez, sem comparar horários dia a dia.
+from datetime import date, timedelta
+from functools import lru_cache
+
+import numpy as np
+
+SEM_PREGAO = -1
+
+# ========================
+# HORÁRIO REGULAR (minutos desde 00:00), com vigência
+# ========================
+# Cada classe tem uma lista (vigente a partir de, abertura, fechamento) em ordem
+# de data; mudanças de horário da B3 entram como novas linhas. As linhas de
+# ações são geradas até o ano consultado (nada fica preso ao ano da importação).
+# Ações: desde novembro de 2021 o fechamento acompanha o horário de verão dos
+# EUA (17:00 durante o horário de verão de lá, 18:00 fora dele), com a troca na
+# segunda-feira seguinte à mudança americana. Antes disso (inclusive a época do
+# horário de verão brasileiro) e nos futuros vale uma única linha: essas
+# mudanças ainda não estão modeladas.
+INICIO_FECHAMENTO_EUA = date(2021, 11, 8)
+
+def _domingo(ano, mes, ordem):
+    primeiro = date(ano, mes, 1)
+    return primeiro + timedelta(days=(6 - primeiro.weekday()) % 7 + 7 * (ordem - 1))
+
+# Segundas-feiras em que o pregão de ações muda: (início, fim) do horário de verão dos EUA
+def trocas_horario_eua(ano):
+    return _domingo(ano, 3, 2) + timedelta(days=1), _domingo(ano, 11, 1) + timedelta(days=1)
+
+def _horarios_acoes(ano_final):
+    trocas = []
+    for ano in range(INICIO_FECHAMENTO_EUA.year, ano_final + 1):
+        verao, inverno = trocas_horario_eua(ano)
+        trocas += [(verao, 10 * 60, 17 * 60), (inverno, 10 * 60, 18 * 60)]
+    return [(date(2000, 1, 1), 10 * 60, 17 * 60)] + [t for t in trocas if t[0] >= INICIO_FECHAMENTO_EUA]
+
+HORARIOS_FUTUROS = [(date(2000, 1, 1), 9 * 60, 18 * 60 + 20)]
+
+# (vigência, abertura, fechamento) em vetores, com as linhas até o fim de "ano_final"
+@lru_cache(maxsize=None)
+def tabela_horarios(classe, ano_final):
+    horarios = _horarios_acoes(ano_final) if classe == 'acoes' else HORARIOS_FUTUROS
+    return (
+        np.array([h[0] for h in horarios], dtype='datetime64[D]'),
+        np.array([h[1] for h in horarios], dtype=np.int64),
+        np.array([h[2] for h in horarios], dtype=np.int64),
+    )
+
+# Quarta-feira de Cinzas: pregão começa às 13:00 (fechamento normal)
+ABERTURA_CINZAS = 13 * 60
+
+def classe_pregao(tipo_ativo):
+    return 'futuros' if tipo_ativo in ['mini_indice', 'mini_dolar'] else 'acoes'
+
+# Horário regular vigente na data
+def minutos_pregao(tipo_ativo, data):
+    vigencia, abertura, fechamento = tabela_horarios(classe_pregao(tipo_ativo), data.year)
+    linha = max(int(np.searchsorted(vigencia, np.datetime64(data, 'D'), side='right')) - 1, 0)
+    return int(abertura[linha]), int(fechamento[linha])
+
+# ========================
+# FERIADOS E PREGÕES REDUZIDOS
+# ========================
+def pascoa(ano):
+    # Algoritmo de Meeus/Jones/Butcher (calendário gregoriano)
+    a, b, c = ano % 19, ano // 100, ano % 100
+    d, e = b // 4, b % 4
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    mes = (h + l - 7 * m + 114) // 31
+    dia = (h + l - 7 * m + 114) % 31 + 1
+    return date(ano, mes, dia)
+
+def feriados(ano):
+    p = pascoa(ano)
+    dias = {
+        date(ano, 1, 1),                # Confraternização Universal
+        p - timedelta(days=48),         # Carnaval (segunda)
+        p - timedelta(days=47),         # Carnaval (terça)
+        p - timedelta(days=2),          # Sexta-feira Santa
+        date(ano, 4, 21),               # Tiradentes
+        date(ano, 5, 1),                # Dia do Trabalho
+        p + timedelta(days=60),         # Corpus Christi
+        date(ano, 9, 7),                # Independência
+        date(ano, 10, 12),              # Nossa Senhora Aparecida
+        date(ano, 11, 2),               # Finados
+        date(ano, 11, 15),              # Proclamação da República
+        date(ano, 12, 24),              # Véspera de Natal (sem pregão)
+        date(ano, 12, 25),              # Natal
+        date(ano, 12, 31),              # Último dia do ano (sem pregão)
+    }
+    # Feriados de São Paulo respeitados pela B3 até 2021
+    if ano <= 2021:
+        dias |= {date(ano, 1, 25), date(ano, 7, 9), date(ano, 11, 20)}
+    # Consciência Negra: feriado nacional a partir de 2024
+    if ano >= 2024:
+        dias.add(date(ano, 11, 20))
+    return dias
+
+def pregoes_reduzidos(ano):
+    # {data: (abertura, fechamento)}; None = horário regular da classe
+    return {pascoa(ano) - timedelta(days=46): (ABERTURA_CINZAS, None)}
+
+@lru_cache(maxsize=32)
+def _tabelas(ano_inicio, ano_fim):
+    sem_pregao = sorted(d for ano in range(ano_inicio, ano_fim + 1) for d in feriados(ano))
+    reduzidos = {}
+    for ano in range(ano_inicio, ano_fim + 1):
+        reduzidos.update(pregoes_reduzidos(ano))
+    datas = sorted(reduzidos)
+    return (
+        np.array(sem_pregao, dtype='datetime64[D]'),
+        np.array(datas, dtype='datetime64[D]'),
+        np.array([SEM_PREGAO if reduzidos[d][0] is None else reduzidos[d][0] for d in datas], dtype=np.int64),
+        np.array([SEM_PREGAO if reduzidos[d][1] is None else reduzidos[d][1] for d in datas], dtype=np.int64),
+    )
+
+# ========================
+# FUNÇÃO: abertura e fechamento (minutos) de vários dias de uma vez
+# ========================
+# Fins de semana e feriados saem com SEM_PREGAO nas duas colunas.
+def sessoes(dias, tipo_ativo):
+    dias = np.asarray(dias, dtype='datetime64[D]')
+    if len(dias) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    anos = dias.astype('datetime64[Y]').astype(np.int64) + 1970
+    sem_pregao, reduzidos, abertura_reduzida, fechamento_reduzido = _tabelas(int(anos.min()), int(anos.max()))
+
+    # Horário regular vigente em cada dia
+    vigencia, abertura_regular, fechamento_regular = tabela_horarios(classe_pregao(tipo_ativo), int(anos.max()))
+    linha = np.maximum(np.searchsorted(vigencia, dias, side='right') - 1, 0)
+    abertura = abertura_regular[linha]
+    fechamento = fechamento_regular[linha]
+
+    # Pregões reduzidos
+    if len(reduzidos):
+        k = np.minimum(np.searchsorted(reduzidos, dias), len(reduzidos) - 1)
+        reduzido = reduzidos[k] == dias
+        abertura = np.where(reduzido & (abertura_reduzida[k] >= 0), abertura_reduzida[k], abertura)
+        fechamento = np.where(reduzido & (fechamento_reduzido[k] >= 0), fechamento_reduzido[k], fechamento)
+
+    # Fins de semana (1970-01-01 foi quinta-feira) e feriados
+    dia_semana = (dias.astype(np.int64) + 3) % 7
+    fechado = (dia_semana >= 5) | np.isin(dias, sem_pregao)
+    abertura[fechado] = SEM_PREGAO
+    fechamento[fechado] = SEM_PREGAO
+    return abertura, fechamento
+
+# Fechamento regular mais tarde entre os pregões do período (limita os horários
+# de entrada que ainda saem dentro do pregão em algum dia)
+def fechamento_maximo(tipo_ativo, data_inicio, data_fim):
+    dias = np.arange(np.datetime64(data_inicio, 'D'), np.datetime64(data_fim, 'D') + 1)
+    _, fechamento = sessoes(dias, tipo_ativo)
+    fechamento = fechamento[fechamento != SEM_PREGAO]
+    return int(fechamento.max()) if len(fechamento) else minutos_pregao(tipo_ativo, data_fim)[1]
+
+# Um único dia: (abertura, fechamento) ou (SEM_PREGAO, SEM_PREGAO)
+def sessao_do_dia(data, tipo_ativo):
+    abertura, fechamento = sessoes(np.array([data], dtype='datetime64[D]'), tipo_ativo)
+    return int(abertura[0]), int(fechamento[0])
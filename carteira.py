@@ -0,0 +1,177 @@
+# carteira.py - simulação de carteira sobre as operações do rastreamento
+# As operações candidatas (de todos os ativos e horários) disputam o mesmo
+# capital: margem por contrato (WIN/WDO) ou valor integral (ações), limite de
+# posições simultâneas e limite de perda por dia. Sai a curva de patrimônio, o
+# resultado diário e o drawdown máximo da carteira.
+import numpy as np
+import pandas as pd
+
+from motor_intraday import calcular_valor_ponto
+from rastreamento import identificar_tipo
+
+# ========================
+# CONFIGURAÇÃO
+# ========================
+# Margem exigida, como fração do valor nocional (preço x valor do ponto x quantidade)
+MARGEM_PADRAO = {'acoes': 1.0, 'mini_indice': 0.10, 'mini_dolar': 0.10}
+
+MOTIVOS_RECUSA = ["", "Limite de perda do dia", "Máx. de posições simultâneas", "Capital insuficiente"]
+
+# Margem de cada operação (ativo → tipo → valor do ponto e fração de margem)
+def calcular_margens(df, margens=None):
+    margens = {**MARGEM_PADRAO, **(margens or {})}
+    acoes = df["Ação"].astype("category")
+    tipos = [identificar_tipo(str(ativo)) for ativo in acoes.cat.categories]
+    por_ativo_ponto = np.array([calcular_valor_ponto(t) for t in tipos] + [np.nan])
+    por_ativo_margem = np.array([margens.get(t, 1.0) for t in tipos] + [np.nan])
+    codigo = acoes.cat.codes.to_numpy()
+    nocional = df["Preço Entrada"].to_numpy(dtype=np.float64) * por_ativo_ponto[codigo] * df["Quantidade"].to_numpy()
+    return nocional * por_ativo_margem[codigo]
+
+# Admissão das operações de um mesmo instante, na ordem da tabela: a que não
+# cabe no capital livre é pulada (motivo 3) e as seguintes ainda podem entrar;
+# sem vagas, as restantes ficam de fora (motivo 2). Cada passada admite de uma
+# vez o maior trecho que cabe (soma acumulada das margens contra o capital livre,
+# limitado às vagas); só uma operação que não cabe abre uma nova passada.
+def _admitir(margens_lote, vagas, livre):
+    n = len(margens_lote)
+    entra = np.zeros(n, dtype=bool)
+    motivo = np.full(n, 2, dtype=np.int8)
+    inicio = 0
+    while inicio < n and vagas > 0:
+        trecho = margens_lote[inicio:inicio + vagas]
+        acumulado = np.cumsum(trecho)
+        cabe = acumulado <= livre + 1e-9
+        k = len(trecho) if cabe.all() else int(np.argmin(cabe))
+        if k:
+            entra[inicio:inicio + k] = True
+            motivo[inicio:inicio + k] = 0
+            livre -= acumulado[k - 1]
+            vagas -= k
+        if k == len(trecho):
+            break
+        motivo[inicio + k] = 3
+        inicio += k + 1
+    return entra, motivo
+
+# ========================
+# FUNÇÃO PRINCIPAL DA SIMULAÇÃO
+# ========================
+# Operações processadas por instante de entrada (todas as do mesmo minuto juntas).
+# As saídas de todas as candidatas formam um único vetor ordenado; cada operação
+# admitida registra margem e resultado na sua posição desse vetor, e um ponteiro
+# que só avança (searchsorted) libera, antes de cada instante, tudo o que já
+# saiu: o custo por instante não depende de quantas posições estão abertas.
+# As novas entram como em _admitir, se o dia não tiver atingido a perda máxima
+# (resultado realizado no dia).
+# Retorna operações (com Executada e Motivo), curva de patrimônio, resultado
+# diário e um resumo.
+def simular_carteira(df, capital_inicial, max_posicoes=None, perda_maxima_dia=None, margens=None):
+    n = len(df)
+    entrada = df["Data Entrada"].to_numpy(dtype="datetime64[m]")
+    saida = df["Data Saída"].to_numpy(dtype="datetime64[m]")
+    lucro = df["Lucro (R$)"].to_numpy(dtype=np.float64)
+    margem = calcular_margens(df, margens) if n else np.empty(0)
+    max_posicoes = max_posicoes or n
+    perda_maxima_dia = np.inf if not perda_maxima_dia else float(perda_maxima_dia)
+
+    motivo = np.zeros(n, dtype=np.int8)
+    executada = np.zeros(n, dtype=bool)
+    ordem = np.lexsort((np.arange(n), entrada))
+    instantes, inicios_lote = np.unique(entrada[ordem], return_index=True)
+    fins_lote = np.append(inicios_lote[1:], n)
+
+    # Eventos de saída ordenados; posicao_saida[i] = lugar da operação i nesse vetor
+    ordem_saida = np.argsort(saida, kind="stable")
+    saidas_ordenadas = saida[ordem_saida]
+    posicao_saida = np.empty(n, dtype=np.int64)
+    posicao_saida[ordem_saida] = np.arange(n)
+    margem_evento = np.zeros(n)
+    lucro_evento = np.zeros(n)
+    abertas_evento = np.zeros(n, dtype=np.int64)
+
+    liberado = 0
+    margem_aberta = 0.0
+    abertas = 0
+    realizado = 0.0
+    inicio_dia = 0.0
+    dia_atual = None
+    pico_posicoes = 0
+
+    def liberar_ate(limite):
+        nonlocal liberado, margem_aberta, abertas, realizado
+        if limite > liberado:
+            margem_aberta -= margem_evento[liberado:limite].sum()
+            abertas -= int(abertas_evento[liberado:limite].sum())
+            realizado += lucro_evento[liberado:limite].sum()
+            liberado = limite
+            if abertas == 0:
+                # Sem posições abertas a margem é zero (descarta o resíduo das somas)
+                margem_aberta = 0.0
+
+    for instante, ini, fim in zip(instantes, inicios_lote, fins_lote):
+        dia = instante.astype("datetime64[D]")
+        if dia != dia_atual:
+            # Virada do dia: saídas anteriores ao dia contam no dia em que ocorreram
+            liberar_ate(np.searchsorted(saidas_ordenadas, dia, side="left"))
+            dia_atual, inicio_dia = dia, realizado
+        liberar_ate(np.searchsorted(saidas_ordenadas, instante, side="right"))
+
+        lote = ordem[ini:fim]
+        if realizado - inicio_dia <= -perda_maxima_dia:
+            motivo[lote] = 1
+            continue
+        entra, motivo[lote] = _admitir(margem[lote], max_posicoes - abertas, capital_inicial + realizado - margem_aberta)
+        novas = lote[entra]
+        if not len(novas):
+            continue
+        executada[novas] = True
+        eventos = posicao_saida[novas]
+        margem_evento[eventos] = margem[novas]
+        lucro_evento[eventos] = lucro[novas]
+        abertas_evento[eventos] = 1
+        margem_aberta += margem[novas].sum()
+        abertas += len(novas)
+        pico_posicoes = max(pico_posicoes, abertas)
+        # Saída no próprio instante (já passada pelo ponteiro): realiza agora
+        atrasadas = eventos[eventos < liberado]
+        if len(atrasadas):
+            margem_aberta -= margem_evento[atrasadas].sum()
+            abertas -= len(atrasadas)
+            realizado += lucro_evento[atrasadas].sum()
+
+    operacoes = df.assign(**{
+        "Margem (R$)": margem,
+        "Executada": executada,
+        "Motivo": pd.Categorical.from_codes(motivo, MOTIVOS_RECUSA),
+    })
+
+    # Curva de patrimônio: um ponto por saída executada
+    ordem_saida = np.argsort(saida[executada], kind="stable")
+    datas_saida = saida[executada][ordem_saida]
+    patrimonio = capital_inicial + np.cumsum(lucro[executada][ordem_saida])
+    pico = np.maximum.accumulate(np.concatenate(([capital_inicial], patrimonio)))[1:]
+    curva = pd.DataFrame({
+        "Data": datas_saida.astype("datetime64[ns]"),
+        "Patrimônio (R$)": patrimonio,
+        "Drawdown (R$)": patrimonio - pico,
+    })
+
+    diario = curva.groupby(curva["Data"].dt.normalize().rename("Dia"), as_index=False).agg(
+        Patrimonio=("Patrimônio (R$)", "last")
+    )
+    diario["Lucro do Dia (R$)"] = np.diff(np.concatenate(([capital_inicial], diario["Patrimonio"].to_numpy())))
+    diario = diario.rename(columns={"Patrimonio": "Patrimônio (R$)"})[["Dia", "Lucro do Dia (R$)", "Patrimônio (R$)"]]
+
+    queda = curva["Drawdown (R$)"].to_numpy()
+    k = int(np.argmin(queda)) if len(queda) else None
+    resumo = {
+        "capital_inicial": float(capital_inicial),
+        "capital_final": float(patrimonio[-1]) if len(patrimonio) else float(capital_inicial),
+        "operacoes_executadas": int(executada.sum()),
+        "operacoes_recusadas": int(n - executada.sum()),
+        "max_drawdown": float(queda[k]) if k is not None else 0.0,
+        "max_drawdown_pct": float(queda[k] / pico[k] * 100) if k is not None and pico[k] > 0 else 0.0,
+        "max_posicoes_simultaneas": pico_posicoes,
+    }
+    return {"operacoes": operacoes, "curva": curva, "diario": diario, "resumo": resumo}
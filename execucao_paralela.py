@@ -0,0 +1,94 @@
+# execucao_paralela.py - carga e backtest por ativo em processos separados
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+import pandas as pd
+
+from armazem_candles import ler_historico
+from motor_intraday import avaliar_ticker, preparar_candles_com_referencias
+
+# ========================
+# CONFIGURAÇÃO
+# ========================
+# Vetores do índice de dias que vão para a memória compartilhada (o resto é pequeno e vai por pickle)
+CAMPOS_COMPARTILHADOS = ['ts', 'minutos', 'dias', 'inicio', 'fim', 'open', 'high', 'low', 'close', 'linha_referencia']
+
+def processos_disponiveis():
+    return os.cpu_count() or 1
+
+# ========================
+# MEMÓRIA COMPARTILHADA: publicar e anexar o índice de um ativo
+# ========================
+# O descritor só leva nomes, dtypes e shapes: os candles nunca são serializados.
+def publicar_indice(indice):
+    descritor = {'vetores': {}, 'referencias': indice['referencias'], 'liquidez': indice.get('liquidez')}
+    for campo in CAMPOS_COMPARTILHADOS:
+        vetor = np.ascontiguousarray(indice[campo])
+        bloco = shared_memory.SharedMemory(create=True, size=max(vetor.nbytes, 1))
+        np.ndarray(vetor.shape, dtype=vetor.dtype, buffer=bloco.buf)[...] = vetor
+        descritor['vetores'][campo] = (bloco.name, vetor.dtype.str, vetor.shape)
+        bloco.close()
+    return descritor
+
+def _abrir_bloco(nome):
+    try:
+        return shared_memory.SharedMemory(name=nome, track=False)
+    except TypeError:
+        # Python < 3.13: anexar registra o bloco no resource tracker; quem libera é o processo principal
+        bloco = shared_memory.SharedMemory(name=nome)
+        resource_tracker.unregister(bloco._name, "shared_memory")
+        return bloco
+
+def anexar_indice(descritor):
+    blocos = []
+    indice = {'referencias': descritor['referencias'], 'liquidez': descritor['liquidez']}
+    for campo, (nome, dtype, shape) in descritor['vetores'].items():
+        bloco = _abrir_bloco(nome)
+        blocos.append(bloco)
+        indice[campo] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=bloco.buf)
+    indice['datas'] = indice['dias'].astype(object)
+    return indice, blocos
+
+def fechar_indice(indice, blocos):
+    # As views precisam sair de cena antes de fechar os blocos
+    indice.clear()
+    for bloco in blocos:
+        bloco.close()
+
+def liberar_indice(descritor):
+    for nome, _, _ in descritor['vetores'].values():
+        try:
+            bloco = shared_memory.SharedMemory(name=nome)
+        except FileNotFoundError:
+            continue
+        bloco.close()
+        bloco.unlink()
+
+# ========================
+# TAREFAS DOS PROCESSOS (funções de módulo, para poderem ser enviadas ao pool)
+# ========================
+# Origem: ('caminho', parquet em disco) ou ('df', DataFrame já lido).
+def carregar_em_processo(origem, data_inicio, data_fim, referencias=None):
+    tipo, valor = origem
+    if tipo == 'historico':
+        # Só as partições do período
+        df = ler_historico(valor, data_inicio, data_fim)
+    else:
+        df = pd.read_parquet(valor) if tipo == 'caminho' else valor
+    df, indice = preparar_candles_com_referencias(df, data_inicio, data_fim, referencias)
+    return publicar_indice(indice)
+
+def avaliar_em_processo(descritor, ticker_nome, parametros):
+    indice, blocos = anexar_indice(descritor)
+    try:
+        return avaliar_ticker(indice, ticker_nome, parametros)
+    finally:
+        fechar_indice(indice, blocos)
+
+def criar_pool(processos):
+    # Tracker iniciado antes do pool: os processos filhos herdam o mesmo e não
+    # tentam "limpar" blocos que o processo principal ainda vai usar
+    resource_tracker.ensure_running()
+    return ProcessPoolExecutor(max_workers=processos)
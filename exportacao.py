@@ -0,0 +1,125 @@
+# exportacao.py - exportação de resultados em disco (CSV brasileiro, Parquet ou Arrow)
+# Cada arquivo é gerado uma única vez por impressão digital do resultado e servido
+# do disco nas próximas vezes, para qualquer sessão. A escrita é feita em blocos
+# de linhas: o CSV inteiro nunca existe como texto em memória.
+import os
+import time
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from armazem_candles import _gravar_atomico
+from cache_resultados import VALIDADE_SEGUNDOS
+
+# ========================
+# CONFIGURAÇÃO
+# ========================
+EXPORTACOES_DIR = os.path.join("cache_candles", "exportacoes")
+LINHAS_POR_BLOCO = 50_000
+# Arquivos mantidos em disco (os mais antigos saem primeiro); um arquivo usado
+# há menos tempo que a validade do cache de resultados nunca é removido
+MAX_EXPORTACOES = 100
+VALIDADE_EXPORTACAO = VALIDADE_SEGUNDOS
+
+FORMATOS = {
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+    "Arrow": ("arrow", "application/vnd.apache.arrow.file"),
+}
+
+def _blocos(df, formatar=None):
+    for inicio in range(0, max(len(df), 1), LINHAS_POR_BLOCO):
+        bloco = df.iloc[inicio:inicio + LINHAS_POR_BLOCO]
+        yield formatar(bloco) if formatar else bloco
+
+# CSV no padrão brasileiro (;, vírgula decimal, BOM para o Excel), bloco a bloco;
+# "formatar" (opcional) transforma cada bloco em texto só na hora de escrever
+def escrever_csv(df, destino, formatar=None):
+    with open(destino, "w", encoding="utf-8-sig", newline="") as saida:
+        for i, bloco in enumerate(_blocos(df, formatar)):
+            bloco.to_csv(saida, index=False, header=(i == 0), sep=";", decimal=",")
+
+# Parquet/Arrow guardam os tipos (datas, categorias, números) para análise posterior
+def escrever_parquet(df, destino, formatar=None):
+    escritor = None
+    try:
+        for bloco in _blocos(df, formatar):
+            tabela = pa.Table.from_pandas(bloco, preserve_index=False)
+            if escritor is None:
+                escritor = pq.ParquetWriter(destino, tabela.schema)
+            escritor.write_table(tabela.cast(escritor.schema))
+    finally:
+        if escritor is not None:
+            escritor.close()
+
+def escrever_arrow(df, destino, formatar=None):
+    escritor = schema = None
+    with pa.OSFile(destino, "wb") as saida:
+        try:
+            for bloco in _blocos(df, formatar):
+                tabela = pa.Table.from_pandas(bloco, preserve_index=False)
+                if escritor is None:
+                    schema = tabela.schema
+                    escritor = pa.ipc.new_file(saida, schema)
+                escritor.write_table(tabela.cast(schema))
+        finally:
+            if escritor is not None:
+                escritor.close()
+
+ESCRITORES = {"csv": escrever_csv, "parquet": escrever_parquet, "arrow": escrever_arrow}
+
+# ========================
+# FUNÇÃO PRINCIPAL: caminho do arquivo exportado (gerado só se ainda não existe)
+# ========================
+# "impressao" identifica o resultado (ex.: chave do cache de resultados); nome
+# separa tabelas diferentes do mesmo resultado.
+def caminho_exportacao(impressao, nome, formato="CSV", diretorio=EXPORTACOES_DIR):
+    extensao, _ = FORMATOS[formato]
+    return os.path.join(diretorio, f"{nome}_{impressao}.{extensao}")
+
+def exportar(df, impressao, nome, formato="CSV", formatar=None, diretorio=EXPORTACOES_DIR):
+    extensao, _ = FORMATOS[formato]
+    caminho = caminho_exportacao(impressao, nome, formato, diretorio)
+    try:
+        # Reuso conta como uso recente: a limpeza só remove arquivos parados
+        os.utime(caminho)
+        return caminho
+    except FileNotFoundError:
+        pass
+    os.makedirs(diretorio, exist_ok=True)
+    _gravar_atomico(caminho, lambda destino: ESCRITORES[extensao](df, destino, formatar))
+    limpar_exportacoes(diretorio, manter=caminho)
+    return caminho
+
+# Arquivo exportado já aberto para leitura; se outra sessão o removeu entre a
+# geração e a abertura, é gerado de novo
+def abrir_exportacao(df, impressao, nome, formato="CSV", formatar=None, diretorio=EXPORTACOES_DIR):
+    try:
+        return open(exportar(df, impressao, nome, formato, formatar, diretorio), "rb")
+    except FileNotFoundError:
+        return open(exportar(df, impressao, nome, formato, formatar, diretorio), "rb")
+
+# Remove temporários abandonados e os arquivos além do máximo, mas só os parados
+# há mais que a validade; "manter" (o arquivo recém-gerado) nunca sai
+def limpar_exportacoes(diretorio=EXPORTACOES_DIR, maximo=MAX_EXPORTACOES, validade=VALIDADE_EXPORTACAO,
+                       manter=None, agora=None):
+    agora = time.time() if agora is None else agora
+    arquivos, temporarios = [], []
+    for nome in os.listdir(diretorio):
+        caminho = os.path.join(diretorio, nome)
+        if caminho == manter:
+            continue
+        try:
+            modificado = os.path.getmtime(caminho)
+        except OSError:
+            continue
+        (temporarios if nome.endswith(".tmp") else arquivos).append((modificado, caminho))
+    arquivos.sort()
+    excedentes = arquivos[:max(len(arquivos) - max(maximo - 1, 0), 0)]
+    for modificado, caminho in temporarios + excedentes:
+        if agora - modificado <= validade:
+            continue
+        try:
+            os.remove(caminho)
+        except OSError:
+            pass
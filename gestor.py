@@ -1,15 +1,16 @@
 # gestor.py
 import streamlit as st
-import json
 import os
 from datetime import datetime, timedelta
 import pandas as pd
+from banco_clientes import (
+    BANCO, carregar_clientes, carregar_pendentes, conectar, contar_por_status,
+    excluir_cliente, expirar_clientes, importar_pendentes_json, liberar_pendente, salvar_cliente
+)
 
 # ========================
 # CONFIGURAÇÃO
 # ========================
-ARQUIVO = "acessos.json"
-PENDENTES_FILE = "pendentes.json"
 BACKUP_DIR = "backups"
 
 if not os.path.exists(BACKUP_DIR):
@@ -18,59 +19,22 @@ if not os.path.exists(BACKUP_DIR):
 # ========================
 # FUNÇÕES
 # ========================
-def carregar_acessos():
-    if os.path.exists(ARQUIVO):
-        try:
-            with open(ARQUIVO, "r", encoding="utf-8") as f:
-                dados = json.load(f)
-            return dados if isinstance(dados, dict) else {}
-        except Exception as e:
-            st.error(f"⚠️ Erro ao ler {ARQUIVO}: {e}")
-            return {}
-    return {}
-
-def salvar_acessos(dados):
-    try:
-        with open(ARQUIVO, "w", encoding="utf-8") as f:
-            json.dump(dados, f, indent=2, ensure_ascii=False)
-        st.success("✅ Dados salvos com sucesso.")
-    except Exception as e:
-        st.error(f"❌ Erro ao salvar {ARQUIVO}: {e}")
+# Uma única conexão por servidor, reaproveitada em todas as execuções do script
+@st.cache_resource
+def abrir_banco():
+    return conectar()
 
-def carregar_pendentes():
-    if os.path.exists(PENDENTES_FILE):
-        try:
-            with open(PENDENTES_FILE, "r", encoding="utf-8") as f:
-                dados = json.load(f)
-            return [p for p in dados if isinstance(p, dict)]
-        except Exception:
-            st.error("⚠️ Arquivo pendentes.json corrompido.")
-            return []
-    return []
-
-def salvar_pendentes(dados):
+# Grava uma alteração (uma linha, numa transação) e avisa se falhar
+def gravar(acao, *args):
     try:
-        with open(PENDENTES_FILE, "w", encoding="utf-8") as f:
-            json.dump(dados, f, indent=2, ensure_ascii=False)
+        acao(conexao, *args)
+        return True
     except Exception as e:
-        st.error(f"❌ Erro ao salvar pendentes: {e}")
-
-def expirar_todos(dados):
-    hoje = datetime.now().date()
-    for email, info in dados.items():
-        if isinstance(info, dict):
-            expira_str = info.get("expira_em", "")
-            if expira_str:
-                try:
-                    expira = datetime.strptime(expira_str, "%Y-%m-%d").date()
-                    if hoje > expira and info.get("status") == "ativo":
-                        info["status"] = "expirado"
-                except:
-                    continue
-    return dados
+        st.error(f"❌ Erro ao salvar em {BANCO}: {e}")
+        return False
 
 def gerar_backup():
-    dados = carregar_acessos()
+    dados = carregar_clientes(conexao)
     if not dados:
         return None
 
@@ -102,10 +66,18 @@ def gerar_backup():
 # ========================
 # CARREGAR DADOS
 # ========================
-dados = carregar_acessos()
-pendentes = carregar_pendentes()
-dados = expirar_todos(dados)
-salvar_acessos(dados)
+# Abre o banco (na primeira vez importa acessos.json e pendentes.json) e traz
+# as solicitações novas de pendentes.json; a expiração é um único UPDATE que só
+# grava os clientes que venceram
+try:
+    conexao = abrir_banco()
+    importar_pendentes_json(conexao)
+    expirar_clientes(conexao)
+    dados = carregar_clientes(conexao)
+    pendentes = carregar_pendentes(conexao)
+except Exception as e:
+    st.error(f"⚠️ Erro ao abrir {BANCO}: {e}")
+    st.stop()
 
 # Inicializa variáveis de sessão
 if "ultimo_backup" not in st.session_state:
@@ -114,15 +86,9 @@ if "ultimo_backup" not in st.session_state:
 # ========================
 # CONTAGEM DE CLIENTES E PENDENTES
 # ========================
-ativos = 0
-expirados = 0
-for info in dados.values():
-    if not isinstance(info, dict):
-        continue
-    if info.get("status") == "ativo":
-        ativos += 1
-    elif info.get("status") == "expirado":
-        expirados += 1
+por_status = contar_por_status(conexao)
+ativos = por_status.get("ativo", 0)
+expirados = por_status.get("expirado", 0)
 
 qtd_pendentes = len(pendentes)
 
@@ -145,10 +111,12 @@ col4.metric("🔁 Último Backup", st.session_state.ultimo_backup)
 if st.button("📥 Gerar Backup em Excel"):
     caminho = gerar_backup()
     if caminho:
+        # Servido do arquivo gravado em disco, só nesta execução (a do clique): o
+        # st.download_button carrega o arquivo inteiro na memória a cada renderização
         with open(caminho, "rb") as f:
             st.download_button(
                 label="💾 Baixar Backup Excel",
-                data=f.read(),
+                data=f,
                 file_name=os.path.basename(caminho),
                 mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                 key=f"backup_{datetime.now().timestamp()}"
@@ -201,19 +169,17 @@ with aba[0]:
             col1, col2 = st.columns(2)
             with col1:
                 if st.button("✅ Sim, deletar", key=f"conf_delete_{email_para_excluir}"):
-                    del dados[email_para_excluir]
-                    salvar_acessos(dados)
-                    st.success(f"✅ {email_para_excluir} removido.")
-                    st.rerun()
+                    if gravar(excluir_cliente, email_para_excluir):
+                        st.success(f"✅ {email_para_excluir} removido.")
+                        st.rerun()
             with col2:
                 if st.button("❌ Cancelar", key=f"cancel_delete_{email_para_excluir}"):
                     st.rerun()
 
     # Atualizar status
     if st.button("🔄 Atualizar status (expirados)"):
-        dados_atualizados = expirar_todos(dados)
-        salvar_acessos(dados_atualizados)
-        st.rerun()
+        if gravar(expirar_clientes):
+            st.rerun()
 
 # --- ABAS ---
 with aba[1]:
@@ -222,7 +188,7 @@ with aba[1]:
     if not pendentes:
         st.info("Nenhuma solicitação recebida.")
     else:
-        for i, p in enumerate(pendentes):
+        for p in pendentes:
             email = p.get("email", "Sem email")
             senha = p.get("senha", "n/a")
             plano = p.get("plano_interesse", "n/a")
@@ -233,23 +199,22 @@ with aba[1]:
             cols[1].write(senha)
             cols[2].write(plano)
             cols[3].write(data)
-            if cols[4].button("✅ Liberar", key=f"lib_{i}"):
+            if cols[4].button("✅ Liberar", key=f"lib_{p['id']}"):
                 if not senha:
                     st.error("❌ Cliente não definiu senha.")
                 else:
                     expira = (datetime.now().date() + timedelta(days=15)).strftime("%Y-%m-%d")
-                    dados[email] = {
+                    cliente = {
                         "senha": senha,
                         "plano": "Bronze",
                         "liberado_em": datetime.now().strftime("%Y-%m-%d"),
                         "expira_em": expira,
                         "status": "ativo"
                     }
-                    pendentes.pop(i)
-                    salvar_acessos(dados)
-                    salvar_pendentes(pendentes)
-                    st.success(f"✅ {email} liberado com plano Bronze por 15 dias.")
-                    st.rerun()
+                    # Cliente cadastrado e solicitação removida na mesma transação
+                    if gravar(liberar_pendente, p["id"], email, cliente):
+                        st.success(f"✅ {email} liberado com plano Bronze por 15 dias.")
+                        st.rerun()
 
 # --- ABAS ---
 with aba[2]:
@@ -267,16 +232,16 @@ with aba[2]:
                 st.error("❌ Senha obrigatória")
             else:
                 expira = (datetime.now().date() + timedelta(days=dias)).strftime("%Y-%m-%d")
-                dados[email] = {
+                cliente = {
                     "senha": senha,
                     "plano": plano,
                     "liberado_em": datetime.now().strftime("%Y-%m-%d"),
                     "expira_em": expira,
                     "status": "ativo"
                 }
-                salvar_acessos(dados)
-                st.success(f"✅ {email} foi liberado até {expira}")
-                st.rerun()
+                if gravar(salvar_cliente, email, cliente):
+                    st.success(f"✅ {email} foi liberado até {expira}")
+                    st.rerun()
 
 # --- ABAS ---
 with aba[3]:
@@ -370,6 +335,5 @@ with aba[3]:
 # INFORMAÇÃO FINAL
 # ========================
 st.markdown("---")
-st.caption(f"📁 Arquivo principal: `{ARQUIVO}`")
-st.caption(f"📥 Solicitações: `{PENDENTES_FILE}`")
+st.caption(f"📁 Clientes e solicitações: `{BANCO}` (SQLite)")
 st.caption(f"💾 Backups salvos na pasta: `{BACKUP_DIR}`")
\ No newline at end of file
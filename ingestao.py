@@ -0,0 +1,219 @@
+# ingestao.py - leitura rápida de arquivos de candles (Excel, CSV ou Parquet)
+import hashlib
+import io
+import os
+import time
+import unicodedata
+
+import pandas as pd
+
+from armazem_candles import _gravar_atomico
+
+# ========================
+# CONFIGURAÇÃO
+# ========================
+CACHE_UPLOADS_DIR = os.path.join("cache_candles", "uploads")
+# Conversões sem uso há mais que a validade saem do cache; acima do tamanho
+# máximo, as usadas há mais tempo saem primeiro
+VALIDADE_UPLOADS = 30 * 24 * 3600
+MAX_BYTES_UPLOADS = 512 * 1024 * 1024
+# Temporário de uma gravação interrompida (a gravação em si leva segundos)
+VALIDADE_TEMPORARIO = 3600
+
+# Nome canônico -> apelidos aceitos (comparados sem acento, em minúsculas)
+APELIDOS_COLUNAS = {
+    'Data': ['data', 'date', 'datetime', 'data/hora', 'data hora', 'data_hora', 'timestamp', 'horario', 'time'],
+    'Abertura': ['abertura', 'open', 'abert', 'preco abertura'],
+    'Máxima': ['maxima', 'high', 'max', 'preco maximo', 'maximo'],
+    'Mínima': ['minima', 'low', 'min', 'preco minimo', 'minimo'],
+    'Fechamento': ['fechamento', 'close', 'fech', 'ultimo', 'preco fechamento', 'adj close'],
+    'Volume': ['volume', 'vol', 'quantidade'],
+}
+COLUNAS_PRECO = ['Abertura', 'Máxima', 'Mínima', 'Fechamento']
+
+# Formatos de data testados em ordem; o primeiro que reconhece a amostra inteira vale
+FORMATOS_DATA = [
+    '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M',
+    '%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M', '%d-%m-%Y %H:%M:%S', '%d-%m-%Y %H:%M',
+    '%d.%m.%Y %H:%M:%S', '%d.%m.%Y %H:%M', '%d/%m/%Y', '%Y-%m-%d',
+]
+
+# ========================
+# FUNÇÕES AUXILIARES
+# ========================
+def _sem_acento(texto):
+    texto = unicodedata.normalize('NFKD', str(texto))
+    return ''.join(c for c in texto if not unicodedata.combining(c)).strip().lower()
+
+def _ler_bytes(arquivo):
+    if isinstance(arquivo, (bytes, bytearray)):
+        return bytes(arquivo)
+    if isinstance(arquivo, str):
+        with open(arquivo, "rb") as f:
+            return f.read()
+    if hasattr(arquivo, "getvalue"):
+        return arquivo.getvalue()
+    posicao = arquivo.tell() if hasattr(arquivo, "tell") else None
+    conteudo = arquivo.read()
+    if posicao is not None:
+        arquivo.seek(posicao)
+    return conteudo
+
+# Impressão digital do conteúdo (mesmo arquivo reenviado = mesma impressão)
+def impressao_arquivo(arquivo):
+    return hashlib.sha1(_ler_bytes(arquivo)).hexdigest()
+
+# Formato reconhecido pelo conteúdo (assinatura do arquivo), não pela extensão
+def detectar_formato(conteudo):
+    if conteudo[:4] == b'PAR1':
+        return 'parquet'
+    if conteudo[:4] == b'PK\x03\x04':
+        return 'xlsx'
+    if conteudo[:8] == b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1':
+        return 'xls'
+    return 'csv'
+
+def normalizar_colunas(df):
+    mapa = {}
+    usados = set()
+    for col in df.columns:
+        chave = _sem_acento(col)
+        for canonico, apelidos in APELIDOS_COLUNAS.items():
+            if canonico not in usados and chave in apelidos:
+                mapa[col] = canonico
+                usados.add(canonico)
+                break
+    return df.rename(columns=mapa)
+
+def detectar_formato_data(amostra):
+    amostra = [str(v).strip() for v in amostra if pd.notna(v) and str(v).strip()]
+    if not amostra:
+        return None
+    for formato in FORMATOS_DATA:
+        try:
+            pd.to_datetime(pd.Series(amostra), format=formato)
+            return formato
+        except (ValueError, TypeError):
+            continue
+    return None
+
+def converter_datas(coluna):
+    if pd.api.types.is_datetime64_any_dtype(coluna):
+        return coluna
+    formato = detectar_formato_data(coluna.head(50).tolist())
+    if formato is not None:
+        return pd.to_datetime(coluna, format=formato, errors='coerce')
+    # Formato desconhecido: cai no comportamento antigo (inferência, dia primeiro)
+    return pd.to_datetime(coluna, dayfirst=True, errors='coerce')
+
+def _ler_csv(conteudo):
+    texto = conteudo[:4096].decode('utf-8-sig', errors='ignore')
+    primeira_linha = texto.splitlines()[0] if texto else ''
+    sep = ';' if primeira_linha.count(';') > primeira_linha.count(',') else ','
+    # Exportações brasileiras (separador ;) usam vírgula decimal
+    decimal = ',' if sep == ';' else '.'
+
+    # Cabeçalho primeiro, para ler com tipos explícitos (preços float, data como texto)
+    cabecalho = pd.read_csv(io.BytesIO(conteudo), sep=sep, nrows=0, encoding='utf-8-sig')
+    tipos = {}
+    for original, canonico in zip(cabecalho.columns, normalizar_colunas(cabecalho).columns):
+        if canonico in COLUNAS_PRECO:
+            tipos[original] = 'float64'
+        elif canonico == 'Data':
+            tipos[original] = 'str'
+    return pd.read_csv(
+        io.BytesIO(conteudo), sep=sep, decimal=decimal, thousands='.' if decimal == ',' else None,
+        dtype=tipos, encoding='utf-8-sig'
+    )
+
+# ========================
+# FUNÇÃO PRINCIPAL: ler qualquer arquivo de candles
+# ========================
+# Retorna colunas canônicas (Data, Abertura, Máxima, Mínima, Fechamento, Volume),
+# com Data já convertida. Colunas extras (ex.: volume financeiro) são mantidas.
+# Excel/CSV podem ser convertidos uma vez para Parquet, indexado pelo hash do
+# conteúdo: reenviar o mesmo arquivo vira uma leitura de Parquet.
+def ler_candles(arquivo, converter_para_parquet=True, diretorio_cache=CACHE_UPLOADS_DIR):
+    conteudo = _ler_bytes(arquivo)
+    formato = detectar_formato(conteudo)
+
+    caminho_cache = None
+    if formato != 'parquet' and converter_para_parquet:
+        impressao = hashlib.sha1(conteudo).hexdigest()
+        caminho_cache = os.path.join(diretorio_cache, f"{impressao}.parquet")
+        if os.path.exists(caminho_cache):
+            try:
+                df = pd.read_parquet(caminho_cache)
+                # Data de modificação = último uso (ordem da limpeza)
+                os.utime(caminho_cache)
+                return df
+            except Exception:
+                pass
+
+    if formato == 'parquet':
+        df = pd.read_parquet(io.BytesIO(conteudo))
+    elif formato in ('xlsx', 'xls'):
+        df = pd.read_excel(io.BytesIO(conteudo))
+    else:
+        df = _ler_csv(conteudo)
+
+    df = normalizar_colunas(df)
+    if 'Data' not in df.columns:
+        raise ValueError("nenhuma coluna de data encontrada.")
+    df['Data'] = converter_datas(df['Data'])
+    for col in COLUNAS_PRECO:
+        if col in df.columns and not pd.api.types.is_float_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col].astype(str).str.replace(',', '.'), errors='coerce')
+
+    if caminho_cache is not None:
+        try:
+            os.makedirs(diretorio_cache, exist_ok=True)
+            _gravar_atomico(caminho_cache, lambda destino: df.to_parquet(destino, index=False))
+            limpar_uploads(diretorio_cache, manter=caminho_cache)
+        except Exception:
+            # Cache é só otimização: sem pyarrow ou sem disco, segue com o DataFrame lido
+            pass
+    return df
+
+# ========================
+# LIMPEZA DO CACHE DE CONVERSÕES
+# ========================
+# Remove conversões vencidas e, acima do tamanho máximo, as menos usadas;
+# "manter" (a conversão recém-gravada) nunca sai. Retorna quantas removeu.
+def limpar_uploads(diretorio=CACHE_UPLOADS_DIR, validade=VALIDADE_UPLOADS, maximo_bytes=MAX_BYTES_UPLOADS,
+                   manter=None, agora=None):
+    agora = time.time() if agora is None else agora
+    arquivos, remover = [], []
+    for nome in os.listdir(diretorio):
+        caminho = os.path.join(diretorio, nome)
+        if caminho == manter:
+            continue
+        try:
+            info = os.stat(caminho)
+        except OSError:
+            continue
+        if nome.endswith(".tmp"):
+            if agora - info.st_mtime > VALIDADE_TEMPORARIO:
+                remover.append(caminho)
+        elif agora - info.st_mtime > validade:
+            remover.append(caminho)
+        else:
+            arquivos.append((info.st_mtime, info.st_size, caminho))
+
+    total = sum(tamanho for _, tamanho, _ in arquivos)
+    if manter is not None and os.path.exists(manter):
+        total += os.path.getsize(manter)
+    for _, tamanho, caminho in sorted(arquivos):
+        if total <= maximo_bytes:
+            break
+        remover.append(caminho)
+        total -= tamanho
+
+    removidos = 0
+    for caminho in remover:
+        try:
+            os.remove(caminho)
+            removidos += 1
+        except OSError:
+            pass
+    return removidos
@@ -0,0 +1,188 @@
+# medicao.py - tempos por etapa/ativo, linhas e pico de memória de um rastreamento
+# Desligada (DESLIGADA), cada ponto de medição é só uma chamada que não faz nada.
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import weakref
+from contextlib import contextmanager, nullcontext
+
+try:
+    import resource
+except ImportError:  # Windows: sem pico de memória
+    resource = None
+
+logger = logging.getLogger("radar_b3.medicao")
+if not logger.handlers:
+    # Uma linha JSON por execução no stderr (o log do servidor do Streamlit)
+    _saida = logging.StreamHandler()
+    _saida.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_saida)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+# RADAR_MEDICAO=1 liga a medição (e a linha JSON no log) para todos os usuários
+MEDICAO_PADRAO = os.environ.get("RADAR_MEDICAO", "").strip() not in ("", "0")
+# E-mails que veem o painel "⏱️ Performance" (separados por vírgula)
+ADMINS = {e.strip().lower() for e in os.environ.get("RADAR_ADMINS", "").split(",") if e.strip()}
+
+# ========================
+# MEMÓRIA: pico do processo (e dos processos filhos já encerrados), em MB
+# ========================
+# Valor acumulado desde o início do processo (ru_maxrss nunca diminui): não
+# diz quanto uma execução usou, só o maior uso até agora.
+def pico_memoria_mb(filhos=False):
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_CHILDREN if filhos else resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB; macOS, em bytes
+    return round(pico / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+# ========================
+# MEMÓRIA DA EXECUÇÃO: pico das alocações (tracemalloc) desde o início da medição
+# ========================
+# O tracemalloc vale para o processo inteiro: fica ligado enquanto houver alguma
+# medição aberta. Com execuções simultâneas, o pico de uma inclui as outras; o
+# que os processos do pool alocam não entra (só o RSS acumulado dos filhos).
+_trava_memoria = threading.Lock()
+_memoria = {"abertas": 0, "ligado_aqui": False}
+
+# Retorna a memória já alocada na abertura (base do pico desta medição)
+def _abrir_memoria():
+    with _trava_memoria:
+        if _memoria["abertas"] == 0:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                _memoria["ligado_aqui"] = True
+            tracemalloc.reset_peak()
+        _memoria["abertas"] += 1
+        return tracemalloc.get_traced_memory()[0]
+
+def _fechar_memoria():
+    with _trava_memoria:
+        _memoria["abertas"] -= 1
+        if _memoria["abertas"] == 0 and _memoria["ligado_aqui"]:
+            tracemalloc.stop()
+            _memoria["ligado_aqui"] = False
+
+def _pico_desde(base):
+    _, pico = tracemalloc.get_traced_memory()
+    return round(max(pico - base, 0) / (1024 * 1024), 1)
+
+# ========================
+# USUÁRIO NO LOG: só um apelido estável (hash do e-mail), nunca o e-mail
+# ========================
+def apelido_usuario(email):
+    return hashlib.sha256(str(email).strip().lower().encode("utf-8")).hexdigest()[:12]
+
+# ========================
+# FUNÇÃO: executa e devolve (resultado, segundos) - serve em threads e processos
+# ========================
+def cronometrado(funcao, *args):
+    inicio = time.perf_counter()
+    resultado = funcao(*args)
+    return resultado, time.perf_counter() - inicio
+
+# ========================
+# MEDIÇÃO DE UMA EXECUÇÃO
+# ========================
+class Medicao:
+    ativa = True
+
+    def __init__(self, nome="rastreamento", **info):
+        self.nome = nome
+        self.info = dict(info)
+        self.registros = []
+        self.inicio = time.perf_counter()
+        self._trava = threading.Lock()
+        self._memoria_base = _abrir_memoria()
+        # Fecha na gravação do log ou quando a medição sai de cena (execução interrompida)
+        self._fechar = weakref.finalize(self, _fechar_memoria)
+
+    # MB alocados no pico, desde o início desta medição (congelado no registrar_log)
+    def pico_memoria_mb(self):
+        if not self._fechar.alive:
+            return self._pico_final
+        return _pico_desde(self._memoria_base)
+
+    # with medicao.etapa("carga", ticker="PETR4") as r: ... r["linhas"] = len(df)
+    @contextmanager
+    def etapa(self, nome, ticker=None, linhas=None):
+        registro = {"etapa": nome, "ticker": ticker, "linhas": linhas}
+        inicio = time.perf_counter()
+        try:
+            yield registro
+        finally:
+            self.registrar(nome, time.perf_counter() - inicio, ticker, registro["linhas"])
+
+    def registrar(self, nome, segundos, ticker=None, linhas=None):
+        with self._trava:
+            self.registros.append({
+                "etapa": nome, "ticker": ticker, "segundos": segundos,
+                "linhas": linhas, "pico_memoria_mb": self.pico_memoria_mb(),
+            })
+
+    def anotar(self, **info):
+        self.info.update(info)
+
+    def etapas(self):
+        # Soma por etapa (tempo de parede, sem ticker), na ordem em que apareceram
+        por_etapa = {}
+        for r in self.registros:
+            if r["ticker"] is not None:
+                continue
+            etapa = por_etapa.setdefault(r["etapa"], {"etapa": r["etapa"], "segundos": 0.0, "linhas": None, "chamadas": 0})
+            etapa["segundos"] += r["segundos"]
+            etapa["chamadas"] += 1
+            if r["linhas"] is not None:
+                etapa["linhas"] = (etapa["linhas"] or 0) + r["linhas"]
+        return list(por_etapa.values())
+
+    def por_ticker(self):
+        return [r for r in self.registros if r["ticker"] is not None]
+
+    def resumo(self):
+        return {
+            "medicao": self.nome,
+            "total_segundos": round(time.perf_counter() - self.inicio, 4),
+            "pico_memoria_mb": self.pico_memoria_mb(),
+            # RSS máximo acumulado (do servidor e dos processos filhos já encerrados), não só desta execução
+            "pico_rss_processo_acumulado_mb": pico_memoria_mb(),
+            "pico_rss_filhos_acumulado_mb": pico_memoria_mb(filhos=True),
+            **self.info,
+            "etapas": [{**e, "segundos": round(e["segundos"], 4)} for e in self.etapas()],
+            "por_ticker": [{**r, "segundos": round(r["segundos"], 4)} for r in self.por_ticker()],
+        }
+
+    def registrar_log(self):
+        if self._fechar.alive:
+            self._pico_final = _pico_desde(self._memoria_base)
+            self._fechar()
+        resumo = self.resumo()
+        logger.info(json.dumps(resumo, ensure_ascii=False, default=str))
+        return resumo
+
+class _MedicaoDesligada:
+    ativa = False
+
+    # Um registro novo por chamada: o que uma etapa escreve nele não vaza para as outras
+    def etapa(self, nome, ticker=None, linhas=None):
+        return nullcontext({"linhas": None})
+
+    def registrar(self, nome, segundos, ticker=None, linhas=None):
+        pass
+
+    def anotar(self, **info):
+        pass
+
+    def registrar_log(self):
+        return None
+
+DESLIGADA = _MedicaoDesligada()
+
+def nova_medicao(ativa, nome="rastreamento", **info):
+    return Medicao(nome, **info) if ativa else DESLIGADA
@@ -0,0 +1,582 @@
+# motor_intraday.py - estruturas pré-computadas do rastreamento intraday
+import numpy as np
+import pandas as pd
+
+from calendario_b3 import classe_pregao, sessoes
+
+# ========================
+# CONSTANTES DE PREGÃO (minutos desde 00:00)
+# ========================
+MINUTOS_POR_DIA = 24 * 60
+
+# Abertura/fechamento de cada dia do índice pelo calendário da B3 (-1 em fins de
+# semana e feriados), calculados uma vez por classe de ativo
+def pregao_por_dia(indice, tipo_ativo):
+    pregoes = indice.setdefault('pregoes', {})
+    classe = classe_pregao(tipo_ativo)
+    if classe not in pregoes:
+        pregoes[classe] = sessoes(indice['dias'], tipo_ativo)
+    return pregoes[classe]
+
+# Valor financeiro de 1 ponto por contrato (ações: R$ 1 por R$ 1 de variação)
+def calcular_valor_ponto(tipo_ativo):
+    if tipo_ativo == "acoes":
+        return 1.0
+    return 0.20 if tipo_ativo == "mini_indice" else 10.00
+
+# ========================
+# FUNÇÃO: índice de dias (offsets de início/fim de cada dia)
+# ========================
+def _inicios_de_dia(dias):
+    if len(dias) == 0:
+        return np.empty(0, dtype=np.int64)
+    quebras = np.flatnonzero(dias[1:] != dias[:-1]) + 1
+    return np.concatenate(([0], quebras)).astype(np.int64)
+
+def indexar_dias(df):
+    # df precisa estar ordenado pelo índice e sem timestamps duplicados
+    ts = df.index.values.astype('datetime64[m]')
+    dias = ts.astype('datetime64[D]')
+    inicio = _inicios_de_dia(dias)
+    fim = np.append(inicio[1:], len(ts)).astype(np.int64)
+
+    return {
+        'ts': ts,
+        'minutos': ((ts - dias) // np.timedelta64(1, 'm')).astype(np.int64),
+        'dias': dias[inicio],
+        'datas': dias[inicio].astype(object),
+        'inicio': inicio,
+        'fim': fim,
+        'open': df['open'].to_numpy(dtype=np.float64),
+        'high': df['high'].to_numpy(dtype=np.float64),
+        'low': df['low'].to_numpy(dtype=np.float64),
+        'close': df['close'].to_numpy(dtype=np.float64),
+    }
+
+# ========================
+# FUNÇÃO: tabela de referências diárias (uma passada vetorizada por ativo)
+# ========================
+# Fechamento (último candle), mínima, abertura (primeiro candle) e nº de candles
+# de cada dia. Calculada sobre o histórico completo do ativo, para poder ser
+# guardada junto dos candles e reaproveitada em qualquer período filtrado.
+def calcular_referencias_diarias(df):
+    ts = df.index.values.astype('datetime64[m]')
+    dias = ts.astype('datetime64[D]')
+    inicio = _inicios_de_dia(dias)
+    fim = np.append(inicio[1:], len(ts)).astype(np.int64)
+    if len(inicio) == 0:
+        vazio = np.empty(0, dtype=np.float64)
+        return {'dias': dias[inicio], 'abertura': vazio, 'fechamento': vazio,
+                'minima': vazio, 'candles': np.empty(0, dtype=np.int64)}
+
+    return {
+        'dias': dias[inicio],
+        'abertura': df['open'].to_numpy(dtype=np.float64)[inicio],
+        'fechamento': df['close'].to_numpy(dtype=np.float64)[fim - 1],
+        'minima': np.fmin.reduceat(df['low'].to_numpy(dtype=np.float64), inicio),
+        'candles': fim - inicio,
+    }
+
+# Posição de cada dia do índice dentro da tabela de referências
+def vincular_referencias(indice, referencias):
+    linhas = np.searchsorted(referencias['dias'], indice['dias'])
+    linhas = np.minimum(linhas, max(len(referencias['dias']) - 1, 0))
+    if len(linhas) and not np.array_equal(referencias['dias'][linhas], indice['dias']):
+        raise ValueError("tabela de referências não cobre todos os dias do período")
+    indice['referencias'] = referencias
+    indice['linha_referencia'] = linhas
+    return indice
+
+# ========================
+# FUNÇÃO: liquidez do arquivo (calculada uma vez, no carregamento)
+# ========================
+COLUNAS_VOLUME_ACOES = ['volume', 'vol', 'quantidade', 'negocios', 'negócios']
+COLUNAS_VOLUME_FINANCEIRO = ['volume financeiro', 'vol financeiro', 'valor negociado', 'valor', 'vlr negociado',
+                             'volume_r$', 'volume_financ', 'volume financeiro (r$)']
+
+def detectar_colunas_volume(colunas):
+    col_volume_acoes = None
+    col_volume_financeiro = None
+    for col in colunas:
+        col_lower = str(col).lower().strip()
+        if col_lower in COLUNAS_VOLUME_ACOES:
+            col_volume_acoes = col
+        elif col_lower in COLUNAS_VOLUME_FINANCEIRO:
+            col_volume_financeiro = col
+    return col_volume_acoes, col_volume_financeiro
+
+# Volume financeiro médio por dia (R$). Sem coluna financeira, usa volume em
+# quantidade x preço médio de fechamento. Dias sem volume entram como zero.
+def calcular_liquidez(df, indice):
+    col_volume_acoes, col_volume_financeiro = detectar_colunas_volume(df.columns)
+    if col_volume_financeiro is not None:
+        fonte, coluna = 'financeiro', col_volume_financeiro
+    elif col_volume_acoes is not None:
+        fonte, coluna = 'acoes', col_volume_acoes
+    else:
+        return {'fonte': None, 'coluna': None, 'valor_medio_diario': None, 'dias_negociados': 0}
+
+    volume = pd.to_numeric(df[coluna], errors='coerce').to_numpy(dtype=np.float64)
+    if len(volume) == 0 or np.isnan(volume).all():
+        return {'fonte': fonte, 'coluna': coluna, 'valor_medio_diario': None, 'dias_negociados': 0}
+
+    volume_diario = np.add.reduceat(np.nan_to_num(volume), indice['inicio'])
+    valor_medio_diario = volume_diario.mean()
+    if fonte == 'acoes':
+        with np.errstate(invalid='ignore'):
+            valor_medio_diario = valor_medio_diario * np.nanmean(indice['close'])
+    return {
+        'fonte': fonte,
+        'coluna': coluna,
+        'valor_medio_diario': float(valor_medio_diario),
+        'dias_negociados': int((volume_diario > 0).sum()),
+    }
+
+# Ranking de liquidez de vários ativos (maior volume financeiro primeiro)
+def ranking_liquidez(liquidez_por_ativo):
+    ranking = pd.DataFrame([
+        {
+            "Ação": ativo,
+            "Fonte": {'financeiro': 'Volume financeiro', 'acoes': 'Volume x preço médio'}.get(liq['fonte'], '-'),
+            "Coluna": liq['coluna'] or '-',
+            "Volume Médio Diário (R$)": liq['valor_medio_diario'],
+            "Dias Negociados": liq['dias_negociados'],
+        }
+        for ativo, liq in liquidez_por_ativo.items()
+    ])
+    if ranking.empty:
+        return ranking
+    return ranking.sort_values("Volume Médio Diário (R$)", ascending=False, na_position='last').reset_index(drop=True)
+
+# ========================
+# FUNÇÃO: tabela esparsa para mínimo/máximo de intervalo em O(1)
+# ========================
+# Nível k guarda o extremo da janela [i, i + 2^k). NaN é ignorado (fmin/fmax),
+# como no .min()/.max() do pandas. Como entrada e saída estão sempre no mesmo
+# dia, basta montar os níveis até o tamanho do maior dia do arquivo.
+def construir_tabela_esparsa(valores, funcao, maior_intervalo):
+    n = len(valores)
+    niveis = max(int(maior_intervalo), 1).bit_length()
+    tabela = np.full((niveis, n), np.nan)
+    tabela[0] = valores
+    for k in range(1, niveis):
+        meio = 1 << (k - 1)
+        tabela[k, :n - meio] = funcao(tabela[k - 1, :n - meio], tabela[k - 1, meio:])
+    return tabela
+
+def consultar_tabela_esparsa(tabela, funcao, ini, fim):
+    # Intervalos fechados [ini, fim], consultados todos de uma vez
+    nivel = np.frexp((fim - ini + 1).astype(np.float64))[1] - 1
+    return funcao(tabela[nivel, ini], tabela[nivel, fim - (1 << nivel) + 1])
+
+def preparar_drawdown(indice):
+    maior_dia = int((indice['fim'] - indice['inicio']).max()) if len(indice['inicio']) else 1
+    indice['minimas'] = construir_tabela_esparsa(indice['low'], np.fmin, maior_dia)
+    indice['maximas'] = construir_tabela_esparsa(indice['high'], np.fmax, maior_dia)
+    return indice
+
+# ========================
+# FUNÇÃO: max drawdown (%) de várias operações em uma única chamada
+# ========================
+# Compra: pior mínima entre entrada e saída; Venda: pior máxima.
+def calcular_drawdowns(indice, pos_entrada, pos_saida, compra):
+    pos_entrada = np.asarray(pos_entrada, dtype=np.int64)
+    pos_saida = np.asarray(pos_saida, dtype=np.int64)
+    compra = np.asarray(compra, dtype=bool)
+    if len(pos_entrada) == 0:
+        return np.empty(0, dtype=np.float64)
+    if 'minimas' not in indice:
+        preparar_drawdown(indice)
+
+    minimas = consultar_tabela_esparsa(indice['minimas'], np.fmin, pos_entrada, pos_saida)
+    maximas = consultar_tabela_esparsa(indice['maximas'], np.fmax, pos_entrada, pos_saida)
+    extremo = np.where(compra, minimas, maximas)
+    preco_entrada = indice['open'][pos_entrada]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        drawdown = ((extremo - preco_entrada) / preco_entrada) * 100
+    return np.round(drawdown, 2)
+
+# ========================
+# FUNÇÃO: candle de entrada mais próximo do horário (dentro do pregão) e
+# candle de saída exato (mesmo dia), para todos os dias de uma vez; -1 = não há
+# ========================
+# Candles alinhados em 5 minutos (o caso normal): grade densa dias x slots com a
+# posição de cada candle (-1 = sem candle), montada uma vez por ativo; entrada e
+# saída de todos os dias viram indexação direta na grade. Dados fora da grade de
+# 5 minutos usam a chave ordenada (nº do dia * 1440 + minuto) com searchsorted.
+MINUTOS_SLOT = 5
+SLOTS_POR_DIA = MINUTOS_POR_DIA // MINUTOS_SLOT
+
+def chaves_minuto(indice):
+    if 'chaves' not in indice:
+        tamanhos = indice['fim'] - indice['inicio']
+        dia_linha = np.repeat(np.arange(len(tamanhos), dtype=np.int64), tamanhos)
+        indice['chaves'] = dia_linha * MINUTOS_POR_DIA + indice['minutos']
+    return indice['chaves']
+
+def grade_posicoes(indice):
+    if 'grade' not in indice:
+        minutos = indice['minutos']
+        if np.any(minutos % MINUTOS_SLOT):
+            indice['grade'] = None
+        else:
+            tamanhos = indice['fim'] - indice['inicio']
+            dia_linha = np.repeat(np.arange(len(tamanhos), dtype=np.int64), tamanhos)
+            grade = np.full((len(tamanhos), SLOTS_POR_DIA), -1, dtype=np.int32)
+            grade[dia_linha, minutos // MINUTOS_SLOT] = np.arange(len(minutos), dtype=np.int32)
+            indice['grade'] = grade
+    return indice['grade']
+
+# Abertura/fechamento podem ser um valor só ou um por dia (calendário da B3)
+def _por_dia(indice, minutos):
+    return np.broadcast_to(np.asarray(minutos, dtype=np.int64), (len(indice['inicio']),))
+
+# Por dia e slot (do primeiro ao último minuto de pregão de todos os dias): último
+# candle do pregão até o slot e primeiro a partir dele; fora do pregão do dia
+# os candles são mascarados
+def vizinhos_no_pregao(indice, abertura, fechamento, aberto):
+    vizinhos = indice.setdefault('vizinhos_pregao', {})
+    chave = (abertura.tobytes(), fechamento.tobytes())
+    if chave not in vizinhos:
+        if not aberto.any():
+            vazio = np.empty((len(aberto), 0), dtype=np.int32)
+            vizinhos[chave] = (0, vazio, vazio)
+            return vizinhos[chave]
+        primeiro = int(abertura[aberto].min()) // MINUTOS_SLOT
+        ultimo = int(fechamento[aberto].max()) // MINUTOS_SLOT
+        slots = np.arange(primeiro, ultimo + 1) * MINUTOS_SLOT
+        dentro = aberto[:, None] & (slots >= abertura[:, None]) & (slots <= fechamento[:, None])
+        pregao = np.where(dentro, grade_posicoes(indice)[:, primeiro:ultimo + 1], -1)
+        sem_candle = np.iinfo(np.int32).max
+        anterior = np.maximum.accumulate(pregao, axis=1)
+        posterior = np.minimum.accumulate(np.where(pregao >= 0, pregao, sem_candle)[:, ::-1], axis=1)[:, ::-1]
+        vizinhos[chave] = (primeiro, anterior, np.where(posterior == sem_candle, -1, posterior))
+    return vizinhos[chave]
+
+def _na_grade(indice, *minutos):
+    return grade_posicoes(indice) is not None and all(np.all(np.asarray(m) % MINUTOS_SLOT == 0) for m in minutos)
+
+def localizar_entradas(indice, abertura_min, fechamento_min, minutos_desejado):
+    abertura, fechamento = _por_dia(indice, abertura_min), _por_dia(indice, fechamento_min)
+    aberto = (abertura >= 0) & (fechamento >= abertura)
+    if not _na_grade(indice, abertura[aberto], fechamento[aberto], minutos_desejado):
+        return _entradas_por_busca(indice, abertura, fechamento, aberto, minutos_desejado)
+    primeiro, anterior, posterior = vizinhos_no_pregao(indice, abertura, fechamento, aberto)
+    if anterior.shape[1] == 0:
+        return np.full(len(indice['inicio']), -1, dtype=np.int64)
+    # Horário antes/depois do pregão do dia: vale o candle mais próximo da borda
+    alvo = np.clip(minutos_desejado, abertura, fechamento)
+    slot = np.clip(alvo // MINUTOS_SLOT - primeiro, 0, anterior.shape[1] - 1)
+    dias = np.arange(len(slot))
+    antes = anterior[dias, slot].astype(np.int64)
+    depois = posterior[dias, slot].astype(np.int64)
+    minutos = indice['minutos']
+    # Em caso de empate, vale o candle mais cedo (mesmo critério do np.argmin)
+    usar_antes = (antes >= 0) & (
+        (depois < 0) | (minutos_desejado - minutos[antes] <= minutos[np.maximum(depois, 0)] - minutos_desejado)
+    )
+    return np.where(aberto, np.where(usar_antes, antes, depois), -1)
+
+def localizar_saidas(indice, pos_entrada, deslocamento_min):
+    if not _na_grade(indice, deslocamento_min):
+        return _saidas_por_busca(indice, pos_entrada, deslocamento_min)
+    valido = pos_entrada >= 0
+    pos = np.where(valido, pos_entrada, 0)
+    minutos_saida = indice['minutos'][pos] + deslocamento_min
+    dia = chaves_minuto(indice)[pos] // MINUTOS_POR_DIA
+    slot = np.minimum(minutos_saida // MINUTOS_SLOT, SLOTS_POR_DIA - 1)
+    saida = grade_posicoes(indice)[dia, slot].astype(np.int64)
+    # "Sem candle de saída" = slot vazio na grade ou saída depois da meia-noite
+    return np.where(valido & (minutos_saida < MINUTOS_POR_DIA) & (saida >= 0), saida, -1)
+
+def _entradas_por_busca(indice, abertura, fechamento, aberto, minutos_desejado):
+    chaves = chaves_minuto(indice)
+    base = np.arange(len(indice['inicio']), dtype=np.int64) * MINUTOS_POR_DIA
+    a = np.searchsorted(chaves, base + abertura, side='left')
+    b = np.searchsorted(chaves, base + fechamento, side='right')
+    valido = aberto & (a < b)
+    alvo = base + minutos_desejado
+    # Busca restrita ao pregão [a, b) do próprio dia
+    k = np.clip(np.searchsorted(chaves, alvo, side='left'), a, np.maximum(b - 1, a))
+    k = np.where(valido, k, 0)
+    anterior = np.maximum(k - 1, 0)
+    usar_anterior = valido & (k > a) & (alvo - chaves[anterior] <= chaves[k] - alvo)
+    k = np.where(usar_anterior, anterior, k)
+    return np.where(valido, k, -1)
+
+def _saidas_por_busca(indice, pos_entrada, deslocamento_min):
+    chaves = chaves_minuto(indice)
+    valido = pos_entrada >= 0
+    pos = np.where(valido, pos_entrada, 0)
+    minutos_saida = indice['minutos'][pos] + deslocamento_min
+    alvo = chaves[pos] + deslocamento_min
+    k = np.searchsorted(chaves, alvo, side='left')
+    k_seguro = np.minimum(k, len(chaves) - 1)
+    encontrado = valido & (minutos_saida < MINUTOS_POR_DIA) & (k < len(chaves)) & (chaves[k_seguro] == alvo)
+    return np.where(encontrado, k_seguro, -1)
+
+# ========================
+# FUNÇÃO: carregar e preparar os candles de um ativo
+# ========================
+# Normaliza colunas/datas, remove duplicatas, filtra o período e monta o índice
+# de dias (com referências diárias e liquidez). Sem Streamlit: pode rodar em
+# threads, processos ou fora da interface.
+def preparar_candles(df, data_inicio, data_fim, referencias=None, com_liquidez=True):
+    # Normalizar nomes das colunas
+    df.columns = [str(col).strip().capitalize() for col in df.columns]
+    df.rename(columns={
+        'Data': 'data',
+        'Abertura': 'open',
+        'Máxima': 'high',
+        'Mínima': 'low',
+        'Fechamento': 'close',
+        'Volume': 'volume'
+    }, inplace=True)
+
+    # Converter coluna de data
+    df['data'] = pd.to_datetime(df['data'], dayfirst=True, errors='coerce')
+    df = df.dropna(subset=['data'])
+    df['data_limpa'] = df['data'].dt.floor('min')
+    df = df.set_index('data_limpa').sort_index()
+    df = df[~df.index.duplicated(keep='first')]
+    if df.index.tz:
+        df = df.tz_localize(None)
+
+    # Tabela de referências diárias: reaproveitada se já acompanha os candles
+    if referencias is None:
+        referencias = calcular_referencias_diarias(df)
+
+    # Período por busca binária no índice já ordenado (bordas fora dos dados: tudo)
+    if len(df):
+        inicio = 0 if data_inicio <= df.index[0].date() else df.index.searchsorted(pd.Timestamp(data_inicio))
+        fim = len(df) if data_fim >= df.index[-1].date() else df.index.searchsorted(
+            pd.Timestamp(data_fim) + pd.Timedelta(days=1))
+        df = df.iloc[inicio:fim]
+    # Offsets de início/fim de cada dia, calculados uma única vez por arquivo
+    indice = vincular_referencias(indexar_dias(df), referencias)
+    if com_liquidez:
+        indice['liquidez'] = calcular_liquidez(df, indice)
+    return df, indice
+
+# Tabela de referências em cache que não cobre todos os dias do período (ex.:
+# histórico longo além da janela do cache): recalculada a partir dos candles
+def preparar_candles_com_referencias(df, data_inicio, data_fim, referencias=None):
+    if referencias is not None:
+        try:
+            return preparar_candles(df.copy(deep=False), data_inicio, data_fim, referencias)
+        except ValueError:
+            pass
+    return preparar_candles(df, data_inicio, data_fim)
+
+# ========================
+# OPERAÇÕES EM COLUNAS (tipadas)
+# ========================
+# Direção guardada como código; textos só na exibição/exportação
+DIRECOES = ["Compra (Favor)", "Venda (Favor)", "Compra (Contra)", "Venda (Contra)"]
+# Ações: o fechamento varia com o horário de verão dos EUA (calendario_b3)
+MOTIVOS_IGNORADO = ["", "Sem pregão válido", "Sem candle de saída", "Candle de saída após 18:20",
+                    "Candle de saída após o fechamento do pregão", "Referência inválida"]
+ROTULOS_REFERENCIA = {
+    "Fechamento do dia anterior": "Fechamento",
+    "Mínima do dia anterior": "Mínima",
+    "Abertura do dia atual": "Abertura",
+}
+COLUNAS_OPERACAO = ['direcao', 'minuto_entrada', 'entrada', 'saida', 'preco_entrada', 'preco_saida',
+                    'lucro', 'distorcao', 'valor_referencia', 'data_referencia', 'drawdown']
+
+# Valor e dia da referência para os dias 1..n-1 (o primeiro dia só serve de referência)
+def valores_referencia(indice, referencia):
+    tabela = indice['referencias']
+    linhas = indice['linha_referencia']
+    dias = np.arange(1, len(indice['inicio']), dtype=np.int64)
+    if referencia == "Fechamento do dia anterior":
+        return tabela['fechamento'][linhas[dias - 1]], dias - 1
+    if referencia == "Mínima do dia anterior":
+        return tabela['minima'][linhas[dias - 1]], dias - 1
+    if referencia == "Abertura do dia atual":
+        return tabela['abertura'][linhas[dias]], dias
+    return None, dias
+
+def _colunas_vazias():
+    return {
+        'direcao': np.empty(0, dtype=np.int8),
+        'minuto_entrada': np.empty(0, dtype=np.int64),
+        'entrada': np.empty(0, dtype='datetime64[m]'),
+        'saida': np.empty(0, dtype='datetime64[m]'),
+        'preco_entrada': np.empty(0), 'preco_saida': np.empty(0), 'lucro': np.empty(0),
+        'distorcao': np.empty(0), 'valor_referencia': np.empty(0),
+        'data_referencia': np.empty(0, dtype='datetime64[D]'), 'drawdown': np.empty(0),
+    }
+
+# ========================
+# FUNÇÃO: direções sinalizadas pela distorção (código de DIRECOES, máscara)
+# ========================
+# Compra tem prioridade sobre venda dentro de cada modo (elif do laço original).
+# Usada pelo backtest e pelo scanner ao vivo.
+def sinais_por_direcao(distorcao, parametros):
+    modo_estrategia = parametros["modo_estrategia"]
+    sinais = []
+    if modo_estrategia in ["A Favor da Tendência", "Ambos"]:
+        compra = distorcao > parametros["dist_favor_compra"]
+        sinais += [(0, compra), (1, ~compra & (distorcao < -parametros["dist_favor_venda"]))]
+    if modo_estrategia in ["Contra Tendência", "Ambos"]:
+        compra = distorcao < -parametros["dist_compra_contra"]
+        sinais += [(2, compra), (3, ~compra & (distorcao > parametros["dist_venda_contra"]))]
+    return sinais
+
+# ========================
+# FUNÇÃO: avaliar todos os horários de um ativo
+# ========================
+# Todos os dias de cada horário de uma vez. Retorna as operações (colunas numpy)
+# e os dias ignorados separados por horário (para manter a ordem horário ->
+# ativo -> dia ao juntar vários ativos), os dias com dados, os dias com entrada
+# e os erros encontrados.
+def avaliar_ticker(indice, ticker_nome, parametros):
+    tipo_ativo = parametros["tipo_ativo"]
+    qtd = parametros["qtd"]
+    deslocamento_saida = 5 * int(parametros["candles_pos_entrada"])
+    horarios_selecionados = parametros["horarios_selecionados"]
+
+    operacoes_por_horario = {h: _colunas_vazias() for h in horarios_selecionados}
+    ignorados_por_horario = {h: [] for h in horarios_selecionados}
+    dias_com_entrada = set()
+    erros = []
+
+    datas = indice['datas']
+    minutos = indice['minutos']
+    abertura_min, fechamento_min = pregao_por_dia(indice, tipo_ativo)
+    valor_ponto = calcular_valor_ponto(tipo_ativo)
+    referencia_valor, dia_referencia = valores_referencia(indice, parametros["referencia"])
+    dias = np.arange(1, len(datas), dtype=np.int64)
+    minutos_selecionados = np.array(
+        [int(h.split(":")[0]) * 60 + int(h.split(":")[1]) for h in horarios_selecionados], dtype=np.int64
+    )
+    if tipo_ativo in ['mini_indice', 'mini_dolar']:
+        motivo_apos = 3
+    elif tipo_ativo == 'acoes':
+        motivo_apos = 4
+    else:
+        motivo_apos = 0
+
+    if len(dias) == 0:
+        return {'operacoes': operacoes_por_horario, 'dias_ignorados': ignorados_por_horario,
+                'dias': list(datas), 'dias_com_entrada': dias_com_entrada, 'erros': erros}
+
+    for horario_str in horarios_selecionados:
+        try:
+            hora, minuto = map(int, horario_str.split(":"))
+            pos_entrada = localizar_entradas(indice, abertura_min, fechamento_min, hora * 60 + minuto)[1:]
+            pos_saida = localizar_saidas(indice, pos_entrada, deslocamento_saida)
+            pos_valida = np.maximum(pos_entrada, 0)
+            minutos_saida = minutos[pos_valida] + deslocamento_saida
+
+            # Motivo de cada dia ignorado (0 = segue), na mesma ordem de checagem do laço original
+            motivo = np.zeros(len(dias), dtype=np.int8)
+            motivo[pos_entrada < 0] = 1
+            motivo[(motivo == 0) & (pos_saida < 0)] = 2
+            if motivo_apos:
+                motivo[(motivo == 0) & (minutos_saida > fechamento_min[dias])] = motivo_apos
+            if referencia_valor is None:
+                motivo[motivo == 0] = 5
+            else:
+                motivo[(motivo == 0) & (referencia_valor <= 0)] = 5
+            ignorados_por_horario[horario_str] = [
+                (datas[d], MOTIVOS_IGNORADO[m]) for d, m in zip(dias[motivo > 0], motivo[motivo > 0])
+            ]
+
+            segue = (motivo == 0) & np.isin(minutos[pos_valida], minutos_selecionados)
+            if not segue.any():
+                continue
+            preco_entrada = indice['open'][pos_valida]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                distorcao = np.where(segue, ((preco_entrada - referencia_valor) / referencia_valor) * 100, np.nan)
+
+            sinais = sinais_por_direcao(distorcao, parametros)
+            linha = np.concatenate([np.flatnonzero(m) for _, m in sinais]) if sinais else np.empty(0, dtype=np.int64)
+            direcao = np.concatenate([np.full(m.sum(), c, dtype=np.int8) for c, m in sinais]) if sinais else np.empty(0, dtype=np.int8)
+            # Ordem por dia; no mesmo dia, a favor antes de contra
+            ordem = np.lexsort((direcao, linha))
+            linha, direcao = linha[ordem], direcao[ordem]
+
+            pe, ps = pos_entrada[linha], pos_saida[linha]
+            preco_e, preco_s = indice['open'][pe], indice['open'][ps]
+            lado = np.where(direcao % 2 == 0, 1.0, -1.0)
+            entrada = indice['ts'][pe]
+            operacoes_por_horario[horario_str] = {
+                'direcao': direcao,
+                'minuto_entrada': minutos[pe],
+                'entrada': entrada,
+                'saida': entrada + np.timedelta64(deslocamento_saida, 'm'),
+                'preco_entrada': np.round(preco_e, 2),
+                'preco_saida': np.round(preco_s, 2),
+                'lucro': np.round(np.where(lado > 0, preco_s - preco_e, preco_e - preco_s) * valor_ponto * qtd, 2),
+                'distorcao': distorcao[linha],
+                'valor_referencia': referencia_valor[linha],
+                'data_referencia': indice['dias'][dia_referencia[linha]],
+                'drawdown': np.zeros(len(linha)),
+                '_pos': (pe, ps, lado > 0),
+            }
+            dias_com_entrada.update(datas[d] for d in np.unique(dias[linha]))
+        except Exception as e:
+            erros.append(str(e))
+
+    # Drawdowns de todos os horários em uma única chamada
+    consultas = [ops.pop('_pos') for ops in operacoes_por_horario.values() if '_pos' in ops]
+    if consultas:
+        drawdowns = calcular_drawdowns(
+            indice,
+            np.concatenate([c[0] for c in consultas]),
+            np.concatenate([c[1] for c in consultas]),
+            np.concatenate([c[2] for c in consultas])
+        )
+        # Reparte na mesma ordem em que as consultas foram montadas
+        inicio = 0
+        for ops in [o for o in operacoes_por_horario.values() if len(o['direcao'])]:
+            n = len(ops['direcao'])
+            ops['drawdown'] = drawdowns[inicio:inicio + n]
+            inicio += n
+
+    return {
+        'operacoes': operacoes_por_horario,
+        'dias_ignorados': ignorados_por_horario,
+        'dias': list(datas),
+        'dias_com_entrada': dias_com_entrada,
+        'erros': erros,
+    }
+
+# ========================
+# FUNÇÃO: juntar as operações de vários ativos em um DataFrame tipado
+# ========================
+# partes: lista de (ticker, colunas) já na ordem final. Datas como datetime64,
+# preços/lucro/drawdown float64 e Ação/Direção/Horário/Referência categóricas.
+def montar_operacoes(partes, qtd, referencia):
+    tickers = sorted(set(ticker for ticker, _ in partes))
+    codigo_ticker = {ticker: i for i, ticker in enumerate(tickers)}
+    juntar = {
+        col: np.concatenate([colunas[col] for _, colunas in partes]) if partes else _colunas_vazias()[col]
+        for col in COLUNAS_OPERACAO
+    }
+    n = len(juntar['direcao'])
+    acao = np.concatenate([np.full(len(c['direcao']), codigo_ticker[t], dtype=np.int32) for t, c in partes]) \
+        if partes else np.empty(0, dtype=np.int32)
+    minutos_unicos, codigo_horario = np.unique(juntar['minuto_entrada'], return_inverse=True)
+    rotulo = ROTULOS_REFERENCIA.get(referencia, str(referencia))
+
+    return pd.DataFrame({
+        "Ação": pd.Categorical.from_codes(acao, tickers),
+        "Direção": pd.Categorical.from_codes(juntar['direcao'].astype(np.int8), DIRECOES),
+        "Horário": pd.Categorical.from_codes(
+            codigo_horario.astype(np.int64), [f"{m // 60:02d}:{m % 60:02d}" for m in minutos_unicos]
+        ),
+        "Data Entrada": juntar['entrada'].astype('datetime64[ns]'),
+        "Data Saída": juntar['saida'].astype('datetime64[ns]'),
+        "Preço Entrada": juntar['preco_entrada'].astype(np.float64),
+        "Preço Saída": juntar['preco_saida'].astype(np.float64),
+        "Lucro (R$)": juntar['lucro'].astype(np.float64),
+        "Distorção (%)": juntar['distorcao'].astype(np.float64),
+        "Quantidade": np.full(n, qtd, dtype=np.int64),
+        "Referência": pd.Categorical.from_codes(np.zeros(n, dtype=np.int8), [rotulo]),
+        "Data Referência": juntar['data_referencia'].astype('datetime64[ns]'),
+        "Valor Referência": juntar['valor_referencia'].astype(np.float64),
+        "Max Drawdown %": juntar['drawdown'].astype(np.float64),
+    })
@@ -0,0 +1,418 @@
+# rastreamento.py - núcleo do rastreamento intraday, sem Streamlit
+# Usado pela tela (app.py) e pela execução em lote (rastrear_lote.py).
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import cache_resultados
+from armazem_candles import (
+    caminho_candles, caminho_historico, carregar_candles, carregar_referencias, carregar_universo, impressao_historico,
+    ler_historico, periodo_historico
+)
+from execucao_paralela import avaliar_em_processo, carregar_em_processo, criar_pool, liberar_indice
+from ingestao import impressao_arquivo, ler_candles
+from medicao import DESLIGADA, cronometrado
+from motor_intraday import avaliar_ticker, montar_operacoes, preparar_candles_com_referencias
+from universo import PREFIXOS_ACOES
+
+# Valores iniciais do formulário de configurações
+CONFIG_PADRAO = {
+    "tipo_ativo": "acoes",
+    "qtd": 1,
+    "candles_pos_entrada": 3,
+    "dist_compra_contra": 0.1,
+    "dist_venda_contra": 0.1,
+    "dist_favor_compra": 0.1,
+    "dist_favor_venda": 0.1,
+    "referencia": "Fechamento do dia anterior",
+    "horarios_selecionados": ["09:00", "09:05", "10:55", "11:00", "11:05"],
+    "modo_estrategia": "Contra Tendência",
+    "usar_filtro_liquidez": False,
+    "limite_liquidez": 50000,
+    "processos": 0
+}
+
+# ========================
+# FUNÇÃO: extrair nome do arquivo
+# ========================
+def extrair_nome_completo(file_name):
+    return file_name.split(".")[0]
+
+# ========================
+# FUNÇÃO: identificar tipo do ativo
+# ========================
+def identificar_tipo(ticker):
+    ticker = ticker.upper().strip()
+    if '.' in ticker:
+        ticker = ticker.split('.')[0]
+    prefixos = ['5-MIN_', '5_MIN_', 'MINI_', 'MIN_', 'INTRADAY_', 'INTRADAY']
+    for p in prefixos:
+        if ticker.startswith(p):
+            ticker = ticker[len(p):]
+    if 'WIN' in ticker or 'INDICE' in ticker:
+        return 'mini_indice'
+    if 'WDO' in ticker or 'DOLAR' in ticker or 'DOL' in ticker:
+        return 'mini_dolar'
+    for acao in PREFIXOS_ACOES:
+        if acao in ticker:
+            return 'acoes'
+    return 'acoes'
+
+# ========================
+# FUNÇÃO: ajustar ticker (PETR4 → PETR4.SA | WINM24 → WINM24)
+# ========================
+def ajustar_ticker(ticker_input):
+    ticker = ticker_input.strip().upper()
+    if ticker.endswith(".SA"):
+        return ticker
+    if ticker.startswith("WIN") or ticker.startswith("WDO"):
+        return ticker  # Futuros não usam .SA
+    if len(ticker) >= 4 and ticker[-1].isdigit():
+        return ticker + ".SA"
+    return ticker
+
+# ========================
+# FakeFile: "arquivo" em memória com os candles baixados (compatível com upload)
+# ========================
+class FakeFile:
+    def __init__(self, name, df, historico=None):
+        self.name = name
+        self.df = df
+        self.historico = historico
+        self.manifesto = montar_manifesto(name, df, historico)
+
+# ========================
+# FUNÇÃO: manifesto dos candles (calculado uma vez, na ingestão)
+# ========================
+# Período, nº de linhas e de dias, tipo do ativo, impressão digital e colunas.
+# A tela e os filtros leem o manifesto em vez de reconverter a coluna Data.
+# Com histórico longo, o período e a impressão são os do histórico.
+def montar_manifesto(nome, df, historico=None):
+    datas = pd.to_datetime(df['Data'], dayfirst=True, errors='coerce')
+    if datas.dt.tz is not None:
+        datas = datas.dt.tz_localize(None)
+    dias = np.unique(datas.dropna().to_numpy().astype('datetime64[D]'))
+    manifesto = {
+        'inicio': dias[0].item() if len(dias) else None,
+        'fim': dias[-1].item() if len(dias) else None,
+        'linhas': len(df),
+        'dias': len(dias),
+        'tipo_ativo': identificar_tipo(extrair_nome_completo(nome)),
+        'impressao': cache_resultados.impressao_candles(df),
+        'colunas': {str(col): str(tipo) for col, tipo in df.dtypes.items()},
+    }
+    periodo = periodo_historico(historico) if historico and os.path.isdir(historico) else None
+    if periodo:
+        manifesto['inicio'], manifesto['fim'] = periodo
+    return manifesto
+
+# Tipo do ativo pelo manifesto (uploads sem FakeFile: pelo nome do arquivo)
+def tipo_do_arquivo(file):
+    manifesto = getattr(file, "manifesto", None)
+    return manifesto['tipo_ativo'] if manifesto else identificar_tipo(extrair_nome_completo(file.name))
+
+# ========================
+# FUNÇÃO: candles de uma lista de tickers (cache local + Yahoo) como FakeFiles
+# ========================
+# Retorna (arquivos, tickers sem dados, erros de download por ticker).
+def arquivos_de_tickers(tickers_entrada, intervalo="5m"):
+    tickers_yahoo = {nome: ajustar_ticker(nome) for nome in tickers_entrada}
+    if len(tickers_yahoo) == 1:
+        # Cache local: só a cauda que falta é buscada no Yahoo
+        ticker = next(iter(tickers_yahoo.values()))
+        candles_por_ticker = {ticker: carregar_candles(ticker, intervalo=intervalo)}
+        erros_download = {}
+    else:
+        # Universo: vários tickers por requisição, lotes em paralelo
+        candles_por_ticker, erros_download = carregar_universo(list(tickers_yahoo.values()), intervalo=intervalo)
+
+    arquivos = []
+    sem_dados = []
+    for nome_exibicao, ticker in tickers_yahoo.items():
+        data_reset = candles_por_ticker.get(ticker)
+        if data_reset is None or data_reset.empty:
+            sem_dados.append(ticker)
+            continue
+        fake_file = FakeFile(f"{nome_exibicao}.xlsx", data_reset, caminho_historico(ticker, intervalo=intervalo))
+        fake_file.ticker = ticker
+        fake_file.caminho = caminho_candles(ticker, intervalo=intervalo)
+        fake_file.referencias_diarias = carregar_referencias(ticker, intervalo=intervalo)
+        fake_file.referencias_em_cache = fake_file.referencias_diarias is not None
+        arquivos.append(fake_file)
+    return arquivos, sem_dados, erros_download
+
+# ========================
+# FUNÇÃO: carregar arquivo de candles (upload ou FakeFile do Yahoo)
+# ========================
+# Levanta exceção em caso de erro; quem chama decide como mostrar.
+def carregar_arquivo(file, data_inicio, data_fim):
+    # Histórico longo: só as partições do período
+    if usa_historico(file):
+        df = ler_historico(file.historico, data_inicio, data_fim)
+    # ✅ Se for FakeFile (vindo do Yahoo Finance)
+    elif hasattr(file, "df"):
+        df = file.df.copy()
+    else:
+        # Excel, CSV ou Parquet, reconhecido pelo conteúdo
+        df = ler_candles(file)
+
+    # Tabela de referências diárias: reaproveitada se já acompanha os candles (e cobre o período)
+    df, indice = preparar_candles_com_referencias(df, data_inicio, data_fim, getattr(file, "referencias_diarias", None))
+    try:
+        file.referencias_diarias = indice['referencias']
+    except AttributeError:
+        pass
+    return df, indice
+
+# Ticker do Yahoo com histórico local (acumulado além da janela de 60 dias do Yahoo)
+def usa_historico(file):
+    pasta = getattr(file, "historico", None)
+    return bool(pasta) and os.path.isdir(pasta)
+
+# Origem dos candles para um processo: o histórico longo ou o Parquet do cache
+# quando existem, senão o próprio DataFrame
+def origem_candles(file):
+    if usa_historico(file):
+        return ('historico', file.historico)
+    caminho = getattr(file, "caminho", None)
+    if caminho and os.path.exists(caminho):
+        return ('caminho', caminho)
+    return ('df', file.df if hasattr(file, "df") else ler_candles(file))
+
+# ========================
+# FUNÇÃO: aplicar o limite de liquidez (mensagem para o usuário, aprovado?)
+# ========================
+def avaliar_liquidez(ticker_nome, liquidez, limite_liquidez):
+    if liquidez['fonte'] is None:
+        return f"ℹ️ {ticker_nome}: coluna de volume não encontrada", True
+    valor_medio_diario = liquidez['valor_medio_diario']
+    if valor_medio_diario is None:
+        if liquidez['fonte'] == 'financeiro':
+            return f"ℹ️ {ticker_nome}: dados de 'Volume Financeiro' estão vazios", True
+        return f"ℹ️ {ticker_nome}: dados de volume estão vazios", True
+    if valor_medio_diario < limite_liquidez:
+        return f"⚠️ {ticker_nome}: baixa liquidez (R$ {valor_medio_diario:,.0f}/dia) → ignorado", False
+    return f"✅ {ticker_nome}: liquidez OK (R$ {valor_medio_diario:,.0f}/dia)", True
+
+# ========================
+# FUNÇÃO PRINCIPAL: rastreamento intraday de vários arquivos
+# ========================
+# cfg tem as mesmas chaves de CONFIG_PADRAO. Nada é exibido: operações, dias
+# ignorados e diagnósticos (erros, arquivos ignorados, liquidez) voltam como dados.
+# "indices" (opcional) guarda os arquivos já preparados entre chamadas com o
+# mesmo período, para rodar várias configurações seguidas sem recarregar.
+# "medicao" (opcional, ver medicao.py) recebe os tempos por etapa e por ativo.
+def rastrear(arquivos, cfg, data_inicio, data_fim, indices=None, medicao=DESLIGADA):
+    tipo_ativo = cfg["tipo_ativo"]
+    horarios_selecionados = cfg["horarios_selecionados"]
+    processos = cfg.get("processos", 0)
+
+    dias_com_entrada = set()
+    dias_ignorados = []
+    todos_dias_com_dados = set()
+    arquivos_ignorados = []
+    mensagens_liquidez = []
+    erros_carga = []
+    erros = []
+
+    parametros = {chave: cfg[chave] for chave in [
+        "tipo_ativo", "qtd", "candles_pos_entrada", "dist_compra_contra", "dist_venda_contra",
+        "dist_favor_compra", "dist_favor_venda", "referencia", "horarios_selecionados", "modo_estrategia"
+    ]}
+
+    # ========================
+    # OTIMIZAÇÃO: ler cada arquivo APENAS UMA VEZ
+    # ========================
+    # Modo processos: carga e backtest de cada ativo em um processo; os candles
+    # ficam em memória compartilhada e só os descritores trafegam entre processos.
+    usar_processos = processos > 0 and len(arquivos) > 1
+    indices_dias = {}
+    descritores = {}
+    liquidez_por_arquivo = {}
+    candles_por_arquivo = {}
+    resultados = {}
+    pool = criar_pool(processos) if usar_processos else None
+
+    try:
+        inicio = time.perf_counter()
+        if usar_processos:
+            futuros = {
+                file: pool.submit(cronometrado, carregar_em_processo, origem_candles(file), data_inicio, data_fim,
+                                  getattr(file, "referencias_diarias", None))
+                for file in arquivos
+            }
+            for file, futuro in futuros.items():
+                try:
+                    descritores[file], segundos = futuro.result()
+                except Exception as e:
+                    erros_carga.append((getattr(file, 'name', 'arquivo desconhecido'), str(e)))
+                    continue
+                try:
+                    file.referencias_diarias = descritores[file]['referencias']
+                except AttributeError:
+                    pass
+                liquidez_por_arquivo[file] = descritores[file]['liquidez']
+                candles_por_arquivo[file] = descritores[file]['vetores']['ts'][2][0]
+                medicao.registrar("carga", segundos, extrair_nome_completo(file.name), candles_por_arquivo[file])
+        else:
+            pendentes = [file for file in arquivos if indices is None or file not in indices]
+            with ThreadPoolExecutor() as executor:
+                futuros = {
+                    file: executor.submit(cronometrado, carregar_arquivo, file, data_inicio, data_fim) for file in pendentes
+                }
+                carregados = {}
+                for file, futuro in futuros.items():
+                    try:
+                        carregados[file], segundos = futuro.result()
+                    except Exception as e:
+                        erros_carga.append((getattr(file, 'name', 'arquivo desconhecido'), str(e)))
+                        continue
+                    medicao.registrar("carga", segundos, extrair_nome_completo(file.name), len(carregados[file][0]))
+            if indices is not None:
+                indices.update(carregados)
+                carregados = {file: indices[file] for file in arquivos if file in indices}
+            for file, (df, indice) in carregados.items():
+                indices_dias[file] = indice
+                liquidez_por_arquivo[file] = indice['liquidez']
+                candles_por_arquivo[file] = len(df)
+        medicao.registrar("carga", time.perf_counter() - inicio, linhas=sum(candles_por_arquivo.values()))
+
+        # Filtros por arquivo (tipo e liquidez): avaliados uma única vez, antes do backtest
+        inicio = time.perf_counter()
+        arquivos_validos = []
+        for file in liquidez_por_arquivo:
+            ticker_nome = extrair_nome_completo(file.name)
+            tipo_arquivo = tipo_do_arquivo(file)
+            if tipo_ativo != "todos" and tipo_arquivo != tipo_ativo:
+                if file.name not in arquivos_ignorados:
+                    arquivos_ignorados.append(file.name)
+                continue
+            if candles_por_arquivo[file] == 0:
+                continue
+            if cfg["usar_filtro_liquidez"]:
+                mensagem, aprovado = avaliar_liquidez(ticker_nome, liquidez_por_arquivo[file], cfg["limite_liquidez"])
+                mensagens_liquidez.append(mensagem)
+                if not aprovado:
+                    continue
+            arquivos_validos.append(file)
+        medicao.registrar("filtros", time.perf_counter() - inicio, linhas=len(arquivos_validos))
+
+        # Backtest por ativo (todos os horários de uma vez)
+        inicio = time.perf_counter()
+        if usar_processos:
+            futuros = {
+                file: pool.submit(cronometrado, avaliar_em_processo, descritores[file], extrair_nome_completo(file.name), parametros)
+                for file in arquivos_validos
+            }
+            for file, futuro in futuros.items():
+                resultados[file], segundos = futuro.result()
+                medicao.registrar("backtest", segundos, extrair_nome_completo(file.name), _total_operacoes(resultados[file]))
+        else:
+            for file in arquivos_validos:
+                resultados[file], segundos = cronometrado(
+                    avaliar_ticker, indices_dias[file], extrair_nome_completo(file.name), parametros
+                )
+                medicao.registrar("backtest", segundos, extrair_nome_completo(file.name), _total_operacoes(resultados[file]))
+        medicao.registrar("backtest", time.perf_counter() - inicio,
+                          linhas=sum(_total_operacoes(resultados[file]) for file in arquivos_validos))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+            for descritor in descritores.values():
+                liberar_indice(descritor)
+
+    # Junta os resultados na ordem horário -> arquivo -> dia
+    inicio = time.perf_counter()
+    partes = []
+    for horario_str in horarios_selecionados:
+        for file in arquivos_validos:
+            partes.append((extrair_nome_completo(file.name), resultados[file]['operacoes'][horario_str]))
+            dias_ignorados.extend(resultados[file]['dias_ignorados'][horario_str])
+    for file in arquivos_validos:
+        todos_dias_com_dados.update(resultados[file]['dias'])
+        dias_com_entrada.update(resultados[file]['dias_com_entrada'])
+        for erro in resultados[file]['erros']:
+            erros.append((file.name, erro))
+
+    operacoes = montar_operacoes(partes, cfg["qtd"], cfg["referencia"])
+    medicao.registrar("montagem", time.perf_counter() - inicio, linhas=len(operacoes))
+    medicao.anotar(arquivos=len(arquivos), arquivos_validos=len(arquivos_validos), processos=processos if usar_processos else 0)
+
+    return {
+        'operacoes': operacoes,
+        'dias_com_entrada': list(dias_com_entrada),
+        'dias_ignorados': dias_ignorados,
+        'dias_com_dados': sorted(todos_dias_com_dados),
+        'arquivos_ignorados': arquivos_ignorados,
+        'mensagens_liquidez': mensagens_liquidez,
+        'liquidez': {extrair_nome_completo(file.name): liquidez for file, liquidez in liquidez_por_arquivo.items()},
+        'erros_carga': erros_carga,
+        'erros': erros,
+    }
+
+def _total_operacoes(resultado):
+    return sum(len(colunas['direcao']) for colunas in resultado['operacoes'].values())
+
+# ========================
+# FUNÇÃO: operações formatadas para exibição/exportação
+# ========================
+# Mesmo layout de colunas das versões anteriores (datas e distorção como texto,
+# rótulo da referência). O DataFrame tipado de rastrear() não é alterado.
+def formatar_operacoes(df):
+    formatado = df.drop(columns=["Data Referência", "Valor Referência"])
+    formatado["Data Entrada"] = df["Data Entrada"].dt.strftime("%d/%m/%Y %H:%M")
+    formatado["Data Saída"] = df["Data Saída"].dt.strftime("%d/%m/%Y %H:%M")
+    formatado["Distorção (%)"] = df["Distorção (%)"].map("{:.2f}%".format)
+    formatado["Referência"] = (
+        df["Referência"].astype(str) + " " + df["Data Referência"].dt.strftime("%d/%m") + ": "
+        + df["Valor Referência"].map("{:.2f}".format)
+    )
+    return formatado
+
+# ========================
+# FUNÇÃO: resumo por grupo (eventos, acertos, lucro, drawdown médio)
+# ========================
+# Agregações nativas do pandas; o acerto é uma coluna booleana pré-calculada.
+def resumir_operacoes(df, chaves):
+    return df.assign(Acerto=df["Lucro (R$)"].to_numpy() > 0).groupby(chaves, as_index=False, observed=True).agg(
+        Total_Eventos=("Lucro (R$)", "count"),
+        Acertos=("Acerto", "sum"),
+        Lucro_Total=("Lucro (R$)", "sum"),
+        Max_DD_Medio=("Max Drawdown %", "mean")
+    )
+
+# ========================
+# FUNÇÃO: rastreamento com memória de resultados
+# ========================
+# Mesmos candles, configuração e período → devolve o resultado já calculado
+# (compartilhado entre sessões; ver cache_resultados). O resultado não deve
+# ser alterado por quem chama.
+def impressao(file):
+    if getattr(file, "impressao", None) is None:
+        if usa_historico(file):
+            # O histórico pode ter crescido desde a ingestão: impressão do momento
+            valor = impressao_historico(file.historico)
+        elif getattr(file, "manifesto", None):
+            valor = file.manifesto['impressao']
+        else:
+            valor = cache_resultados.impressao_candles(file.df) if hasattr(file, "df") else impressao_arquivo(file)
+        try:
+            file.impressao = valor
+        except AttributeError:
+            return [file.name, valor]
+    return [file.name, file.impressao]
+
+def rastrear_com_cache(arquivos, cfg, data_inicio, data_fim, medicao=DESLIGADA):
+    with medicao.etapa("memória de resultados"):
+        chave = cache_resultados.chave_rastreamento([impressao(file) for file in arquivos], cfg, data_inicio, data_fim)
+        resultado = cache_resultados.obter(chave)
+    medicao.anotar(memoria_resultados="acerto" if resultado is not None else "falta")
+    if resultado is None:
+        resultado = rastrear(arquivos, cfg, data_inicio, data_fim, medicao=medicao)
+        # A chave também identifica os arquivos exportados deste resultado
+        resultado['chave'] = chave
+        cache_resultados.guardar(chave, resultado)
+    return resultado
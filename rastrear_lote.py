@@ -0,0 +1,138 @@
+# rastrear_lote.py - rastreamento intraday em lote, pela linha de comando (sem Streamlit)
+#
+# Exemplos:
+#   python rastrear_lote.py PETR4 VALE3 --inicio 2025-01-02 --fim 2025-03-31 --config configs.json
+#   python rastrear_lote.py --universo "Ações (lista padrão)" --inicio 2025-01-02 --formato json
+#   python rastrear_lote.py --arquivos dados/PETR4.csv dados/VALE3.xlsx --inicio 2025-01-02
+#
+# O arquivo de configuração é um JSON com um objeto (uma configuração) ou uma
+# lista de objetos, com as mesmas chaves do formulário (ver CONFIG_PADRAO).
+# "nome" (opcional) define a subpasta de saída de cada configuração.
+import argparse
+import json
+import os
+import sys
+from datetime import date, datetime
+
+import pandas as pd
+
+from armazem_candles import salvar_referencias
+from exportacao import ESCRITORES
+from ingestao import ler_candles
+from rastreamento import CONFIG_PADRAO, FakeFile, arquivos_de_tickers, extrair_nome_completo, rastrear
+from universo import PRESETS_UNIVERSO, montar_universo
+
+# ========================
+# ENTRADAS
+# ========================
+def ler_configuracoes(caminho):
+    if not caminho:
+        return [{**CONFIG_PADRAO, "nome": "padrao"}]
+    with open(caminho, "r", encoding="utf-8") as f:
+        dados = json.load(f)
+    if isinstance(dados, dict):
+        dados = [dados]
+    configuracoes = []
+    for i, cfg in enumerate(dados, start=1):
+        configuracoes.append({**CONFIG_PADRAO, "nome": f"config_{i:02d}", **cfg})
+    return configuracoes
+
+def arquivos_locais(caminhos):
+    arquivos = []
+    for caminho in caminhos:
+        nome = extrair_nome_completo(os.path.basename(caminho))
+        try:
+            df = ler_candles(caminho)
+        except Exception as e:
+            print(f"❌ {caminho}: {e}", file=sys.stderr)
+            continue
+        fake_file = FakeFile(f"{nome}.xlsx", df)
+        fake_file.ticker = None
+        fake_file.referencias_em_cache = False
+        arquivos.append(fake_file)
+    return arquivos
+
+# ========================
+# SAÍDAS
+# ========================
+def gravar_tabela(df, caminho_base, formato):
+    if formato in ESCRITORES:
+        # Parquet/Arrow/CSV escritos em blocos (ver exportacao.py)
+        ESCRITORES[formato](df, caminho_base + "." + formato)
+    else:
+        df.to_json(caminho_base + ".json", orient="records", force_ascii=False, indent=2, date_format="iso")
+
+def _texto_data(valor):
+    return valor.isoformat() if isinstance(valor, (date, datetime)) else str(valor)
+
+def gravar_resultado(resultado, cfg, pasta, formato):
+    os.makedirs(pasta, exist_ok=True)
+    gravar_tabela(resultado['operacoes'], os.path.join(pasta, "operacoes"), formato)
+    ignorados = pd.DataFrame(
+        [(_texto_data(dia), motivo) for dia, motivo in resultado['dias_ignorados']], columns=["Data", "Motivo"]
+    )
+    gravar_tabela(ignorados, os.path.join(pasta, "dias_ignorados"), formato)
+
+    diagnostico = {
+        "configuracao": cfg,
+        "total_operacoes": len(resultado['operacoes']),
+        "dias_com_dados": [_texto_data(d) for d in resultado['dias_com_dados']],
+        "dias_com_entrada": sorted(_texto_data(d) for d in resultado['dias_com_entrada']),
+        "arquivos_ignorados": resultado['arquivos_ignorados'],
+        "mensagens_liquidez": resultado['mensagens_liquidez'],
+        "liquidez": resultado['liquidez'],
+        "erros_carga": [{"arquivo": nome, "erro": erro} for nome, erro in resultado['erros_carga']],
+        "erros": [{"arquivo": nome, "erro": erro} for nome, erro in resultado['erros']],
+    }
+    with open(os.path.join(pasta, "diagnostico.json"), "w", encoding="utf-8") as f:
+        json.dump(diagnostico, f, indent=2, ensure_ascii=False, default=lambda v: v.item() if hasattr(v, "item") else str(v))
+
+# ========================
+# PROGRAMA PRINCIPAL
+# ========================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rastreamento intraday do Radar B3 em lote.")
+    parser.add_argument("tickers", nargs="*", help="Tickers (ex.: PETR4 VALE3 WINZ25)")
+    parser.add_argument("--universo", choices=PRESETS_UNIVERSO, help="Lista pronta de ativos")
+    parser.add_argument("--arquivos", nargs="+", default=[], help="Arquivos de candles (Excel, CSV ou Parquet)")
+    parser.add_argument("--config", help="JSON com uma configuração ou uma lista de configurações")
+    parser.add_argument("--inicio", required=True, type=date.fromisoformat, help="Data inicial (AAAA-MM-DD)")
+    parser.add_argument("--fim", type=date.fromisoformat, default=date.today(), help="Data final (AAAA-MM-DD)")
+    parser.add_argument("--saida", default="resultados", help="Pasta de saída")
+    parser.add_argument("--formato", choices=["parquet", "arrow", "csv", "json"], default="parquet")
+    parser.add_argument("--processos", type=int, help="Processos paralelos (sobrepõe o valor das configurações)")
+    args = parser.parse_args(argv)
+
+    tickers = list(args.tickers)
+    if args.universo:
+        tickers += montar_universo(args.universo)
+    tickers = list(dict.fromkeys(t.upper() for t in tickers))
+
+    arquivos = arquivos_locais(args.arquivos)
+    if tickers:
+        baixados, sem_dados, erros_download = arquivos_de_tickers(tickers, intervalo="5m")
+        for ticker in sem_dados:
+            print(f"⚠️ Sem dados para {ticker}: {erros_download.get(ticker, 'nenhum candle')}", file=sys.stderr)
+        arquivos += baixados
+    if not arquivos:
+        parser.error("nenhum ativo com dados (informe tickers, --universo ou --arquivos)")
+
+    configuracoes = ler_configuracoes(args.config)
+    # Arquivos preparados uma vez e reaproveitados por todas as configurações
+    indices = {}
+    for cfg in configuracoes:
+        if args.processos is not None:
+            cfg["processos"] = args.processos
+        resultado = rastrear(arquivos, cfg, args.inicio, args.fim, indices=indices)
+        pasta = os.path.join(args.saida, cfg["nome"])
+        gravar_resultado(resultado, cfg, pasta, args.formato)
+        print(f"✅ {cfg['nome']}: {len(resultado['operacoes'])} operações → {pasta}")
+
+    # Mesma regra da tela: tabela de referências guardada junto do cache de candles
+    for file in arquivos:
+        if file.ticker and not file.referencias_em_cache and getattr(file, "referencias_diarias", None) is not None:
+            salvar_referencias(file.ticker, file.referencias_diarias, intervalo="5m")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+# reamostragem.py - intervalos de confiança por bootstrap sobre as operações do rastreamento
+# Todas as reamostras de todos os grupos saem das mesmas operações do NumPy: uma
+# matriz de sorteios (reamostras x operações), em que cada operação sorteia outra
+# do seu próprio grupo, e somas por grupo com np.add.reduceat. As reamostras são
+# processadas em blocos para limitar a memória; não há laço por grupo.
+import numpy as np
+
+# ========================
+# CONFIGURAÇÃO
+# ========================
+REAMOSTRAS = 2000
+CONFIANCA = 0.95
+# Máximo de sorteios (reamostras x operações) por bloco
+SORTEIOS_POR_BLOCO = 4_000_000
+
+COLUNAS_INTERVALO = [
+    "Taxa de Acerto (IC inf.)", "Taxa de Acerto (IC sup.)",
+    "Ganho Médio (IC inf.)", "Ganho Médio (IC sup.)",
+    "Drawdown Médio (IC inf.)", "Drawdown Médio (IC sup.)",
+]
+
+# ========================
+# FUNÇÃO: intervalos de confiança por grupo (taxa de acerto, ganho médio, drawdown médio)
+# ========================
+# df: operações no formato de montar_operacoes ("Lucro (R$)", "Max Drawdown %").
+# Retorna uma linha por grupo (mesmas chaves de resumir_operacoes) com os
+# limites inferior/superior de cada estatística. Semente fixa: o mesmo resultado
+# dá sempre os mesmos intervalos.
+def intervalos_bootstrap(df, chaves, reamostras=REAMOSTRAS, confianca=CONFIANCA, semente=0):
+    agrupado = df.groupby(chaves, observed=True, sort=True)
+    tabela = agrupado.size().reset_index()[chaves]
+    if df.empty:
+        return tabela.assign(**{coluna: np.empty(0) for coluna in COLUNAS_INTERVALO})
+
+    # Operações ordenadas por grupo: cada grupo ocupa um trecho contíguo
+    grupo = agrupado.ngroup().to_numpy()
+    ordem = np.argsort(grupo, kind="stable")
+    grupo = grupo[ordem]
+    lucro = df["Lucro (R$)"].to_numpy(dtype=np.float64)[ordem]
+    drawdown = df["Max Drawdown %"].to_numpy(dtype=np.float64)[ordem]
+    acerto = (lucro > 0).astype(np.float64)
+    tem_drawdown = ~np.isnan(drawdown)
+    drawdown = np.where(tem_drawdown, drawdown, 0.0)
+
+    tamanhos = np.bincount(grupo)
+    inicios = np.concatenate(([0], np.cumsum(tamanhos)[:-1]))
+    inicio_do_grupo = inicios[grupo]
+    tamanho_do_grupo = tamanhos[grupo]
+
+    rng = np.random.default_rng(semente)
+    bloco = max(1, SORTEIOS_POR_BLOCO // len(lucro))
+    taxas, ganhos, drawdowns = [], [], []
+    for inicio in range(0, reamostras, bloco):
+        n = min(bloco, reamostras - inicio)
+        sorteio = inicio_do_grupo + (rng.random((n, len(lucro))) * tamanho_do_grupo).astype(np.int64)
+        taxas.append(np.add.reduceat(acerto[sorteio], inicios, axis=1) / tamanhos)
+        ganhos.append(np.add.reduceat(lucro[sorteio], inicios, axis=1) / tamanhos)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            drawdowns.append(
+                np.add.reduceat(drawdown[sorteio], inicios, axis=1)
+                / np.add.reduceat(tem_drawdown[sorteio], inicios, axis=1)
+            )
+
+    # Percentis das reamostras (reamostras x grupos) -> limites de cada grupo
+    cauda = (1 - confianca) / 2
+    for nome, valores in [("Taxa de Acerto", taxas), ("Ganho Médio", ganhos), ("Drawdown Médio", drawdowns)]:
+        inferior, superior = np.nanquantile(np.concatenate(valores), [cauda, 1 - cauda], axis=0)
+        tabela[f"{nome} (IC inf.)"] = inferior
+        tabela[f"{nome} (IC sup.)"] = superior
+    return tabela
@@ -0,0 +1,325 @@
+# scanner_ao_vivo.py - rastreamento ao vivo: cada novo candle de 5min é avaliado ao chegar
+# Um laço asyncio consulta a fonte de candles a cada candle; o estado por ativo
+# (referências do dia anterior, abertura e mínima do dia) é atualizado em O(1)
+# por candle, sem reprocessar o histórico. Sem Streamlit: a tela só lê os sinais.
+import asyncio
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from armazem_candles import baixar_yahoo_lote, carregar_candles, normalizar_download
+from calendario_b3 import sessao_do_dia
+from motor_intraday import DIRECOES, preparar_candles, sinais_por_direcao
+
+# ========================
+# CONFIGURAÇÃO
+# ========================
+# Segundos de espera após o início de cada candle antes de consultar o Yahoo
+ATRASO_CONSULTA = 20
+MAX_SINAIS = 500
+MAX_ERROS = 50
+# Sem nenhuma leitura da tela por este tempo (aba fechada, sessão abandonada),
+# o scanner para sozinho em vez de consultar o Yahoo para ninguém
+SEM_LEITURA_MAXIMA = timedelta(minutes=30)
+
+COLUNAS_SINAL = [
+    "Ação", "Direção", "Horário", "Data", "Preço", "Distorção (%)",
+    "Referência", "Data Referência", "Valor Referência"
+]
+
+def _minuto(datas):
+    # Mesmo tratamento do carregamento: sem fuso e arredondado para o minuto
+    datas = pd.to_datetime(datas, dayfirst=True, errors="coerce")
+    if datas.dt.tz is not None:
+        datas = datas.dt.tz_localize(None)
+    return datas.dt.floor("min")
+
+# ========================
+# FONTES DE CANDLES
+# ========================
+# Uma fonte tem três métodos assíncronos:
+#   historico(ticker) -> DataFrame Data/Abertura/Máxima/Mínima/Fechamento/Volume
+#   novos_candles({ticker: último minuto já visto ou None}) -> {ticker: candles posteriores}
+#   aguardar() -> espera o próximo candle; False encerra o scanner
+class FonteYahoo:
+    def __init__(self, intervalo="5m", atraso_segundos=ATRASO_CONSULTA):
+        self.intervalo = intervalo
+        self.atraso_segundos = atraso_segundos
+
+    async def historico(self, ticker):
+        return await asyncio.to_thread(carregar_candles, ticker, self.intervalo)
+
+    async def novos_candles(self, desde_por_ticker):
+        desde_validos = [d for d in desde_por_ticker.values() if d is not None]
+        inicio = min(desde_validos).date() if desde_validos else None
+        lote = await asyncio.to_thread(baixar_yahoo_lote, list(desde_por_ticker), self.intervalo, inicio)
+        novos = {}
+        for ticker, desde in desde_por_ticker.items():
+            bruto = lote.get(ticker)
+            if bruto is None or bruto.empty:
+                continue
+            df = normalizar_download(bruto)
+            df["Data"] = _minuto(df["Data"])
+            novos[ticker] = df if desde is None else df[df["Data"] >= desde]
+        return novos
+
+    async def aguardar(self):
+        agora = datetime.now()
+        inicio_candle = agora.replace(second=0, microsecond=0) - timedelta(minutes=agora.minute % 5)
+        proxima = inicio_candle + timedelta(minutes=5, seconds=self.atraso_segundos)
+        await asyncio.sleep((proxima - agora).total_seconds())
+        return True
+
+# Reprodução de candles já conhecidos: o "relógio" começa em "inicio" e anda um
+# candle a cada aguardar(). Serve para testar o scanner sem depender do mercado.
+class FonteReplay:
+    def __init__(self, candles_por_ticker, inicio, passo_minutos=5, pausa_segundos=0.0):
+        self.candles = {}
+        for ticker, df in candles_por_ticker.items():
+            df = df.copy()
+            df["Data"] = _minuto(df["Data"])
+            self.candles[ticker] = df.dropna(subset=["Data"]).sort_values("Data", kind="stable")
+        self.relogio = pd.Timestamp(inicio)
+        self.passo = pd.Timedelta(minutes=passo_minutos)
+        self.pausa_segundos = pausa_segundos
+        self.fim = max((df["Data"].max() for df in self.candles.values() if not df.empty), default=self.relogio)
+
+    async def historico(self, ticker):
+        df = self.candles[ticker]
+        return df[df["Data"] < self.relogio]
+
+    async def novos_candles(self, desde_por_ticker):
+        novos = {}
+        for ticker, desde in desde_por_ticker.items():
+            df = self.candles[ticker]
+            mascara = df["Data"] <= self.relogio
+            if desde is not None:
+                mascara &= df["Data"] >= desde
+            novos[ticker] = df[mascara]
+        return novos
+
+    async def aguardar(self):
+        if self.relogio >= self.fim:
+            return False
+        self.relogio += self.passo
+        if self.pausa_segundos:
+            await asyncio.sleep(self.pausa_segundos)
+        return True
+
+# ========================
+# ESTADO POR ATIVO (atualizado em O(1) a cada candle)
+# ========================
+# Mesmas regras da tabela de referências diárias: abertura = 1º candle do dia,
+# fechamento = último candle, mínima = menor mínima do dia.
+class EstadoTicker:
+    def __init__(self):
+        self.dia = None
+        self.abertura = np.nan
+        self.minima = np.nan
+        self.fechamento = np.nan
+        self.anterior = None
+        self.ultimo = None
+
+    def iniciar(self, historico):
+        if historico is None or historico.empty:
+            return
+        df, indice = preparar_candles(historico.copy(), pd.Timestamp.min.date(), pd.Timestamp.max.date(),
+                                      com_liquidez=False)
+        tabela = indice['referencias']
+        if len(tabela['dias']) == 0:
+            return
+        self.dia = pd.Timestamp(tabela['dias'][-1])
+        self.abertura, self.minima, self.fechamento = (
+            tabela['abertura'][-1], tabela['minima'][-1], tabela['fechamento'][-1]
+        )
+        if len(tabela['dias']) > 1:
+            self.anterior = (pd.Timestamp(tabela['dias'][-2]), tabela['fechamento'][-2], tabela['minima'][-2])
+        self.ultimo = pd.Timestamp(df.index[-1])
+
+    # Devolve True se o candle é novo (o candle em formação reaparece atualizado)
+    def aplicar(self, minuto, abertura, minima, fechamento):
+        if self.ultimo is not None and minuto < self.ultimo:
+            return False
+        novo = self.ultimo is None or minuto > self.ultimo
+        dia = minuto.normalize()
+        if dia != self.dia:
+            if self.dia is not None:
+                self.anterior = (self.dia, self.fechamento, self.minima)
+            self.dia, self.abertura, self.minima = dia, abertura, minima
+        else:
+            self.minima = np.fmin(self.minima, minima)
+        self.fechamento = fechamento
+        self.ultimo = minuto
+        return novo
+
+    def referencia(self, nome):
+        if nome == "Abertura do dia atual":
+            return self.abertura, self.dia
+        if self.anterior is None:
+            return None, None
+        dia, fechamento, minima = self.anterior
+        if nome == "Fechamento do dia anterior":
+            return fechamento, dia
+        if nome == "Mínima do dia anterior":
+            return minima, dia
+        return None, None
+
+# ========================
+# SCANNER
+# ========================
+# cfg tem as mesmas chaves de CONFIG_PADRAO. "nomes" (opcional) traduz o ticker
+# da fonte para o nome exibido (PETR4.SA → PETR4). ao_sinal(sinal) é chamado a
+# cada sinal novo, dentro do laço do scanner.
+class ScannerAoVivo:
+    def __init__(self, tickers, cfg, fonte=None, nomes=None, ao_sinal=None, sem_leitura_maxima=SEM_LEITURA_MAXIMA):
+        self.tickers = list(dict.fromkeys(tickers))
+        self.cfg = dict(cfg)
+        self.fonte = fonte or FonteYahoo()
+        self.nomes = nomes or {}
+        self.ao_sinal = ao_sinal
+        self.estados = {ticker: EstadoTicker() for ticker in self.tickers}
+        self.sinais = deque(maxlen=MAX_SINAIS)
+        self.erros = deque(maxlen=MAX_ERROS)
+        self.candles_avaliados = 0
+        self.ultima_consulta = None
+        self.ultima_leitura = datetime.now()
+        self.sem_leitura_maxima = sem_leitura_maxima
+        self.parado_por_inatividade = False
+        self.em_execucao = False
+        self._parar = threading.Event()
+        self._trava = threading.Lock()
+        self._thread = None
+
+        tipo_ativo = cfg["tipo_ativo"]
+        self.tipo_ativo = tipo_ativo
+        self.pregoes = {}
+        self.deslocamento = 5 * int(cfg["candles_pos_entrada"])
+        self.checar_apos = tipo_ativo in ["acoes", "mini_indice", "mini_dolar"]
+        self.minutos_horarios = {int(h[:2]) * 60 + int(h[3:5]): h for h in cfg["horarios_selecionados"]}
+
+    # Pregão do dia pelo calendário da B3 (fins de semana e feriados: -1, -1)
+    def pregao(self, data):
+        if data not in self.pregoes:
+            self.pregoes[data] = sessao_do_dia(data, self.tipo_ativo)
+        return self.pregoes[data]
+
+    # Mesmas regras do backtest para o candle do horário: dentro do pregão, saída
+    # até o fim do pregão, referência válida e distorção além dos limites
+    def avaliar_candle(self, ticker, minuto, preco):
+        minutos = minuto.hour * 60 + minuto.minute
+        horario = self.minutos_horarios.get(minutos)
+        abertura_min, fechamento_min = self.pregao(minuto.date())
+        if horario is None or not (abertura_min <= minutos <= fechamento_min):
+            return []
+        if self.checar_apos and minutos + self.deslocamento > fechamento_min:
+            return []
+        valor_referencia, data_referencia = self.estados[ticker].referencia(self.cfg["referencia"])
+        if valor_referencia is None or not valor_referencia > 0 or not np.isfinite(preco):
+            return []
+        distorcao = ((preco - valor_referencia) / valor_referencia) * 100
+        return [
+            {
+                "Ação": self.nomes.get(ticker, ticker),
+                "Direção": DIRECOES[codigo],
+                "Horário": horario,
+                "Data": minuto,
+                "Preço": round(float(preco), 2),
+                "Distorção (%)": round(float(distorcao), 2),
+                "Referência": self.cfg["referencia"],
+                "Data Referência": data_referencia,
+                "Valor Referência": round(float(valor_referencia), 2),
+            }
+            for codigo, mascara in sinais_por_direcao(np.array([distorcao]), self.cfg) if mascara[0]
+        ]
+
+    def processar(self, ticker, candles):
+        estado = self.estados[ticker]
+        novos_sinais = []
+        if candles is None or candles.empty:
+            return novos_sinais
+        candles = candles.sort_values("Data", kind="stable")
+        colunas = [candles[c].to_numpy(dtype=np.float64) for c in ["Abertura", "Mínima", "Fechamento"]]
+        for minuto, abertura, minima, fechamento in zip(candles["Data"], *colunas):
+            if not estado.aplicar(minuto, abertura, minima, fechamento):
+                continue
+            self.candles_avaliados += 1
+            novos_sinais += self.avaliar_candle(ticker, minuto, abertura)
+        with self._trava:
+            self.sinais.extend(novos_sinais)
+        if self.ao_sinal:
+            for sinal in novos_sinais:
+                self.ao_sinal(sinal)
+        return novos_sinais
+
+    async def iniciar(self):
+        historicos = await asyncio.gather(*(self.fonte.historico(t) for t in self.tickers), return_exceptions=True)
+        for ticker, historico in zip(self.tickers, historicos):
+            if isinstance(historico, Exception):
+                self.erros.append(f"{ticker}: {historico}")
+                continue
+            try:
+                self.estados[ticker].iniciar(historico)
+            except Exception as e:
+                self.erros.append(f"{ticker}: {e}")
+
+    async def consultar(self):
+        try:
+            novos = await self.fonte.novos_candles({t: e.ultimo for t, e in self.estados.items()})
+        except Exception as e:
+            self.erros.append(f"consulta: {e}")
+            return []
+        self.ultima_consulta = datetime.now()
+        sinais = []
+        for ticker, candles in novos.items():
+            if ticker in self.estados:
+                sinais += self.processar(ticker, candles)
+        return sinais
+
+    async def executar(self):
+        self.em_execucao = True
+        try:
+            await self.iniciar()
+            await self.consultar()
+            while await self._aguardar():
+                if self.abandonado():
+                    self.parado_por_inatividade = True
+                    break
+                await self.consultar()
+        finally:
+            self.em_execucao = False
+
+    # Espera da fonte interrompível por parar() (checado a cada segundo)
+    async def _aguardar(self):
+        espera = asyncio.ensure_future(self.fonte.aguardar())
+        while not espera.done():
+            if self._parar.is_set():
+                espera.cancel()
+                return False
+            await asyncio.wait({espera}, timeout=1)
+        return espera.result() and not self._parar.is_set()
+
+    # Ninguém leu os sinais (sinais_recentes) há mais que o limite
+    def abandonado(self):
+        return self.sem_leitura_maxima is not None and datetime.now() - self.ultima_leitura > self.sem_leitura_maxima
+
+    # Laço em uma thread própria (a tela do Streamlit não é assíncrona)
+    def iniciar_em_thread(self):
+        self._parar.clear()
+        self.ultima_leitura = datetime.now()
+        self.parado_por_inatividade = False
+        self._thread = threading.Thread(target=asyncio.run, args=(self.executar(),), daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def parar(self):
+        self._parar.set()
+
+    # Leitura pela tela: também marca que a sessão continua aberta
+    def sinais_recentes(self):
+        self.ultima_leitura = datetime.now()
+        with self._trava:
+            sinais = list(self.sinais)
+        return pd.DataFrame(sinais[::-1], columns=COLUNAS_SINAL)
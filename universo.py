@@ -0,0 +1,65 @@
+# universo.py - listas de ativos para o rastreamento de vários tickers
+import re
+from datetime import date, timedelta
+
+# ========================
+# AÇÕES
+# ========================
+# Prefixos reconhecidos como ações (usados por identificar_tipo)
+PREFIXOS_ACOES = ['PETR', 'VALE', 'ITUB', 'BBDC', 'BEEF', 'ABEV', 'ITSA', 'JBSS', 'RADL', 'CIEL',
+                  'GOLL', 'AZUL', 'BBAS', 'SANB', 'ASAI', 'B3SA', 'MGLU', 'CVCB', 'IRBR', 'XP', 'LCAM']
+
+# Ticker de referência de cada prefixo acima
+ACOES_PADRAO = ['PETR4', 'VALE3', 'ITUB4', 'BBDC4', 'BEEF3', 'ABEV3', 'ITSA4', 'JBSS3', 'RADL3', 'CIEL3',
+                'GOLL4', 'AZUL4', 'BBAS3', 'SANB11', 'ASAI3', 'B3SA3', 'MGLU3', 'CVCB3', 'IRBR3', 'XPBR31', 'LCAM3']
+
+# ========================
+# FUTUROS: contrato vigente de WIN/WDO
+# ========================
+LETRAS_MES = "FGHJKMNQUVXZ"
+
+def _vencimento_win(ano, mes):
+    # Quarta-feira mais próxima do dia 15 do mês de vencimento
+    dia_15 = date(ano, mes, 15)
+    delta = 2 - dia_15.weekday()
+    if delta > 3:
+        delta -= 7
+    elif delta < -3:
+        delta += 7
+    return dia_15 + timedelta(days=delta)
+
+def contrato_vigente(prefixo, hoje=None):
+    hoje = hoje or date.today()
+    ano, mes = hoje.year, hoje.month
+    if prefixo == "WIN":
+        # Vencimentos nos meses pares
+        while mes % 2 != 0 or hoje > _vencimento_win(ano, mes):
+            mes += 1
+            if mes > 12:
+                mes, ano = 1, ano + 1
+    else:
+        # WDO vence no 1º dia útil do mês: o vigente é sempre o do mês seguinte
+        mes += 1
+        if mes > 12:
+            mes, ano = 1, ano + 1
+    return f"{prefixo}{LETRAS_MES[mes - 1]}{ano % 100:02d}"
+
+# ========================
+# PRESETS E WATCHLISTS
+# ========================
+PRESETS_UNIVERSO = ["Ações (lista padrão)", "Mini Índice (WIN vigente)", "Mini Dólar (WDO vigente)", "Futuros (WIN + WDO vigentes)"]
+
+def montar_universo(preset, hoje=None):
+    if preset == "Ações (lista padrão)":
+        return list(ACOES_PADRAO)
+    if preset == "Mini Índice (WIN vigente)":
+        return [contrato_vigente("WIN", hoje)]
+    if preset == "Mini Dólar (WDO vigente)":
+        return [contrato_vigente("WDO", hoje)]
+    if preset == "Futuros (WIN + WDO vigentes)":
+        return [contrato_vigente("WIN", hoje), contrato_vigente("WDO", hoje)]
+    return []
+
+def separar_watchlist(texto):
+    tickers = [t for t in re.split(r"[\s,;]+", (texto or "").upper()) if t]
+    return list(dict.fromkeys(tickers))
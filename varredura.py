@@ -0,0 +1,210 @@
+# varredura.py - varredura de parâmetros do rastreamento intraday em lote
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+from motor_intraday import (
+    calcular_drawdowns, calcular_valor_ponto, localizar_entradas, localizar_saidas, pregao_por_dia
+)
+
+REFERENCIAS = ["Fechamento do dia anterior", "Mínima do dia anterior", "Abertura do dia atual"]
+
+# Acima deste nº de células (combinações x eventos) a grade é dividida entre processos
+LIMITE_PARALELO = 20_000_000
+
+# ========================
+# FUNÇÃO: gerar faixa de valores (de, até, passo)
+# ========================
+def gerar_faixa(de, ate, passo):
+    if passo <= 0 or ate <= de:
+        return np.array([float(de)])
+    return np.round(np.arange(de, ate + passo / 2, passo), 4)
+
+# ========================
+# FUNÇÃO: eventos (dia x horário) com entrada, saída e referências
+# ========================
+# Calculados uma única vez para todos os arquivos; a grade só compara distorções.
+def extrair_eventos(indices, tipo_ativo, qtd, horarios_selecionados, lista_candles):
+    valor_ponto = calcular_valor_ponto(tipo_ativo)
+    minutos_selecionados = np.array(
+        [int(h.split(":")[0]) * 60 + int(h.split(":")[1]) for h in horarios_selecionados], dtype=np.int64
+    )
+
+    referencias = {ref: [] for ref in REFERENCIAS}
+    por_candles = {n: {'valido': [], 'lucro_compra': [], 'lucro_venda': [], 'dd_compra': [], 'dd_venda': []}
+                   for n in lista_candles}
+    precos_entrada = []
+    dias_evento = []
+    horarios_evento = []
+
+    for indice in indices:
+        if len(indice['inicio']) < 2:
+            continue
+        # Mesmo critério do motor: o primeiro dia do período só serve de referência
+        abertura_min, fechamento_min = pregao_por_dia(indice, tipo_ativo)
+        pos_entrada = np.concatenate([
+            localizar_entradas(indice, abertura_min, fechamento_min, m)[1:] for m in minutos_selecionados
+        ])
+        dia = np.tile(np.arange(1, len(indice['inicio']), dtype=np.int64), len(minutos_selecionados))
+        manter = pos_entrada >= 0
+        manter[manter] = np.isin(indice['minutos'][pos_entrada[manter]], minutos_selecionados)
+        pos_entrada, dia = pos_entrada[manter], dia[manter]
+        # Horário do evento = minuto do candle de entrada (mesma coluna "Horário" do motor)
+        dias_evento.append(indice['dias'][dia])
+        horarios_evento.append(indice['minutos'][pos_entrada])
+
+        tabela = indice['referencias']
+        linhas = indice['linha_referencia']
+        referencias["Fechamento do dia anterior"].append(tabela['fechamento'][linhas[dia - 1]])
+        referencias["Mínima do dia anterior"].append(tabela['minima'][linhas[dia - 1]])
+        referencias["Abertura do dia atual"].append(tabela['abertura'][linhas[dia]])
+
+        preco_entrada = indice['open'][pos_entrada]
+        precos_entrada.append(preco_entrada)
+        for n in lista_candles:
+            deslocamento = 5 * int(n)
+            pos_saida = localizar_saidas(indice, pos_entrada, deslocamento)
+            valido = pos_saida >= 0
+            if tipo_ativo in ['acoes', 'mini_indice', 'mini_dolar']:
+                valido &= indice['minutos'][pos_entrada] + deslocamento <= fechamento_min[dia]
+            preco_saida = np.where(valido, indice['open'][np.maximum(pos_saida, 0)], np.nan)
+
+            dd_compra = np.full(len(pos_entrada), np.nan)
+            dd_venda = np.full(len(pos_entrada), np.nan)
+            dd_compra[valido] = calcular_drawdowns(indice, pos_entrada[valido], pos_saida[valido], True)
+            dd_venda[valido] = calcular_drawdowns(indice, pos_entrada[valido], pos_saida[valido], False)
+
+            grupo = por_candles[n]
+            grupo['valido'].append(valido)
+            grupo['lucro_compra'].append(np.round((preco_saida - preco_entrada) * valor_ponto * qtd, 2))
+            grupo['lucro_venda'].append(np.round((preco_entrada - preco_saida) * valor_ponto * qtd, 2))
+            grupo['dd_compra'].append(dd_compra)
+            grupo['dd_venda'].append(dd_venda)
+
+    def juntar(partes):
+        return np.concatenate(partes) if partes else np.empty(0)
+
+    return {
+        'preco_entrada': juntar(precos_entrada),
+        'dia': juntar(dias_evento).astype('datetime64[D]'),
+        'horario': juntar(horarios_evento).astype(np.int64),
+        'referencias': {ref: juntar(v) for ref, v in referencias.items()},
+        'por_candles': {n: {k: juntar(v) for k, v in g.items()} for n, g in por_candles.items()},
+    }
+
+# ========================
+# FUNÇÃO: estatísticas de um par de limiares (compra tem prioridade, como no elif do motor)
+# ========================
+# "pesos" (opcional, E x J) soma os eventos de J grupos de uma vez (ex.: janelas do
+# walk-forward); os resultados ganham uma última dimensão J.
+def _estatisticas_par(sinal_compra, sinal_venda, lucro_compra, lucro_venda, dd_compra, dd_venda, pesos=None):
+    # sinal_compra: (a, E) | sinal_venda: (b, E) -> resultados (a, b)
+    venda = sinal_venda[None, :, :] & ~sinal_compra[:, None, :]
+    compra = sinal_compra.astype(np.float64)
+    venda_f = venda.astype(np.float64)
+
+    def somar(valor_compra, valor_venda):
+        if pesos is not None:
+            valor_compra, valor_venda = valor_compra[:, None] * pesos, valor_venda[:, None] * pesos
+        return (compra @ valor_compra)[:, None, ...] + venda_f @ valor_venda
+
+    dd_compra_ok, dd_venda_ok = ~np.isnan(dd_compra), ~np.isnan(dd_venda)
+    return {
+        'eventos': somar(np.ones(len(lucro_compra)), np.ones(len(lucro_venda))),
+        'acertos': somar(lucro_compra > 0, lucro_venda > 0),
+        'lucro': somar(lucro_compra, lucro_venda),
+        'soma_dd': somar(np.where(dd_compra_ok, dd_compra, 0.0), np.where(dd_venda_ok, dd_venda, 0.0)),
+        'qtd_dd': somar(dd_compra_ok, dd_venda_ok),
+    }
+
+def _vazio(a, b, *grupos):
+    return {k: np.zeros((a, b, *grupos)) for k in ['eventos', 'acertos', 'lucro', 'soma_dd', 'qtd_dd']}
+
+# ========================
+# FUNÇÃO: totais da grade completa (fc, fv, cc, vc[, J]) para um (candles, referência)
+# ========================
+def estatisticas_grade(preco_entrada, referencia_valor, grupo, faixas, modo_estrategia, pesos=None):
+    valido = grupo['valido'] & (referencia_valor > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        distorcao = np.where(valido, ((preco_entrada - referencia_valor) / referencia_valor) * 100, np.nan)
+    lucro_compra = np.where(valido, grupo['lucro_compra'], 0.0)
+    lucro_venda = np.where(valido, grupo['lucro_venda'], 0.0)
+
+    fc, fv = faixas['dist_favor_compra'], faixas['dist_favor_venda']
+    cc, vc = faixas['dist_compra_contra'], faixas['dist_venda_contra']
+    grupos = () if pesos is None else (pesos.shape[1],)
+
+    if modo_estrategia in ["A Favor da Tendência", "Ambos"]:
+        favor = _estatisticas_par(
+            distorcao[None, :] > fc[:, None], distorcao[None, :] < -fv[:, None],
+            lucro_compra, lucro_venda, grupo['dd_compra'], grupo['dd_venda'], pesos
+        )
+    else:
+        favor = _vazio(len(fc), len(fv), *grupos)
+    if modo_estrategia in ["Contra Tendência", "Ambos"]:
+        contra = _estatisticas_par(
+            distorcao[None, :] < -cc[:, None], distorcao[None, :] > vc[:, None],
+            lucro_compra, lucro_venda, grupo['dd_compra'], grupo['dd_venda'], pesos
+        )
+    else:
+        contra = _vazio(len(cc), len(vc), *grupos)
+
+    # Grade completa (fc, fv, cc, vc) por broadcasting das duas metades
+    return {k: favor[k][:, :, None, None, ...] + contra[k][None, None, :, :, ...] for k in favor}
+
+# ========================
+# FUNÇÃO: avaliar a grade de limiares para um (candles, referência)
+# ========================
+# Função de módulo para poder ser enviada a um ProcessPoolExecutor.
+def avaliar_combinacao(tarefa):
+    n, referencia, preco_entrada, referencia_valor, grupo, faixas, modo_estrategia = tarefa
+    total = estatisticas_grade(preco_entrada, referencia_valor, grupo, faixas, modo_estrategia)
+    grade = np.meshgrid(
+        faixas['dist_favor_compra'], faixas['dist_favor_venda'], faixas['dist_compra_contra'], faixas['dist_venda_contra'],
+        indexing='ij'
+    )
+    eventos = total['eventos'].ravel()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        taxa = total['acertos'].ravel() / eventos
+        dd_medio = total['soma_dd'].ravel() / total['qtd_dd'].ravel()
+
+    return pd.DataFrame({
+        "Referência": referencia,
+        "Candles após entrada": int(n),
+        "Dist. Compra Favor (%)": grade[0].ravel(),
+        "Dist. Venda Favor (%)": grade[1].ravel(),
+        "Dist. Compra Contra (%)": grade[2].ravel(),
+        "Dist. Venda Contra (%)": grade[3].ravel(),
+        "Total_Eventos": eventos.astype(np.int64),
+        "Acertos": total['acertos'].ravel().astype(np.int64),
+        "Taxa de Acerto": taxa,
+        "Lucro Total (R$)": np.round(total['lucro'].ravel(), 2),
+        "Máx. Drawdown Médio (%)": dd_medio,
+    })
+
+# ========================
+# FUNÇÃO PRINCIPAL DA VARREDURA
+# ========================
+def executar_varredura(indices, tipo_ativo, qtd, horarios_selecionados, modo_estrategia, faixas, max_workers=None):
+    faixas = {k: np.asarray(v, dtype=np.float64) if k.startswith('dist_') else list(v) for k, v in faixas.items()}
+    eventos = extrair_eventos(indices, tipo_ativo, qtd, horarios_selecionados, faixas['candles_pos_entrada'])
+
+    tarefas = [
+        (n, ref, eventos['preco_entrada'], eventos['referencias'][ref], eventos['por_candles'][n], faixas, modo_estrategia)
+        for n in faixas['candles_pos_entrada'] for ref in faixas['referencia']
+    ]
+    celulas = len(eventos['preco_entrada']) * len(tarefas) * max(
+        len(faixas['dist_favor_compra']) * len(faixas['dist_favor_venda']),
+        len(faixas['dist_compra_contra']) * len(faixas['dist_venda_contra'])
+    )
+
+    if celulas > LIMITE_PARALELO and len(tarefas) > 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            resultados = list(executor.map(avaliar_combinacao, tarefas))
+    else:
+        resultados = [avaliar_combinacao(t) for t in tarefas]
+
+    if not resultados:
+        return pd.DataFrame()
+    df = pd.concat(resultados, ignore_index=True)
+    return df.sort_values("Lucro Total (R$)", ascending=False, kind="stable").reset_index(drop=True)
@@ -0,0 +1,144 @@
+# walk_forward.py - avaliação walk-forward (fora da amostra) da varredura de parâmetros
+# O período é dividido em janelas rolantes de treino/teste. Em cada treino, a
+# varredura escolhe a melhor combinação (candles, referência, limiares) de cada
+# horário e só os horários lucrativos seguem; o teste seguinte mede essas
+# escolhas em dias que não participaram da escolha.
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+from varredura import LIMITE_PARALELO, estatisticas_grade, extrair_eventos
+
+COLUNAS_LIMIARES = ["Dist. Compra Favor (%)", "Dist. Venda Favor (%)", "Dist. Compra Contra (%)", "Dist. Venda Contra (%)"]
+
+# ========================
+# FUNÇÃO: janelas rolantes (treino, teste) sobre os dias com eventos
+# ========================
+# O teste de uma janela é o trecho seguinte ao treino; a janela seguinte anda
+# "passo" dias (padrão: o tamanho do teste, sem sobreposição entre testes).
+def gerar_janelas(dias, dias_treino, dias_teste, passo=None):
+    dias = np.unique(np.asarray(dias, dtype='datetime64[D]'))
+    passo = passo or dias_teste
+    janelas = []
+    inicio = 0
+    while inicio + dias_treino < len(dias):
+        treino = dias[inicio:inicio + dias_treino]
+        teste = dias[inicio + dias_treino:inicio + dias_treino + dias_teste]
+        janelas.append(((treino[0], treino[-1]), (teste[0], teste[-1])))
+        inicio += passo
+    return janelas
+
+# ========================
+# FUNÇÃO: uma combinação (candles, referência, horário) em todas as janelas
+# ========================
+# "pesos" (eventos x 2J) marca os eventos de cada treino (J primeiras colunas) e
+# de cada teste (J últimas): a grade inteira de limiares de todas as janelas sai
+# das mesmas multiplicações de matrizes. Função de módulo para poder ser
+# enviada a um ProcessPoolExecutor.
+def avaliar_combinacao_janelas(tarefa):
+    preco_entrada, referencia_valor, grupo, pesos, faixas, modo_estrategia = tarefa
+    total = estatisticas_grade(preco_entrada, referencia_valor, grupo, faixas, modo_estrategia, pesos)
+    return {k: v.reshape(-1, pesos.shape[1]) for k, v in total.items()}
+
+def _texto_periodo(periodo):
+    return f"{pd.Timestamp(periodo[0]):%d/%m/%Y} a {pd.Timestamp(periodo[1]):%d/%m/%Y}"
+
+# ========================
+# FUNÇÃO PRINCIPAL DO WALK-FORWARD
+# ========================
+# Entradas, saídas, lucros e drawdowns de todos os dias são extraídos uma única
+# vez (como na varredura) e reaproveitados por todas as janelas. Em cada treino,
+# vale a combinação de maior lucro de cada horário (mesmo desempate da
+# varredura); horário sem lucro no treino não é operado no teste.
+# Retorna (uma linha por janela x horário escolhido, resumo por janela).
+def executar_walk_forward(indices, tipo_ativo, qtd, horarios_selecionados, modo_estrategia, faixas,
+                          dias_treino, dias_teste, passo=None, max_workers=None):
+    faixas = {k: np.asarray(v, dtype=np.float64) if k.startswith('dist_') else list(v) for k, v in faixas.items()}
+    eventos = extrair_eventos(indices, tipo_ativo, qtd, horarios_selecionados, faixas['candles_pos_entrada'])
+    janelas = gerar_janelas(eventos['dia'], dias_treino, dias_teste, passo)
+    if not janelas:
+        return pd.DataFrame(), pd.DataFrame()
+
+    periodos = [treino for treino, _ in janelas] + [teste for _, teste in janelas]
+    inicios = np.array([p[0] for p in periodos], dtype='datetime64[D]')
+    fins = np.array([p[1] for p in periodos], dtype='datetime64[D]')
+
+    combinacoes = []
+    tarefas = []
+    for horario in np.unique(eventos['horario']):
+        do_horario = eventos['horario'] == horario
+        dias = eventos['dia'][do_horario]
+        pesos = ((dias[:, None] >= inicios[None, :]) & (dias[:, None] <= fins[None, :])).astype(np.float64)
+        for n in faixas['candles_pos_entrada']:
+            grupo = {k: v[do_horario] for k, v in eventos['por_candles'][n].items()}
+            for ref in faixas['referencia']:
+                combinacoes.append((horario, n, ref))
+                tarefas.append((eventos['preco_entrada'][do_horario], eventos['referencias'][ref][do_horario],
+                                grupo, pesos, faixas, modo_estrategia))
+
+    # Mesmo critério da varredura: as colunas das janelas saem da mesma multiplicação
+    celulas = len(eventos['preco_entrada']) * len(faixas['candles_pos_entrada']) * len(
+        faixas['referencia']) * max(
+        len(faixas['dist_favor_compra']) * len(faixas['dist_favor_venda']),
+        len(faixas['dist_compra_contra']) * len(faixas['dist_venda_contra'])
+    )
+    if celulas > LIMITE_PARALELO and len(tarefas) > 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            resultados = list(executor.map(avaliar_combinacao_janelas, tarefas))
+    else:
+        resultados = [avaliar_combinacao_janelas(t) for t in tarefas]
+
+    grade = [g.ravel() for g in np.meshgrid(
+        faixas['dist_favor_compra'], faixas['dist_favor_venda'], faixas['dist_compra_contra'], faixas['dist_venda_contra'],
+        indexing='ij'
+    )]
+    J = len(janelas)
+
+    # Melhor célula de cada (horário, janela) no treino: a primeira de maior lucro
+    melhores = {}
+    for (horario, n, ref), resultado in zip(combinacoes, resultados):
+        lucro_treino = np.round(resultado['lucro'][:, :J], 2)
+        celula = lucro_treino.argmax(axis=0)
+        for j in range(J):
+            valor = lucro_treino[celula[j], j]
+            atual = melhores.get((horario, j))
+            if atual is None or valor > atual[0]:
+                melhores[(horario, j)] = (valor, n, ref, celula[j], resultado)
+
+    linhas = []
+    for j, (treino, teste) in enumerate(janelas):
+        for horario in np.unique(eventos['horario']):
+            lucro_treino, n, ref, k, resultado = melhores[(horario, j)]
+            if not lucro_treino > 0:
+                continue
+            with np.errstate(divide='ignore', invalid='ignore'):
+                taxa = resultado['acertos'][:, [j, J + j]][k] / resultado['eventos'][:, [j, J + j]][k]
+                dd_medio = resultado['soma_dd'][k, J + j] / resultado['qtd_dd'][k, J + j]
+            linhas.append({
+                "Janela": j + 1,
+                "Treino": _texto_periodo(treino),
+                "Teste": _texto_periodo(teste),
+                "Horário": f"{horario // 60:02d}:{horario % 60:02d}",
+                "Referência": ref,
+                "Candles após entrada": int(n),
+                **{coluna: g[k] for coluna, g in zip(COLUNAS_LIMIARES, grade)},
+                "Lucro Treino (R$)": lucro_treino,
+                "Taxa de Acerto Treino": taxa[0],
+                "Total_Eventos": int(resultado['eventos'][k, J + j]),
+                "Acertos": int(resultado['acertos'][k, J + j]),
+                "Taxa de Acerto": taxa[1],
+                "Lucro Total (R$)": round(resultado['lucro'][k, J + j], 2),
+                "Máx. Drawdown Médio (%)": dd_medio,
+            })
+
+    detalhe = pd.DataFrame(linhas)
+    if detalhe.empty:
+        return detalhe, pd.DataFrame()
+    resumo = detalhe.groupby(["Janela", "Treino", "Teste"], as_index=False, sort=False).agg(
+        Horários=("Horário", "count"),
+        Lucro_Treino=("Lucro Treino (R$)", "sum"),
+        Total_Eventos=("Total_Eventos", "sum"),
+        Acertos=("Acertos", "sum"),
+        Lucro_Teste=("Lucro Total (R$)", "sum"),
+    )
+    return detalhe, resumo